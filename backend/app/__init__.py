@@ -1,15 +1,18 @@
 from flask import Flask, jsonify
-from .config import config_by_name
-from .extensions import db, migrate, jwt, api, cors
 try:
+	# Nearest .env searching up from this package (backend/, the repo root, ...)
 	from dotenv import load_dotenv
 	load_dotenv()
 except Exception:
 	# python-dotenv is optional; if missing, environment variables must be set externally
 	pass
+from .config import config_by_name
+from .extensions import db, migrate, jwt, api, cors
+from .services.startup import StartupProfile
 
 
 def create_app(config_name: str = "development") -> Flask:
+	profile = StartupProfile()
 	app = Flask(__name__)
 	app.config.from_object(config_by_name.get(config_name, config_by_name["development"]))
 
@@ -36,28 +39,73 @@ def create_app(config_name: str = "development") -> Flask:
 		},
 	)
 
+	# Pool sizing, pre-ping and timeouts from the DB_* settings
+	from .services.db_pool import db_pool, engine_options
+	if "SQLALCHEMY_ENGINE_OPTIONS" not in app.config:
+		app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+	# Read replicas become extra binds with the same engine options
+	from .services.replicas import replica_binds, replica_router
+	app.config["SQLALCHEMY_BINDS"] = {**app.config.get("SQLALCHEMY_BINDS", {}), **replica_binds(app.config)}
+
 	# Init extensions
-	db.init_app(app)
-	migrate.init_app(app, db)
-	jwt.init_app(app)
-	api.init_app(app)
-	cors.init_app(app)
+	with profile.phase("extensions"):
+		db.init_app(app)
+		db_pool.init_app(app)
+		replica_router.init_app(app)
+		migrate.init_app(app, db)
+		jwt.init_app(app)
+		api.init_app(app)
+		cors.init_app(app)
 
 	# Register blueprints
-	from .routes import register_blueprints
-	register_blueprints(app)
+	with profile.phase("blueprints"):
+		from .routes import register_blueprints
+		register_blueprints(app)
 
 	# JSON error handling for 404
 	@app.errorhandler(404)
 	def handle_404(_e):
 		return jsonify({"message": "Not found"}), 404
 
-	# Quick dev: create tables if using SQLite and not migrated yet
-	with app.app_context():
-		try:
-			db.create_all()
-		except Exception:
-			pass
+	# Tables come from migrations (`flask db upgrade`). create_all() reflects
+	# every table on each boot, so it only runs when explicitly asked for.
+	if app.config.get("AUTO_CREATE_TABLES"):
+		with profile.phase("create_all"), app.app_context():
+			try:
+				db.create_all()
+			except Exception:
+				pass
+
+	# Process-local indexes and caches (indexes need tables to exist)
+	with profile.phase("services"):
+		from .services.blobs import blob_store
+		from .services.cache import response_cache
+		from .services.clusters import cluster_index
+		from .services.geo_index import geo_index
+		from .services.identity import user_cache
+		from .services.images import image_pipeline
+		from .services.moderation_queue import moderation_queue
+		from .services.passwords import password_hasher
+		from .services.ratelimit import rate_limiter
+		from .services.search import search_index
+		from .services.storage import upload_storage
+		from .services.tiles import mosque_tiles
+		geo_index.init_app(app)
+		search_index.init_app(app)
+		response_cache.init_app(app)
+		cluster_index.init_app(app)
+		mosque_tiles.init_app(app)
+		moderation_queue.init_app(app)
+		upload_storage.init_app(app)
+		image_pipeline.init_app(app)
+		blob_store.init_app(app)
+		user_cache.init_app(app)
+		password_hasher.init_app(app)
+		rate_limiter.init_app(app)
+
+	# Don't hand connections opened during startup to forked gunicorn workers
+	db_pool.release_startup_connections(app)
 
+	profile.finish(app)
 	return app
 
@@ -1,6 +1,13 @@
 import os
 
 
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 class BaseConfig:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
     _db_url = os.environ.get("DATABASE_URL")
@@ -10,15 +17,135 @@ class BaseConfig:
         )
     SQLALCHEMY_DATABASE_URI = _db_url
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool per worker process (see services/db_pool.py); turned into
+    # SQLALCHEMY_ENGINE_OPTIONS in create_app unless that is set explicitly
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+    DB_POOL_USE_LIFO = _env_bool("DB_POOL_USE_LIFO", True)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 0))  # 0 = server default
+    DB_PGBOUNCER = _env_bool("DB_PGBOUNCER", False)  # transaction-mode PgBouncer in front of Postgres
+    DB_APPLICATION_NAME = os.environ.get("DB_APPLICATION_NAME", "mosquestn")
+    # Optional read replicas (comma-separated URLs) for GETs of the listed
+    # blueprints; see services/replicas.py
+    DATABASE_REPLICA_URLS = os.environ.get("DATABASE_REPLICA_URLS", "")
+    DB_REPLICA_BLUEPRINTS = os.environ.get("DB_REPLICA_BLUEPRINTS", "mosques,reviews,meta")
+    DB_REPLICA_MAX_LAG_SECONDS = float(os.environ.get("DB_REPLICA_MAX_LAG_SECONDS", 5))
+    DB_REPLICA_CHECK_SECONDS = float(os.environ.get("DB_REPLICA_CHECK_SECONDS", 5))
+    DB_READ_YOUR_WRITES_SECONDS = float(os.environ.get("DB_READ_YOUR_WRITES_SECONDS", 10))
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "dev-jwt-secret")
+    # /auth/me profiles cached per process (services/identity.py); entries
+    # changed elsewhere are refreshed after the TTL
+    AUTH_USER_CACHE_SIZE = int(os.environ.get("AUTH_USER_CACHE_SIZE", 10000))
+    AUTH_USER_CACHE_TTL_SECONDS = float(os.environ.get("AUTH_USER_CACHE_TTL_SECONDS", 300))
+    # Password hashing (services/passwords.py): werkzeug method string, e.g.
+    # "scrypt:32768:8:1" or "pbkdf2:sha256:600000"; older hashes are upgraded on login
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+    PASSWORD_REHASH_ON_LOGIN = _env_bool("PASSWORD_REHASH_ON_LOGIN", True)
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get("PASSWORD_HASH_QUEUE_SIZE", 8))
+    PASSWORD_HASH_TIMEOUT_SECONDS = float(os.environ.get("PASSWORD_HASH_TIMEOUT_SECONDS", 5))
+
+    # Schema is managed by migrations (`flask db upgrade`); when true, create_app
+    # also runs db.create_all() on every boot. Off for production workers.
+    AUTO_CREATE_TABLES = _env_bool("AUTO_CREATE_TABLES", False)
+
+    # In-memory spatial index serving /mosques/nearby
+    GEO_INDEX_ENABLED = _env_bool("GEO_INDEX_ENABLED", True)
+    GEO_INDEX_WARM_ON_START = _env_bool("GEO_INDEX_WARM_ON_START", True)
+    GEO_INDEX_CELL_DEG = float(os.environ.get("GEO_INDEX_CELL_DEG", 0.05))
+    GEO_INDEX_TTL_SECONDS = float(os.environ.get("GEO_INDEX_TTL_SECONDS", 300))
+
+    # Public GET response cache: "memory" (per worker), "redis" (shared) or "none"
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 2048))
+    REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+    # Precomputed grid clusters (/mosques/clusters and low-zoom tiles); cells are
+    # 1/2**CLUSTER_CELL_BITS of a map tile per axis
+    CLUSTER_MAX_ZOOM = int(os.environ.get("CLUSTER_MAX_ZOOM", 12))
+    CLUSTER_CELL_BITS = int(os.environ.get("CLUSTER_CELL_BITS", 3))
+    CLUSTER_MAX_RESULTS = int(os.environ.get("CLUSTER_MAX_RESULTS", 1000))
+
+    # Binary map tiles (/mosques/tiles/<z>/<x>/<y>); clustered up to CLUSTER_MAX_ZOOM
+    TILE_MAX_ZOOM = int(os.environ.get("TILE_MAX_ZOOM", 20))
+    TILE_CACHE_TTL_SECONDS = float(os.environ.get("TILE_CACHE_TTL_SECONDS", 600))
+
+    # Uploaded images: Azure Blob Storage when a connection string is set, else
+    # UPLOAD_FOLDER on local disk (see services/storage.py)
+    AZURE_STORAGE_CONNECTION_STRING = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
+    AZURE_CONTAINER_NAME = os.environ.get("AZURE_CONTAINER_NAME", "mosque-images")
+    UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", os.path.join(os.getcwd(), "uploads"))
+    UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 10 * 1024 * 1024))
+    UPLOAD_CHUNK_BYTES = int(os.environ.get("UPLOAD_CHUNK_BYTES", 4 * 1024 * 1024))
+    UPLOAD_AZURE_CONCURRENCY = int(os.environ.get("UPLOAD_AZURE_CONCURRENCY", 2))
+    UPLOAD_AZURE_RETRIES = int(os.environ.get("UPLOAD_AZURE_RETRIES", 3))
+    STORAGE_WARM_ON_START = _env_bool("STORAGE_WARM_ON_START", True)
+    # How GET /uploads/<name> sends local files: "flask" (from Python, with
+    # conditional and range support), "x-sendfile" (Apache mod_xsendfile,
+    # lighttpd) or "x-accel" (nginx internal location at UPLOAD_ACCEL_PREFIX)
+    UPLOAD_SERVE_MODE = os.environ.get("UPLOAD_SERVE_MODE", "flask")
+    UPLOAD_ACCEL_PREFIX = os.environ.get("UPLOAD_ACCEL_PREFIX", "/protected-uploads/")
+    UPLOAD_CACHE_MAX_AGE = int(os.environ.get("UPLOAD_CACHE_MAX_AGE", 365 * 24 * 3600))
+
+    # Upload image pipeline (services/images.py): EXIF-free original plus
+    # variants at each width in each format, built by a worker pool
+    IMAGE_WIDTHS = os.environ.get("IMAGE_WIDTHS", "320,960,1600")
+    IMAGE_FORMATS = os.environ.get("IMAGE_FORMATS", "webp,avif")
+    IMAGE_MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", 2048))
+    IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", 50_000_000))
+    IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", 85))
+    IMAGE_WEBP_QUALITY = int(os.environ.get("IMAGE_WEBP_QUALITY", 80))
+    IMAGE_AVIF_QUALITY = int(os.environ.get("IMAGE_AVIF_QUALITY", 55))
+    IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", 2))
+    IMAGE_QUEUE_SIZE = int(os.environ.get("IMAGE_QUEUE_SIZE", 16))
+    IMAGE_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("IMAGE_QUEUE_TIMEOUT_SECONDS", 10))
+    # Where uploads wait for the workers (default: the system temp dir)
+    IMAGE_SPOOL_DIR = os.environ.get("IMAGE_SPOOL_DIR")
+    # Uploads no suggestion, edit or mosque refers to are deleted after this
+    # long, checked every IMAGE_ORPHAN_SWEEP_SECONDS (services/blobs.py)
+    IMAGE_ORPHAN_GRACE_SECONDS = int(os.environ.get("IMAGE_ORPHAN_GRACE_SECONDS", 24 * 3600))
+    IMAGE_ORPHAN_SWEEP_SECONDS = int(os.environ.get("IMAGE_ORPHAN_SWEEP_SECONDS", 3600))
+
+    # AI moderation of submissions; "stub" uses the offline heuristic model
+    AI_MODERATION_ASYNC = _env_bool("AI_MODERATION_ASYNC", True)
+    AI_MODERATION_MODEL = os.environ.get("AI_MODERATION_MODEL", "gemini")
+    AI_MODERATION_WORKERS = int(os.environ.get("AI_MODERATION_WORKERS", 2))
+    AI_MODERATION_BATCH_SIZE = int(os.environ.get("AI_MODERATION_BATCH_SIZE", 8))
+    AI_MODERATION_BATCH_WAIT_SECONDS = float(os.environ.get("AI_MODERATION_BATCH_WAIT_SECONDS", 0.5))
+    AI_MODERATION_SWEEP_AFTER_SECONDS = float(os.environ.get("AI_MODERATION_SWEEP_AFTER_SECONDS", 60))
+    AI_MODERATION_QUEUE_SIZE = int(os.environ.get("AI_MODERATION_QUEUE_SIZE", 1000))
+    # Concurrent Gemini calls per process; beyond it, decisions fall back to the heuristic
+    AI_MODERATION_MAX_CONCURRENCY = int(os.environ.get("AI_MODERATION_MAX_CONCURRENCY", 4))
+
+    # Token-bucket limits on writes (services/ratelimit.py), per client (JWT
+    # identity + IP) and blueprint: "<blueprint>=<requests>/<seconds>,..."
+    # All guests share one identity, so guests behind the same NAT address
+    # share each budget; raise them if many users come from one network.
+    # Guest logins (no credentials) don't count against "auth".
+    RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")  # memory, redis, none
+    RATE_LIMITS = os.environ.get(
+        "RATE_LIMITS",
+        "suggestions=5/60,edits=10/60,reviews=10/60,confirmations=30/60,upload=20/60,auth=20/60",
+    )
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 0))
 
 
 class DevelopmentConfig(BaseConfig):
     DEBUG = True
+    # Quick dev: a fresh SQLite file gets its tables without any setup
+    AUTO_CREATE_TABLES = _env_bool("AUTO_CREATE_TABLES", True)
 
 
 class ProductionConfig(BaseConfig):
     DEBUG = False
+    # App Service's front end appends the client address to X-Forwarded-For
+    RATE_LIMIT_TRUSTED_PROXIES = int(os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", 1))
 
 
 config_by_name = {
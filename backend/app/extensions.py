@@ -1,10 +1,31 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_smorest import Api
 from flask_cors import CORS
 
-db = SQLAlchemy()
+
+class RoutingSession(Session):
+    """Session that runs default-bind reads on ``info["read_engine"]`` when set.
+
+    ``services/replicas.py`` sets it per request for replica-routed GETs.
+    The first flush drops it, so writes and every later read in the request
+    go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        read_engine = self.info.get("read_engine")
+        if read_engine is None or bind is not None:
+            return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if self._flushing:
+            self.info.pop("read_engine", None)
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        engine = super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        return read_engine if engine is self._db.engines[None] else engine
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 api = Api()
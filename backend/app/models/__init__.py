@@ -5,6 +5,10 @@ from .review import Review
 from .edit import MosqueEditSuggestion
 from .edit_confirmation import EditConfirmation
 from .user import User
+from .rating_stats import MosqueRatingStats
+from .moderation_result import ModerationResult
+from .stored_blob import StoredBlob
+from .mosque_tombstone import MosqueTombstone
 
 __all__ = [
 "Mosque",
@@ -14,4 +18,8 @@ __all__ = [
     "MosqueEditSuggestion",
     "EditConfirmation",
     "User",
+    "MosqueRatingStats",
+    "ModerationResult",
+    "StoredBlob",
+    "MosqueTombstone",
 ]
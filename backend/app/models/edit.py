@@ -8,6 +8,7 @@ class MosqueEditSuggestion(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     mosque_id = db.Column(db.Integer, db.ForeignKey("mosques.id"), nullable=False, index=True)
     patch_json = db.Column(db.JSON, default=dict)  # Partial update; allowed fields only
+    image_blob_key = db.Column(db.String(64))  # stored_blobs key of patch_json's image_url, while referenced
     status = db.Column(db.String(20), default="pending")  # pending/approved/rejected
     confirmations_count = db.Column(db.Integer, nullable=False, default=0)
     created_by_user_id = db.Column(db.Integer)
@@ -0,0 +1,13 @@
+from datetime import datetime
+from ..extensions import db
+
+
+class ModerationResult(db.Model):
+    """Shared AI moderation decisions, keyed by hash of normalized text + prompt/model version."""
+
+    __tablename__ = "moderation_results"
+
+    key = db.Column(db.String(64), primary_key=True)  # sha256 hex
+    model_version = db.Column(db.String(120), nullable=False)
+    result = db.Column(db.JSON, nullable=False)  # {decision, labels, reason}
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,5 +1,7 @@
 from datetime import datetime
+from sqlalchemy import event
 from ..extensions import db
+from ..utils.text import normalize_search_text
 
 
 class Mosque(db.Model):
@@ -16,6 +18,9 @@ class Mosque(db.Model):
 
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    # On PostGIS databases a generated ``geog geography(Point, 4326)`` column with
+    # a GiST index mirrors these (migration 3f9c2a71b8e4). It is deliberately not
+    # mapped so SQLite/vanilla Postgres keep working; see services/nearby.py.
 
     facilities_json = db.Column(db.JSON, default=dict)
 
@@ -29,9 +34,20 @@ class Mosque(db.Model):
     imam_jumua_name = db.Column(db.String(120))
 
     approved = db.Column(db.Boolean, default=True)  # Only approved exposed publicly
+    # Normalized name/location text for search (trigram-indexed on Postgres)
+    search_text = db.Column(db.String(600))
     image_url = db.Column(db.String(500))
+    image_blob_key = db.Column(db.String(64))  # stored_blobs key this row holds a reference to
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+    # Loaded on demand: add ``selectinload(Mosque.rating_stats)`` where ratings are serialized
+    rating_stats = db.relationship("MosqueRatingStats", uselist=False, lazy="select")
+
+    @property
+    def rating_summary(self):
+        from ..services.ratings import summarize
+        return summarize(self.rating_stats)
 
     def to_dict(self):
         return {
@@ -56,3 +72,13 @@ class Mosque(db.Model):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
+
+    def refresh_search_text(self):
+        parts = (self.arabic_name, self.city, self.delegation, self.governorate)
+        self.search_text = normalize_search_text(" ".join(p for p in parts if p))[:600]
+
+
+@event.listens_for(Mosque, "before_insert")
+@event.listens_for(Mosque, "before_update")
+def _keep_search_text_in_sync(_mapper, _connection, target):
+    target.refresh_search_text()
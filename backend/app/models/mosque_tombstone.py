@@ -0,0 +1,29 @@
+from datetime import datetime
+from sqlalchemy import event
+from ..extensions import db
+from .mosque import Mosque
+
+
+class MosqueTombstone(db.Model):
+    """A hard-deleted mosque, so ``/mosques/changes`` can tell clients to drop it."""
+
+    __tablename__ = "mosque_tombstones"
+
+    mosque_id = db.Column(db.Integer, primary_key=True)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+
+# Written on the flush's own connection, so a tombstone commits (or rolls back)
+# together with the delete. Bulk Query.delete()/raw SQL bypass mapper events.
+@event.listens_for(Mosque, "after_delete")
+def _record_tombstone(_mapper, connection, target):
+    table = MosqueTombstone.__table__
+    connection.execute(table.delete().where(table.c.mosque_id == target.id))
+    connection.execute(table.insert().values(mosque_id=target.id, deleted_at=datetime.utcnow()))
+
+
+@event.listens_for(Mosque, "after_insert")
+def _clear_tombstone(_mapper, connection, target):
+    # SQLite can hand a deleted id out again
+    table = MosqueTombstone.__table__
+    connection.execute(table.delete().where(table.c.mosque_id == target.id))
@@ -0,0 +1,16 @@
+from datetime import datetime
+from ..extensions import db
+
+
+class MosqueRatingStats(db.Model):
+    """Running totals over a mosque's approved reviews (maintained by services.ratings)."""
+
+    __tablename__ = "mosque_rating_stats"
+
+    mosque_id = db.Column(db.Integer, db.ForeignKey("mosques.id", ondelete="CASCADE"), primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_histogram = db.Column(db.JSON, default=dict)  # {"1": n, ..., "5": n}
+    criteria_sums = db.Column(db.JSON, default=dict)  # {criterion: sum}
+    criteria_counts = db.Column(db.JSON, default=dict)  # {criterion: reviews scoring it}
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -14,3 +14,8 @@ class Review(db.Model):
     created_by_user_id = db.Column(db.Integer)  # optional; anonymous allowed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Serves the keyset-paginated public listing (mosque, approved, newest first)
+        db.Index("ix_reviews_mosque_status_created_id", "mosque_id", "status", "created_at", "id"),
+    )
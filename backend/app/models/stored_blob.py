@@ -0,0 +1,17 @@
+from datetime import datetime
+from ..extensions import db
+
+
+class StoredBlob(db.Model):
+    """One uploaded image, stored once per content hash (see services/blobs.py)."""
+
+    __tablename__ = "stored_blobs"
+
+    key = db.Column(db.String(64), primary_key=True)  # sha256 hex of the uploaded bytes
+    kind = db.Column(db.String(8), nullable=False)  # jpg, png, gif, webp
+    size = db.Column(db.Integer, nullable=False)
+    width = db.Column(db.Integer)  # of the stored original; None for keys stored before widths were recorded
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # rows whose image_blob_key is this key
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, ready, failed, deleting
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -29,6 +29,7 @@ class MosqueSuggestion(db.Model):
     imam_jumua_name = db.Column(db.String(120))
     
     image_url = db.Column(db.String(500))
+    image_blob_key = db.Column(db.String(64))  # stored_blobs key this row holds a reference to
 
     status = db.Column(db.String(32), nullable=False, default="pending_ai_review")
     confirmations_count = db.Column(db.Integer, nullable=False, default=0)
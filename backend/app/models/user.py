@@ -1,5 +1,5 @@
 from ..extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from ..services.passwords import password_hasher
 
 class User(db.Model):
     __tablename__ = "users"
@@ -13,7 +13,8 @@ class User(db.Model):
     # suggestions = db.relationship("MosqueSuggestion", backref="created_by", lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # Runs on the bounded hashing pool; may raise PasswordHasherBusy
+        return password_hasher.verify(self.password_hash, password)
@@ -3,34 +3,40 @@ from flask_smorest import Blueprint
 from flask import request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from ..models import User
-from ..extensions import db
+from ..services.identity import GUEST_USERNAME, identity_claims, user_cache
+from ..services.passwords import PasswordHasherBusy, password_hasher
+from ..services.ratelimit import rate_limiter
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth", description="Authentication endpoints")
 
+
+def _is_guest_login() -> bool:
+    data = request.get_json(silent=True) or {}
+    return not data.get("username") and data.get("role") == "user"
+
+
+# The auth budget slows password guessing. A guest login checks no password,
+# and every app launch behind one NAT address would share its bucket.
+rate_limiter.exempt("auth.login", _is_guest_login)
+
 @auth_bp.route("/login", methods=["POST"])
 def login():
     data = request.get_json(silent=True) or {}
     username = data.get("username")
     password = data.get("password")
-    role_req = data.get("role")
 
     # 1. Mobile App Guest/User Login (No credentials, just role="guest")
-    if not username and role_req == "user":
+    if _is_guest_login():
         # Security: Allow anonymous/guest login but map to a restrictive role
-        # We find or create a 'guest' user in the DB so that user_id is valid
-        guest = User.query.filter_by(username="guest").first()
-        if not guest:
-            guest = User(username="guest", role="guest")
-            guest.set_password("guest_access_key_123") # Internal implementation detail
-            db.session.add(guest)
-            db.session.commit()
+        # A 'guest' user in the DB keeps user_id valid; its id is resolved once per process
+        guest_id = user_cache.guest_id()
         
         token = create_access_token(
-            identity=str(guest.id),
+            identity=str(guest_id),
             expires_delta=timedelta(days=365), # Long lived for app
-            additional_claims={"role": "guest"}
+            additional_claims={"role": "guest", "username": GUEST_USERNAME}
         )
-        return {"access_token": token, "role": "guest", "user_id": guest.id}, 200
+        return {"access_token": token, "role": "guest", "user_id": guest_id}, 200
 
     # 2. Admin/Moderator Login (Requires Username + Password)
     if not username:
@@ -38,14 +44,21 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if not user or not password or not user.check_password(password):
+    try:
+        valid = bool(user and password and user.check_password(password))
+    except PasswordHasherBusy as e:
+        return {"message": str(e)}, 503, {"Retry-After": "2"}
+    if not valid:
         return {"message": "Invalid credentials"}, 401
+    # Old hashing parameters are upgraded in the background
+    password_hasher.rehash_later(user.id, password, user.password_hash)
 
     token = create_access_token(
         identity=str(user.id),
         expires_delta=timedelta(days=7),
-        additional_claims={"role": user.role}
+        additional_claims=identity_claims(user)
     )
+    user_cache.remember(user)
     
     return {"access_token": token, "role": user.role, "user_id": user.id}, 200
 
@@ -53,9 +66,10 @@ def login():
 @jwt_required()
 def me():
     identity = get_jwt_identity()
-    user = User.query.get(int(identity))
+    # Served from the user cache; a role change shows up here, not just on the next login
+    user = user_cache.get(int(identity))
     return {
         "user_id": int(identity),
-        "username": user.username if user else "Deleted",
-        "role": user.role if user else "unknown"
+        "username": user["username"] if user else "Deleted",
+        "role": user["role"] if user else "unknown"
     }
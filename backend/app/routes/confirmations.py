@@ -2,8 +2,15 @@ from flask_smorest import Blueprint, abort
 from sqlalchemy.exc import IntegrityError
 from ..extensions import db
 from ..models import MosqueSuggestion, SuggestionConfirmation
-from ..services.moderation import approve_suggestion, APPROVAL_CONFIRMATION_THRESHOLD
+from ..services.moderation import (
+    APPROVAL_CONFIRMATION_THRESHOLD,
+    CONFIRMABLE_STATUSES,
+    approve_suggestion,
+    claim_suggestion_approval,
+    increment_confirmations,
+)
 from ..schemas.suggestion import MosqueSuggestionSchema
+from ..services.cache import response_cache
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 
@@ -25,14 +32,18 @@ def add_confirmation(suggestion_id: int):
     except (TypeError, ValueError):
         abort(401, message="Invalid token identity")
     c = SuggestionConfirmation(suggestion_id=s.id, user_id=user_id)
-    mosque = None
     try:
         db.session.add(c)
-        s.confirmations_count = (s.confirmations_count or 0) + 1
-        if s.confirmations_count >= APPROVAL_CONFIRMATION_THRESHOLD and s.status not in ("approved", "rejected"):
-            mosque = approve_suggestion(s)
+        db.session.flush()  # a duplicate fails here, before the count moves
+        count = increment_confirmations(MosqueSuggestion, s.id)
+        # Still in AI review (or rejected): the confirmation counts, but can't approve
+        if count >= APPROVAL_CONFIRMATION_THRESHOLD and claim_suggestion_approval(
+            s.id, from_statuses=CONFIRMABLE_STATUSES
+        ):
+            approve_suggestion(s)
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
         abort(400, message="Duplicate confirmation for this user")
+    response_cache.invalidate("suggestions:public")
     return s
@@ -6,8 +6,9 @@ from ..models import Mosque, MosqueEditSuggestion, EditConfirmation
 from ..schemas.edit import MosqueEditSuggestionCreateSchema, MosqueEditSuggestionSchema
 from ..utils.facilities import sanitize_facilities
 from ..utils.iqama import sanitize_times, valid_time_str
-from ..services.moderation import APPROVAL_CONFIRMATION_THRESHOLD
-from ..services.ai_moderation import moderate_text
+from ..services.moderation import increment_confirmations
+from ..services.blobs import blob_store
+from ..services.moderation_queue import PENDING_AI_STATUS, moderation_queue
 from sqlalchemy.exc import IntegrityError
 
 
@@ -74,19 +75,13 @@ class MosqueEditsResource(MethodView):
 
         if not patch:
             abort(400, message="Empty patch")
-        mod_input = " ".join([
-            patch.get("address") or "",
-            patch.get("jumuah_time") or "",
-            str(patch.get("eid_info") or ""),
-            " ".join(sorted(patch.keys())),
-        ])
-        decision = moderate_text(mod_input)
-        status = "pending_approval" if decision.get("decision") == "valid" else "rejected"
 
         s = MosqueEditSuggestion(mosque_id=mosque_id, patch_json=patch, created_by_user_id=user_id)
-        s.status = status
+        s.status = PENDING_AI_STATUS
+        s.image_blob_key = blob_store.acquire(patch.get("image_url"))
         db.session.add(s)
         db.session.commit()
+        moderation_queue.submit("edit", s.id)
         return s
 
 
@@ -105,7 +100,8 @@ def confirm_edit(edit_id: int):
     c = EditConfirmation(edit_id=s.id, user_id=user_id)
     try:
         db.session.add(c)
-        s.confirmations_count = (s.confirmations_count or 0) + 1
+        db.session.flush()  # a duplicate fails here, before the count moves
+        increment_confirmations(MosqueEditSuggestion, s.id)
         db.session.commit()
     except IntegrityError:
         db.session.rollback()
@@ -1,4 +1,5 @@
 from flask_smorest import Blueprint
+from ..services.cache import response_cache
 from ..utils.facilities import FACILITY_OPTIONS
 from ..schemas.meta import FacilitiesListSchema
 
@@ -7,6 +8,7 @@ meta_bp = Blueprint("meta", __name__, url_prefix="/meta", description="Metadata
 
 
 @meta_bp.route("/facilities")
+@response_cache.cached("meta:facilities")
 @meta_bp.response(200, FacilitiesListSchema)
 def list_facilities():
     return {"facilities": FACILITY_OPTIONS}
@@ -1,13 +1,27 @@
 ﻿from flask_smorest import Blueprint, abort
+from flask import current_app
 from flask_jwt_extended import jwt_required, get_jwt
 from ..extensions import db
 from ..models import MosqueSuggestion, Mosque, MosqueEditSuggestion
 from ..models import EditConfirmation
-from ..services.moderation import approve_suggestion, approve_edit_suggestion
+from ..services.moderation import approve_suggestion, approve_edit_suggestion, claim_suggestion_approval
 from ..schemas.suggestion import MosqueSuggestionSchema
 from ..models import Review
 from ..schemas.review import ReviewSchema
 from ..schemas.edit import MosqueEditSuggestionSchema
+from ..services.blobs import blob_store
+from ..services.cache import response_cache
+from ..services.db_pool import db_pool
+from ..services.identity import user_cache
+from ..services.moderation_cache import moderation_cache
+from ..services.moderation_queue import moderation_queue
+from ..services.passwords import password_hasher
+from ..services.ratelimit import rate_limiter
+from ..services.ratings import forget_review, set_review_status
+from ..services.replicas import replica_router
+from ..services.images import image_pipeline
+from ..services.startup import startup_stats
+from ..services.storage import upload_storage
 
 
 moderation_bp = Blueprint(
@@ -55,7 +69,9 @@ def approve_suggestion_route(suggestion_id: int):
         return s
         
     try:
-        approve_suggestion(s)
+        # Also guards against a confirmation approving it concurrently
+        if claim_suggestion_approval(s.id):
+            approve_suggestion(s)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -63,7 +79,9 @@ def approve_suggestion_route(suggestion_id: int):
         traceback.print_exc()
         # Return the actual error message to the client
         return {"message": f"Approval failed: {str(e)}", "error_type": type(e).__name__}, 500
-        
+
+    # The new mosque row itself is invalidated through mosque_events
+    response_cache.invalidate("suggestions:public")
     return s
 
 
@@ -79,7 +97,9 @@ def reject_suggestion_route(suggestion_id: int):
     if not s:
         abort(404, message="Suggestion not found")
     s.status = "rejected"
+    blob_store.release(s)
     db.session.commit()
+    response_cache.invalidate("suggestions:public")
     return s
 
 @moderation_bp.route("/suggestions/<int:suggestion_id>", methods=["DELETE"])
@@ -94,8 +114,10 @@ def delete_suggestion(suggestion_id: int):
     if not s:
         abort(404, message="Suggestion not found")
         
+    blob_store.release(s)
     db.session.delete(s)
     db.session.commit()
+    response_cache.invalidate("suggestions:public")
     return {"message": "Suggestion deleted"}, 200
 
 # --- REVIEWS ---
@@ -111,12 +133,13 @@ def approve_review(review_id: int):
     r = Review.query.get(review_id)
     if not r:
         abort(404, message="Review not found")
-    r.status = "approved"
+    set_review_status(r, "approved")
     try:
         db.session.commit()
     except Exception as e:
         db.session.rollback()
         abort(500, message=f"Review approval failed: {str(e)}")
+    response_cache.invalidate(f"reviews:{r.mosque_id}")
     return r
 
 
@@ -131,8 +154,9 @@ def reject_review(review_id: int):
     r = Review.query.get(review_id)
     if not r:
         abort(404, message="Review not found")
-    r.status = "rejected"
+    set_review_status(r, "rejected")
     db.session.commit()
+    response_cache.invalidate(f"reviews:{r.mosque_id}")
     return r
 
 @moderation_bp.route("/reviews/<int:review_id>", methods=["DELETE"])
@@ -147,8 +171,11 @@ def delete_review(review_id: int):
     if not r:
         abort(404, message="Review not found")
         
+    mosque_id = r.mosque_id
+    forget_review(r)
     db.session.delete(r)
     db.session.commit()
+    response_cache.invalidate(f"reviews:{mosque_id}")
     return {"message": "Review deleted"}, 200
 
 
@@ -241,6 +268,7 @@ def reject_edit(edit_id: int):
         abort(404, message="Edit not found")
     
     e.status = "rejected"
+    blob_store.release(e)
     db.session.commit()
     return e
 
@@ -257,6 +285,32 @@ def delete_edit(edit_id: int):
     if not e:
         abort(404, message="Edit not found")
         
+    blob_store.release(e)
     db.session.delete(e)
     db.session.commit()
     return {"message": "Edit deleted"}, 200
+
+
+# --- METRICS ---
+
+@moderation_bp.route("/metrics", methods=["GET"])
+@jwt_required()
+def metrics():
+    claims = get_jwt() or {}
+    role = claims.get("role")
+    if role not in ("admin", "moderator"):
+        abort(403, message="Moderator/Admin role required")
+
+    return {
+        "ai_moderation_cache": moderation_cache.stats(),
+        "db_pool": db_pool.stats(),
+        "read_replicas": replica_router.stats(),
+        "startup": startup_stats(current_app),
+        "uploads": upload_storage.stats.snapshot(),
+        "images": image_pipeline.stats(),
+        "image_dedup": blob_store.stats(),
+        "auth_user_cache": user_cache.stats(),
+        "passwords": password_hasher.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "ai_moderation_queue": moderation_queue.stats(),
+    }, 200
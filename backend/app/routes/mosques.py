@@ -1,7 +1,24 @@
-from math import cos, radians
+from flask import Response, current_app, request
 from flask_smorest import Blueprint, abort
-from ..models import Mosque, MosqueSuggestion
-from ..schemas.mosque import MosqueSchema, MosqueListQuerySchema, NearbyQuerySchema
+from sqlalchemy.orm import selectinload
+from ..models import Mosque, MosqueSuggestion, MosqueTombstone
+from ..services.cache import response_cache
+from ..services.clusters import cluster_dicts, cluster_index
+from ..services.geo_index import geo_index
+from ..services.nearby import nearby_from_db
+from ..services.search import search_mosques
+from ..services.serialization import (
+    json_response, mosque_load_options, mosque_rows, mosque_serializer, parse_mosque_fields,
+    project_mosques, suggestion_serializer, table_rows,
+)
+from ..services.tiles import TILE_MIMETYPE, mosque_tiles, tile_tag
+from ..services.snapshot import CHANGES_OVERLAP, from_version, snapshot_store, to_version
+from ..utils.geo import bounding_box
+from ..utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ..schemas.mosque import (
+    MosqueSchema, MosqueListQuerySchema, NearbyQuerySchema, ChangesQuerySchema, MosqueChangesSchema,
+    ClusterQuerySchema, MosqueClustersSchema,
+)
 from ..schemas.suggestion import MosqueSuggestionSchema
 
 mosques_bp = Blueprint(
@@ -9,7 +26,15 @@ mosques_bp = Blueprint(
 )
 
 
+def _requested_fields(args):
+    try:
+        return parse_mosque_fields(args.get("field_set"))
+    except ValueError as e:
+        abort(400, message=str(e))
+
+
 @mosques_bp.route("")
+@response_cache.cached("mosques")
 @mosques_bp.arguments(MosqueListQuerySchema, location="query")
 @mosques_bp.response(200, MosqueSchema(many=True))
 def list_mosques(args):
@@ -17,7 +42,8 @@ def list_mosques(args):
     governorate = args.get("governorate")
     city = args.get("city")
     mtype = args.get("type")
-    search = args.get("search")
+    search = (args.get("search") or "").strip()
+    names = _requested_fields(args)
 
     if governorate:
         query = query.filter(Mosque.governorate.ilike(f"%{governorate}%"))
@@ -25,25 +51,140 @@ def list_mosques(args):
         query = query.filter(Mosque.city.ilike(f"%{city}%"))
     if mtype:
         query = query.filter(Mosque.type == mtype)
-    if search:
-        query = query.filter(Mosque.arabic_name.ilike(f"%{search}%"))
 
     limit = min(int(args.get("limit", 50)), 500)
-    offset = int(args.get("offset", 0))
-    items = query.offset(offset).limit(limit).all()
-    return items
+    position = {}
+    if args.get("cursor"):
+        try:
+            position = decode_cursor(args["cursor"])
+        except ValueError:
+            abort(400, message="Invalid cursor")
+
+    headers = {}
+    if search:
+        # Ranked results can't be keyset-paged; the cursor carries an offset instead
+        try:
+            offset = int(position.get("offset", args.get("offset", 0)))
+        except (TypeError, ValueError):
+            abort(400, message="Invalid cursor")
+        query = query.options(*mosque_load_options(names)) if names else query.options(selectinload(Mosque.rating_stats))
+        items = search_mosques(query, search, offset, limit + 1)
+        if len(items) > limit:
+            items = items[:limit]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor({"offset": offset + limit})
+        if names:
+            return json_response(mosque_serializer.dump_many(project_mosques(items, names), names)), headers
+        return items, headers
+
+    query = query.order_by(Mosque.id)
+    if position:
+        # Keyset mode: seek past the last id instead of scanning skipped rows
+        try:
+            after_id = int(position["id"])
+        except (KeyError, TypeError, ValueError):
+            abort(400, message="Invalid cursor")
+        query = query.filter(Mosque.id > after_id)
+    else:
+        # Legacy offset mode
+        query = query.offset(int(args.get("offset", 0)))
+
+    rows = mosque_rows(query.limit(limit + 1), names)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor({"id": rows[-1]["id"]})
+    return json_response(mosque_serializer.dump_many(rows, names)), headers
+
+@mosques_bp.route("/snapshot")
+@mosques_bp.doc(description="Every approved mosque in one precompressed payload. Send the ETag back in If-None-Match to get a 304.")
+def mosques_snapshot():
+    snap = snapshot_store.current()
+    coding = request.accept_encodings.best_match([c for c in ("br", "gzip") if c in snap.bodies]) or "identity"
+    etag = snap.etag if coding == "identity" else f"{snap.etag}-{coding}"
+    # Any representation of the same content satisfies the client's cache
+    known = {tag.split("-", 1)[0] for tag in request.if_none_match.as_set()}
+
+    resp = Response(status=304) if snap.etag in known else Response(snap.bodies[coding], mimetype="application/json")
+    if resp.status_code == 200 and coding != "identity":
+        resp.headers["Content-Encoding"] = coding
+    resp.set_etag(etag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Data-Version"] = str(snap.version)
+    return resp
+
+
+@mosques_bp.route("/tiles/<int:z>/<int:x>/<int:y>")
+@response_cache.cached("tiles", tags=lambda z, x, y: [tile_tag(z, x, y)])
+@mosques_bp.doc(description="Packed binary pins (and clusters at low zoom) for one slippy-map tile. Layout in services/tiles.py.")
+def mosque_tile(z: int, x: int, y: int):
+    if not mosque_tiles.valid(z, x, y):
+        abort(404, message="Tile not found")
+    return Response(mosque_tiles.render(z, x, y), mimetype=TILE_MIMETYPE)
+
+
+@mosques_bp.route("/clusters")
+@response_cache.cached("clusters", tags=lambda: ["mosques"])
+@mosques_bp.arguments(ClusterQuerySchema, location="query")
+@mosques_bp.response(200, MosqueClustersSchema)
+def mosque_clusters(args):
+    if args.get("bbox"):
+        try:
+            west, south, east, north = (float(v) for v in args["bbox"].split(","))
+        except ValueError:
+            abort(400, message="bbox must be west,south,east,north")
+        if west > east or south > north:
+            abort(400, message="bbox must be west,south,east,north")
+    elif all(k in args for k in ("lat", "lng", "radius")):
+        south, north, west, east = bounding_box(args["lat"], args["lng"], args["radius"])
+    else:
+        abort(400, message="Provide bbox, or lat, lng and radius")
+
+    zoom, cells = cluster_index.query_bbox(south, north, west, east, args["zoom"])
+    return {"zoom": zoom, "clusters": cluster_dicts(cells)}
+
+
+@mosques_bp.route("/changes")
+@mosques_bp.arguments(ChangesQuerySchema, location="query")
+@mosques_bp.response(200, MosqueChangesSchema)
+def mosques_changes(args):
+    since = args["since"]
+    cutoff = from_version(since) - CHANGES_OVERLAP
+    changed = (
+        Mosque.query.options(selectinload(Mosque.rating_stats))
+        .filter(Mosque.updated_at > cutoff)
+        .order_by(Mosque.updated_at, Mosque.id)
+        .all()
+    )
+    # Hard deletes leave no row behind, only a tombstone
+    deleted = (
+        MosqueTombstone.query.filter(MosqueTombstone.deleted_at > cutoff)
+        .order_by(MosqueTombstone.deleted_at, MosqueTombstone.mosque_id)
+        .all()
+    )
+    version = max(
+        [since] + [to_version(m.updated_at) for m in changed] + [to_version(t.deleted_at) for t in deleted]
+    )
+    return {
+        "version": version,
+        "mosques": [m for m in changed if m.approved],
+        "removed": [m.id for m in changed if not m.approved] + [t.mosque_id for t in deleted],
+    }
+
 
 @mosques_bp.route("/suggestions/public")
+@response_cache.cached("suggestions:public")
 @mosques_bp.response(200, MosqueSuggestionSchema(many=True))
 def list_public_suggestions():
     # Helper to get all pending suggestions for public confirmation
-    return MosqueSuggestion.query.filter_by(status='pending_approval').order_by(MosqueSuggestion.created_at.desc()).all()
+    query = MosqueSuggestion.query.filter_by(status='pending_approval').order_by(MosqueSuggestion.created_at.desc())
+    return json_response(suggestion_serializer.dump_many(table_rows(query)))
 
 
 @mosques_bp.route("/<int:mosque_id>")
+@response_cache.cached("mosque", tags=lambda mosque_id: [f"mosque:{mosque_id}"])
 @mosques_bp.response(200, MosqueSchema)
 def get_mosque(mosque_id: int):
-    m = Mosque.query.filter_by(id=mosque_id, approved=True).first()
+    m = Mosque.query.options(selectinload(Mosque.rating_stats)).filter_by(id=mosque_id, approved=True).first()
     if not m:
         abort(404, message="Mosque not found")
     return m
@@ -56,37 +197,19 @@ def nearby_mosques(args):
     lat = args["lat"]
     lng = args["lng"]
     radius_km = args.get("radius", 5)
-
-    dlat = radius_km / 111.0
-    dlng = radius_km / (111.0 * max(cos(radians(lat)), 0.0001))
-
-    min_lat = lat - dlat
-    max_lat = lat + dlat
-    min_lng = lng - dlng
-    max_lng = lng + dlng
-
-    candidates = (
-        Mosque.query.filter_by(approved=True)
-        .filter(Mosque.latitude.between(min_lat, max_lat))
-        .filter(Mosque.longitude.between(min_lng, max_lng))
-        .all()
-    )
-
-    def haversine_km(lat1, lon1, lat2, lon2):
-        from math import radians, sin, cos, sqrt, atan2
-
-        R = 6371.0
-        dlat = radians(lat2 - lat1)
-        dlon = radians(lon2 - lon1)
-        a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-        c = 2 * atan2(sqrt(a), sqrt(1 - a))
-        return R * c
-
-    inside = []
-    for m in candidates:
-        if m.latitude is None or m.longitude is None:
-            continue
-        dist = haversine_km(lat, lng, m.latitude, m.longitude)
-        if dist <= radius_km:
-            inside.append(m)
-    return inside
+    limit = args.get("limit")
+    names = _requested_fields(args)
+
+    if current_app.config.get("GEO_INDEX_ENABLED"):
+        hits = geo_index.query_radius(lat, lng, radius_km, limit=limit)
+        rows = [{**row, "distance_km": dist} for row, dist in hits]
+        if names:
+            rows = project_mosques(rows, names)
+        return json_response(mosque_serializer.dump_many(rows, names))
+
+    if names:
+        # Distances are computed from the coordinates, so those are always loaded
+        options = mosque_load_options(names, always=("latitude", "longitude"))
+        items = nearby_from_db(lat, lng, radius_km, limit, options=options)
+        return json_response(mosque_serializer.dump_many(project_mosques(items, names), names))
+    return nearby_from_db(lat, lng, radius_km, limit, options=(selectinload(Mosque.rating_stats),))
@@ -1,10 +1,15 @@
+from datetime import datetime
 from flask_smorest import Blueprint, abort
 from flask.views import MethodView
+from sqlalchemy import tuple_
 from ..extensions import db
 from ..models import Review, Mosque
 from ..schemas.review import ReviewCreateSchema, ReviewSchema, ReviewListQuerySchema
 from ..utils.reviews import sanitize_criteria
-from ..services.ai_moderation import moderate_text
+from ..utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ..services.moderation_queue import PENDING_AI_STATUS, moderation_queue
+from ..services.cache import response_cache
+from ..services.serialization import json_response, review_serializer, table_rows
 from flask_jwt_extended import get_jwt_identity, jwt_required
 
 
@@ -13,17 +18,56 @@ reviews_bp = Blueprint("reviews", __name__, url_prefix="/mosques", description="
 
 @reviews_bp.route("/<int:mosque_id>/reviews")
 class MosqueReviewsResource(MethodView):
+    @response_cache.cached("reviews", tags=lambda mosque_id: [f"reviews:{mosque_id}"])
     @reviews_bp.response(200, ReviewSchema(many=True))
     @reviews_bp.arguments(ReviewListQuerySchema, location="query")
     def get(self, args, mosque_id: int):
         m = Mosque.query.filter_by(id=mosque_id, approved=True).first()
         if not m:
             abort(404, message="Mosque not found")
-        q = Review.query.filter_by(mosque_id=mosque_id, status="approved").order_by(Review.created_at.desc())
+        q = Review.query.filter_by(mosque_id=mosque_id, status="approved")
         limit = args.get("limit", 20)
-        offset = args.get("offset", 0)
-        items = q.offset(offset).limit(limit).all()
-        return items
+        cursor = args.get("cursor")
+        if cursor:
+            # Keyset mode on (created_at, id), newest first. Legacy rows without
+            # created_at come after every dated row, newest id first.
+            try:
+                position = decode_cursor(cursor)
+                after_id = int(position["id"])
+                after_at = position["created_at"]
+                after_at = datetime.fromisoformat(after_at) if after_at is not None else None
+            except (KeyError, TypeError, ValueError):
+                abort(400, message="Invalid cursor")
+            if after_at is None:
+                rows = []
+            else:
+                rows = table_rows(
+                    q.filter(tuple_(Review.created_at, Review.id) < (after_at, after_id))
+                    .order_by(Review.created_at.desc(), Review.id.desc())
+                    .limit(limit + 1)
+                )
+            if len(rows) <= limit:
+                undated = q.filter(Review.created_at.is_(None)).order_by(Review.id.desc())
+                if after_at is None:
+                    undated = undated.filter(Review.id < after_id)
+                rows += table_rows(undated.limit(limit + 1 - len(rows)))
+        else:
+            # Legacy offset mode
+            rows = table_rows(
+                q.order_by(Review.created_at.desc().nulls_last(), Review.id.desc())
+                .offset(args.get("offset", 0))
+                .limit(limit + 1)
+            )
+
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            created_at = last["created_at"]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(
+                {"created_at": created_at.isoformat() if created_at is not None else None, "id": last["id"]}
+            )
+        return json_response(review_serializer.dump_many(rows)), headers
 
     @reviews_bp.arguments(ReviewCreateSchema)
     @reviews_bp.response(201, ReviewSchema)
@@ -39,22 +83,15 @@ class MosqueReviewsResource(MethodView):
                 created_by_user_id = int(identity)
             except (TypeError, ValueError):
                 abort(401, message="Invalid token identity")
-        mod_input = " ".join([
-            str(data["rating"]),
-            " ".join([f"{k}:{v}" for k, v in (data.get("criteria") or {}).items()]),
-            data.get("comment") or "",
-        ])
-        decision = moderate_text(mod_input)
-        status = "pending_approval" if decision.get("decision") == "valid" else "rejected"
-
         r = Review(
             mosque_id=mosque_id,
             rating=data["rating"],
             criteria=sanitize_criteria(data.get("criteria")),
             comment=data.get("comment"),
             created_by_user_id=created_by_user_id,
-            status=status,
+            status=PENDING_AI_STATUS,
         )
         db.session.add(r)
         db.session.commit()
+        moderation_queue.submit("review", r.id)
         return r
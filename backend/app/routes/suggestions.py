@@ -5,7 +5,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from ..models import MosqueSuggestion
 from ..utils.facilities import sanitize_facilities
 from ..schemas.suggestion import MosqueSuggestionCreateSchema, MosqueSuggestionSchema
-from ..services.ai_moderation import moderate_text
+from ..services.blobs import blob_store
+from ..services.moderation_queue import PENDING_AI_STATUS, moderation_queue
 
 
 suggestions_bp = Blueprint(
@@ -88,19 +89,12 @@ class MosqueSuggestionsResource(MethodView):
             imam_5_prayers_name=data.get("imam_5_prayers_name"),
             imam_jumua_name=data.get("imam_jumua_name"),
             created_by_user_id=created_by_user_id,
+            status=PENDING_AI_STATUS,
         )
-
-        mod_input = " ".join([
-            data.get("arabic_name") or "",
-            data.get("arabic_name") or "",
-            data.get("type") or "",
-            governorate,
-            data.get("city") or "",
-            data.get("address") or "",
-        ])
-        decision = moderate_text(mod_input)
-        s.status = "pending_approval" if decision.get("decision") == "valid" else "rejected"
-
+        # Keeps the uploaded photo until the suggestion is approved, rejected or deleted
+        s.image_blob_key = blob_store.acquire(s.image_url)
         db.session.add(s)
         db.session.commit()
+        # AI moderation runs in the background and moves it to pending_approval/rejected
+        moderation_queue.submit("suggestion", s.id)
         return s
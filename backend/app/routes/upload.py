@@ -1,9 +1,9 @@
-import os
-import uuid
-from flask import request, current_app, url_for, send_from_directory
+import time
+from flask import request
 from flask_smorest import Blueprint, abort
-from werkzeug.utils import secure_filename
-from azure.storage.blob import BlobServiceClient, ContentSettings
+from ..services.blobs import blob_store
+from ..services.images import ImagePipelineBusy, InvalidImage, image_pipeline
+from ..services.storage import UploadTooLarge, upload_storage
 
 # Use flask_smorest Blueprint to support API documentation arguments like 'description'
 upload_bp = Blueprint("upload", __name__, url_prefix="/uploads", description="File uploads")
@@ -13,16 +13,19 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def get_azure_client():
-    """Helper to get the Blob Service Client using the connection string."""
-    connect_str = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-    if not connect_str:
-        return None
-    return BlobServiceClient.from_connection_string(connect_str)
-
 @upload_bp.route("", methods=["POST"])
 def upload_file():
-    # 1. Validate File Existence
+    """Store an image; returns its ``url``, ``srcset`` and processing ``status``.
+
+    ``status: "pending"`` (HTTP 202): the files are still being written and
+    ``url`` and ``srcset`` return 404 until they are, usually within a few
+    seconds. The URL can go into a suggestion or edit right away, but a
+    client showing the photo should keep its local copy meanwhile (or retry
+    the URL). If processing fails the URL stays 404; uploading the same
+    photo again retries it. ``status: "ready"`` (HTTP 201): the files exist.
+    """
+    started = time.perf_counter()
+    # 1. Validate File Existence (first access spools the multipart body)
     if "file" not in request.files:
         abort(400, message="No file part in request")
     
@@ -34,60 +37,46 @@ def upload_file():
     if not allowed_file(file.filename):
         abort(400, message="File type not allowed. Use: png, jpg, jpeg, gif, webp")
 
-    # 2. Prepare Filename
-    ext = file.filename.rsplit(".", 1)[1].lower()
-    unique_name = f"{uuid.uuid4().hex}.{ext}"
-    content_type = file.content_type  # e.g., 'image/jpeg'
-
-    # 3. Check for Azure Configuration
-    connection_string = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
-    container_name = os.getenv('AZURE_CONTAINER_NAME', 'mosque-images')
-
-    if connection_string:
-        # --- PATH A: UPLOAD TO AZURE BLOB STORAGE (PROFESSIONAL) ---
+    # 2. Spool the file to disk (bounded by UPLOAD_MAX_BYTES), hashing as we go,
+    # and check what it really is
+    try:
+        path, digest = image_pipeline.spool(file.stream, upload_storage.max_bytes)
+    except UploadTooLarge as e:
+        abort(413, message=str(e))
+    queued = False
+    try:
         try:
-            blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-            
-            # Ensure container exists
-            container_client = blob_service_client.get_container_client(container_name)
-            if not container_client.exists():
-                container_client.create_container(public_access="blob")
-
-            # Upload the file
-            blob_client = blob_service_client.get_blob_client(container=container_name, blob=unique_name)
-            
-            # Reset file pointer to beginning before upload
-            file.seek(0)
-            blob_client.upload_blob(
-                file, 
-                blob_type="BlockBlob", 
-                content_settings=ContentSettings(content_type=content_type)
-            )
+            kind, width = image_pipeline.inspect(path)
+        except InvalidImage as e:
+            abort(400, message=str(e))
+        parsed = time.perf_counter()
 
-            # Return the direct public URL
-            return {"url": blob_client.url}, 201
+        # 3. Stored by content hash: a photo uploaded before is not written again.
+        # New ones go to the image workers, which write the EXIF-free original and
+        # resized variants to Azure Blob Storage if configured, else to local disk
+        try:
+            stored = blob_store.put(digest, kind, path, width)
+        except ImagePipelineBusy as e:
+            abort(503, message=str(e), headers={"Retry-After": "5"})
+        queued = stored.queued
+    finally:
+        if not queued:
+            image_pipeline.discard(path)
+    done = time.perf_counter()
 
-        except Exception as e:
-            current_app.logger.error(f"Azure Upload Error: {str(e)}")
-            current_app.logger.info("Azure upload failed. Falling back to local storage.")
-            # Do NOT return/abort here; allow flow to proceed to Path B (Local Fallback)
-            pass
-
-    # --- PATH B: UPLOAD TO LOCAL STORAGE (FALLBACK/DEV) ---
-    # Note: Files here disappear on Azure redeployment!
-    local_folder = os.path.join(os.getcwd(), "uploads")
-    os.makedirs(local_folder, exist_ok=True)
-    
-    file_path = os.path.join(local_folder, unique_name)
-    file.seek(0)
-    file.save(file_path)
-    
-    # Generate local URL
-    file_url = url_for("upload.serve_file", filename=unique_name, _external=True)
-    return {"url": file_url}, 201
+    timing = (
+        f"parse;dur={(parsed - started) * 1000:.1f}, "
+        f"queue;dur={(done - parsed) * 1000:.1f}"
+    )
+    # 202 while the files are still being written: the URLs 404 until then
+    body = {**image_pipeline.urls(stored.key, stored.kind, stored.width), "status": stored.status}
+    return body, 202 if stored.status == "pending" else 201, {"Server-Timing": timing}
 
 @upload_bp.route("/<path:filename>", methods=["GET"])
 def serve_file(filename):
-    """Serve local files (only used if Azure is not configured)."""
-    local_folder = os.path.join(os.getcwd(), "uploads")
-    return send_from_directory(local_folder, filename)
\ No newline at end of file
+    """Serve local files (only used if Azure is not configured).
+
+    Cached as immutable; with UPLOAD_SERVE_MODE=x-sendfile or x-accel the
+    front server sends the bytes.
+    """
+    return upload_storage.local.send(filename)
\ No newline at end of file
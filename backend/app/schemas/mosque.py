@@ -1,4 +1,5 @@
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
+from ..services.images import image_pipeline
 
 
 class FacilitiesMapSchema(Schema):
@@ -7,6 +8,20 @@ class FacilitiesMapSchema(Schema):
     pass
 
 
+class RatingSummarySchema(Schema):
+    count = fields.Int()
+    average = fields.Float(allow_none=True)
+    histogram = fields.Dict(keys=fields.Str(), values=fields.Int())  # "1".."5" -> reviews
+    criteria = fields.Dict(keys=fields.Str(), values=fields.Float())  # criterion -> average score
+
+
+class ImageSrcset(fields.Field):
+    """``image_url`` -> {format: srcset} of its resized variants, None for unprocessed images."""
+
+    def _serialize(self, value, attr, obj, **kwargs):
+        return image_pipeline.srcset(value)
+
+
 class MosqueSchema(Schema):
     id = fields.Int(dump_only=True)
     arabic_name = fields.Str(allow_none=True)
@@ -18,6 +33,7 @@ class MosqueSchema(Schema):
     latitude = fields.Float(allow_none=True)
     longitude = fields.Float(allow_none=True)
     image_url = fields.Str(allow_none=True)
+    image_srcset = ImageSrcset(attribute="image_url", dump_only=True)
     facilities = fields.Dict(keys=fields.Str(), values=fields.Boolean(), attribute="facilities_json")
     iqama_times = fields.Dict(keys=fields.Str(), values=fields.Str(), attribute="iqama_times_json")
     jumuah_time = fields.Str(allow_none=True)
@@ -30,17 +46,58 @@ class MosqueSchema(Schema):
     approved = fields.Bool(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
     updated_at = fields.DateTime(dump_only=True)
+    rating = fields.Nested(RatingSummarySchema, attribute="rating_summary", dump_only=True)
+    # Only present on /mosques/nearby results
+    distance_km = fields.Float(dump_only=True)
 
 
 class MosqueListQuerySchema(Schema):
     governorate = fields.Str()
     city = fields.Str()
     type = fields.Str()
+    search = fields.Str()  # name/location text; results are ranked by similarity
     limit = fields.Int(load_default=20)
-    offset = fields.Int(load_default=0)
+    offset = fields.Int(load_default=0)  # legacy; ignored when cursor is given
+    cursor = fields.Str()  # opaque token from the X-Next-Cursor response header
+    # ?fields=id,arabic_name,... or a preset such as "map"; id is always included
+    field_set = fields.Str(data_key="fields")
 
 
 class NearbyQuerySchema(Schema):
     lat = fields.Float(required=True)
     lng = fields.Float(required=True)
     radius = fields.Float(load_default=5)
+    limit = fields.Int(validate=validate.Range(min=1, max=500))
+    field_set = fields.Str(data_key="fields")  # same as on MosqueListQuerySchema
+
+
+class ClusterQuerySchema(Schema):
+    zoom = fields.Int(required=True, validate=validate.Range(min=0, max=22))
+    bbox = fields.Str()  # "west,south,east,north" in degrees
+    # Or a nearby-style circle (radius in km); its bounding box is used
+    lat = fields.Float()
+    lng = fields.Float()
+    radius = fields.Float(validate=validate.Range(min=0, min_inclusive=False))
+
+
+class MosqueClusterSchema(Schema):
+    latitude = fields.Float()  # centroid of the members
+    longitude = fields.Float()
+    count = fields.Int()
+    bbox = fields.List(fields.Float())  # [west, south, east, north] of the members
+    id = fields.Int(allow_none=True)  # the mosque, when count == 1
+
+
+class MosqueClustersSchema(Schema):
+    zoom = fields.Int()  # lower than requested when the area had too many cells
+    clusters = fields.List(fields.Nested(MosqueClusterSchema))
+
+
+class ChangesQuerySchema(Schema):
+    since = fields.Int(required=True, validate=validate.Range(min=0))  # version from /mosques/snapshot or /mosques/changes
+
+
+class MosqueChangesSchema(Schema):
+    version = fields.Int()
+    mosques = fields.List(fields.Nested(MosqueSchema))
+    removed = fields.List(fields.Int())
@@ -21,4 +21,5 @@ class ReviewSchema(Schema):
 
 class ReviewListQuerySchema(Schema):
     limit = fields.Int(load_default=20, validate=validate.Range(min=1, max=100))
-    offset = fields.Int(load_default=0, validate=validate.Range(min=0))
+    offset = fields.Int(load_default=0, validate=validate.Range(min=0))  # legacy; ignored when cursor is given
+    cursor = fields.Str()  # opaque token from the X-Next-Cursor response header
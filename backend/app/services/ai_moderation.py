@@ -2,29 +2,54 @@ import os
 import json
 import re
 import logging
-from typing import Dict, Any
-from google import genai
+import threading
+from typing import Dict, Any, List
+from .moderation_cache import cache_key, moderation_cache
+from .ratelimit import moderation_gate
+
+GEMINI_MODEL = "models/gemini-2.5-flash"
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
 
 _SPAM_PATTERNS = [
-    r"(?i)free money|click here|subscribe|http[s]?://",
+    r"free money|click here|subscribe|http[s]?://",
 ]
 _HATE_PATTERNS = [
-    r"(?i)kill|hate|racist|sexist|violent|terror|bomb",
+    r"kill|hate|racist|sexist|violent|terror|bomb",
 ]
 _NONSENSE_PATTERNS = [
     r"^[^A-Za-z0-9\s]{10,}$",
 ]
+# One pass over the text instead of one re.search per pattern
+_REJECT_RE = re.compile(
+    "|".join(f"(?:{p})" for p in _SPAM_PATTERNS + _HATE_PATTERNS + _NONSENSE_PATTERNS),
+    re.IGNORECASE,
+)
 
 
 def _heuristic_moderate(text: str) -> Dict[str, Any]:
     t = text or ""
-    if any(re.search(p, t) for p in _SPAM_PATTERNS + _HATE_PATTERNS + _NONSENSE_PATTERNS):
+    if _REJECT_RE.search(t):
         return {"decision": "rejected", "labels": ["heuristic"]}
     if len(t.strip()) < 5:
         return {"decision": "rejected", "labels": ["empty"]}
     return {"decision": "valid", "labels": ["heuristic"]}
 
 
+def _get_client(api_key: str):
+    """One google.genai client per API key per process (it keeps its HTTP pool)."""
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                # Imported on first use: the SDK adds about half a second to app startup
+                from google import genai
+                client = _clients[api_key] = genai.Client(api_key=api_key)
+    return client
+
+
 def _first_text_from_response(resp) -> str:
     try:
         if getattr(resp, "text", None):
@@ -43,96 +68,139 @@ def _first_text_from_response(resp) -> str:
 
 
 def moderate_text(text: str) -> Dict[str, Any]:
-    api_key = (os.getenv("GEMINI_API_KEY") or "").strip()
-    if not api_key:
+    """One text through ``moderate_batch``, so it shares its cache and overload handling."""
+    return moderate_batch([text])[0]
+
+
+def _deferred() -> Dict[str, Any]:
+    """No decision yet: the model gate is full and the caller can come back later."""
+    return {"decision": None, "labels": [], "reason": "overloaded", "meta": {"error": "Overloaded"}}
+
+
+def _stub_moderate_batch(texts: List[str]) -> List[Dict[str, Any]]:
+    """Offline model: heuristic decisions with the same shape as Gemini's."""
+    results = []
+    for text in texts:
         result = _heuristic_moderate(text)
-        logging.getLogger(__name__).info(
-            "AI moderation: heuristic used (missing GEMINI_API_KEY); decision=%s labels=%s",
-            result.get("decision"), result.get("labels")
-        )
-        return result
+        results.append({"decision": result["decision"], "labels": ["stub"] + result["labels"], "reason": ""})
+    return results
+
 
+def _gemini_moderate_batch(texts: List[str], api_key: str) -> List[Dict[str, Any]]:
+    numbered = "\n".join(json.dumps({"index": i, "input": t or ""}, ensure_ascii=False) for i, t in enumerate(texts))
+    prompt = (
+        "You are a strict content moderation tool for community submissions about mosques in Tunisia.\n"
+        "Classify EACH numbered INPUT below independently as either 'rejected' or 'valid'.\n"
+        "Respond ONLY with a single minified JSON array containing one object per input, "
+        "with keys: index, decision, labels, reason.\n"
+        "- index: the input's index\n"
+        "- decision: 'valid' or 'rejected'\n"
+        "- labels: array of short tags (e.g., ['gemini'])\n"
+        "- reason: concise explanation if rejected, otherwise empty string\n"
+        "Example: [{\"index\":0,\"decision\":\"valid\",\"labels\":[\"gemini\"],\"reason\":\"\"}]\n\n"
+        "INPUTS (one JSON object per line):\n" + numbered
+    )
+    resp = _get_client(api_key).models.generate_content(
+        model=GEMINI_MODEL,
+        contents=[{"role": "user", "parts": [{"text": prompt}]}],
+    )
+    raw = _first_text_from_response(resp)
     try:
-        # Use maintained google.genai client
-        client = genai.Client(api_key=api_key)
-        prompt = (
-            "You are a strict content moderation tool for community submissions about mosques in Tunisia.\n"
-            "Classify the INPUT as either 'rejected' or 'valid'.\n"
-            "Respond ONLY with a single minified JSON object with keys: decision, labels, reason.\n"
-            "- decision: 'valid' or 'rejected'\n"
-            "- labels: array of short tags (e.g., ['gemini'])\n"
-            "- reason: concise explanation if rejected, otherwise empty string\n"
-            "Example: {\"decision\":\"valid\",\"labels\":[\"gemini\"],\"reason\":\"\"}\n\n"
-            "INPUT:\n" + (text or "")
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        m = re.search(r"\[[\s\S]*\]", raw)
+        if not m:
+            raise
+        data = json.loads(m.group(0))
+    if not isinstance(data, list):
+        raise ValueError("Invalid Gemini batch response: expected a JSON array")
+
+    by_index = {}
+    for item in data:
+        if isinstance(item, dict) and item.get("decision") in ("valid", "rejected"):
+            try:
+                by_index[int(item.get("index"))] = item
+            except (TypeError, ValueError):
+                continue
+    results = []
+    for i, text in enumerate(texts):
+        item = by_index.get(i)
+        if item is None:
+            # Model skipped this input; decide it locally rather than failing the batch
+            fallback = _heuristic_moderate(text)
+            fallback["reason"] = fallback["labels"][0]
+            fallback["meta"] = {"error": "missing_in_batch"}
+            results.append(fallback)
+        else:
+            results.append({
+                "decision": item["decision"],
+                "labels": item.get("labels") or ["gemini"],
+                "reason": item.get("reason") or "",
+            })
+    return results
+
+
+def moderate_batch(texts: List[str], model: str = "gemini") -> List[Dict[str, Any]]:
+    """Moderate several texts with one model call; results align with ``texts``.
+
+    Texts with a cached decision are answered from the cache and only the
+    misses are sent to the model. When the model gate is full the misses
+    come back with ``decision`` None (not the heuristic): batch callers run
+    in the background and retry them later.
+    """
+    if not texts:
+        return []
+    api_key = (os.getenv("GEMINI_API_KEY") or "").strip()
+    if model == "stub":
+        model_version = "stub"
+    else:
+        model_version = GEMINI_MODEL if api_key else "heuristic"
+
+    results: List[Any] = [moderation_cache.get(t, model_version) for t in texts]
+    # Identical texts within the batch go to the model once
+    missing: Dict[str, List[int]] = {}
+    for i, result in enumerate(results):
+        if result is None:
+            missing.setdefault(cache_key(texts[i], model_version), []).append(i)
+    if missing:
+        groups = list(missing.values())
+        fresh = _moderate_batch_uncached([texts[g[0]] for g in groups], model, api_key)
+        for group, result in zip(groups, fresh):
+            for i in group:
+                results[i] = dict(result)
+            if "error" not in (result.get("meta") or {}):
+                moderation_cache.put(texts[group[0]], model_version, result)
+    return results
+
+
+def _moderate_batch_uncached(texts: List[str], model: str, api_key: str) -> List[Dict[str, Any]]:
+    if model == "stub":
+        return _stub_moderate_batch(texts)
+    if not api_key:
+        return [_heuristic_moderate(t) for t in texts]
+    if not moderation_gate.try_enter():
+        logging.getLogger(__name__).warning(
+            "AI moderation: model calls at capacity; %s inputs deferred", len(texts)
         )
-        resp = client.models.generate_content(
-            model="models/gemini-2.5-flash",
-            contents=[
-                {
-                    "role": "user",
-                    "parts": [{"text": prompt}],
-                }
-            ],
+        return [_deferred() for _t in texts]
+    try:
+        results = _gemini_moderate_batch(texts, api_key)
+        logging.getLogger(__name__).info(
+            "AI moderation: Gemini batch of %s; decisions=%s",
+            len(texts), [r.get("decision") for r in results]
         )
-        raw = _first_text_from_response(resp)
-        # Collect meta from Gemini response when available (finish_reason, safety ratings)
-        meta: Dict[str, Any] = {}
-        try:
-            cands = getattr(resp, "candidates", []) or []
-            if cands:
-                fr = getattr(cands[0], "finish_reason", None)
-                meta["finish_reason"] = fr
-                sr = getattr(cands[0], "safety_ratings", None)
-                if sr:
-                    # Convert safety ratings to simple dicts or repr
-                    try:
-                        meta["safety_ratings"] = [getattr(r, "__dict__", {}) for r in sr]
-                    except Exception:
-                        meta["safety_ratings"] = [repr(r) for r in sr]
-            pf = getattr(resp, "prompt_feedback", None)
-            if pf is not None:
-                pr = getattr(pf, "safety_ratings", None)
-                if pr:
-                    try:
-                        meta["prompt_safety_ratings"] = [getattr(r, "__dict__", {}) for r in pr]
-                    except Exception:
-                        meta["prompt_safety_ratings"] = [repr(r) for r in pr]
-        except Exception:
-            pass
-
-        try:
-            data = json.loads(raw)
-        except json.JSONDecodeError:
-            m = re.search(r"\{[\s\S]*\}", raw)
-            if not m:
-                logging.getLogger(__name__).warning(
-                    "AI moderation: Gemini returned non-JSON (len=%s, head=%s)...",
-                    len(raw), raw[:200]
-                )
-                raise
-            data = json.loads(m.group(0))
-
-        decision = data.get("decision")
-        if decision in ("valid", "rejected"):
-            # Prefer model-provided reason; otherwise infer from meta
-            reason = data.get("reason") or ""
-            if not reason and meta.get("finish_reason") == "SAFETY":
-                reason = "blocked_by_safety"
-            result = {"decision": decision, "labels": data.get("labels") or ["gemini"], "reason": reason, "meta": meta}
-            logging.getLogger(__name__).info(
-                "AI moderation: Gemini used; decision=%s labels=%s reason=%s meta=%s",
-                result.get("decision"), result.get("labels"), result.get("reason"), json.dumps(result.get("meta"), ensure_ascii=False)
-            )
-            return result
-
-        raise ValueError("Invalid Gemini response format: missing decision/labels")
-
+        return results
     except Exception as e:
-        result = _heuristic_moderate(text)
-        result["reason"] = result["labels"][0] if result.get("labels") else "heuristic"
-        result["meta"] = {"error": type(e).__name__}
         logging.getLogger(__name__).warning(
-            "AI moderation: Gemini error (%s); heuristic fallback; decision=%s labels=%s reason=%s",
-            type(e).__name__, result.get("decision"), result.get("labels"), result.get("reason")
+            "AI moderation: Gemini batch error (%s); heuristic fallback for %s inputs",
+            type(e).__name__, len(texts)
         )
-        return result
+        results = []
+        for text in texts:
+            result = _heuristic_moderate(text)
+            result["reason"] = result["labels"][0] if result.get("labels") else "heuristic"
+            result["meta"] = {"error": type(e).__name__}
+            results.append(result)
+        return results
+    finally:
+        moderation_gate.leave()
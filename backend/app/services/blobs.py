@@ -0,0 +1,323 @@
+"""Content-addressed storage for uploaded images.
+
+People send the same mosque photo again with each suggestion and edit.
+``POST /uploads`` hashes the file (sha256) while reading it and uses the
+digest as the image key, so identical uploads share one original and one
+set of variants. This works the same on
+Azure and on local disk, since the key is only a name prefix for
+``upload_storage``.
+
+``stored_blobs`` holds one row per key, with a reference count and the
+original's width (which fixes the file names, see ``services/images.py``):
+
+* An upload takes no reference. Only the upload that inserts the row queues
+  image processing. Later uploads get the same URLs back, with the row's
+  status (``pending`` until the files are written). A key whose processing
+  failed is queued again by the next upload.
+* References belong to rows. A suggestion or edit takes one when it is
+  created, if its ``image_url`` points at a key of ``upload_storage.backend``,
+  and stores the key in ``image_blob_key``. Only that column is ever
+  released, so a URL copied from elsewhere can't drop someone else's
+  reference.
+* Approving a suggestion, or an edit that sets the photo, moves the row's
+  reference to the mosque (and releases the mosque's old one). Rejecting or
+  deleting the row, or approving an edit that keeps the photo, releases it.
+  The column is cleared with a conditional UPDATE first, so a row releases
+  its reference at most once. All of this runs in the caller's session and
+  commits or rolls back with it.
+* A sweep every ``IMAGE_ORPHAN_SWEEP_SECONDS`` marks keys that have had no
+  references for ``IMAGE_ORPHAN_GRACE_SECONDS`` as ``deleting``, removes their
+  files and drops the row. This covers uploads that never made it into a
+  suggestion as well as released ones. An upload that arrives while its key
+  is being deleted is stored under a one-off key instead.
+
+Counts change through single ``UPDATE ... SET ref_count = ref_count + 1``
+statements, so concurrent workers never lose an update. Older uploads (uuid
+keys) and external links have no row, and are left alone.
+"""
+import logging
+import threading
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..extensions import db
+from ..models import StoredBlob
+from .images import ImagePipelineBusy, image_pipeline, parse_image_url
+from .storage import upload_storage
+
+_blobs = StoredBlob.__table__
+
+
+class StoredImage(NamedTuple):
+    key: str
+    kind: str
+    width: Optional[int]
+    status: str  # "pending" until the files are written, then "ready"
+    queued: bool  # the upload's spooled file went to the image workers, which delete it
+
+
+class BlobStore:
+    def __init__(self):
+        self._app = None
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self.grace = 24 * 3600.0
+        self.sweep_every = 3600.0
+        self._counters = {
+            "stored": 0, "dedup_hits": 0, "bytes_saved": 0, "reprocessed": 0,
+            "bypassed": 0, "acquired": 0, "released": 0, "collected": 0,
+        }
+
+    def init_app(self, app) -> None:
+        self._app = app
+        self.grace = float(app.config.get("IMAGE_ORPHAN_GRACE_SECONDS", 24 * 3600))
+        self.sweep_every = float(app.config.get("IMAGE_ORPHAN_SWEEP_SECONDS", 3600))
+        for name, fn in (("after_commit", self._after_commit), ("after_rollback", self._after_rollback)):
+            if not event.contains(Session, name, fn):
+                event.listen(Session, name, fn)
+        app.extensions["blob_store"] = self
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    # -- uploads -----------------------------------------------------------
+
+    def put(self, key: str, kind: str, path: str, width: int) -> StoredImage:
+        """Store the spooled image at ``path`` whose sha256 is ``key``.
+
+        Queues processing when the content is new (``queued``: the workers now
+        own ``path``; otherwise the caller deletes it). Raises
+        ImagePipelineBusy like ``image_pipeline.submit``.
+        """
+        self._ensure_sweeper()
+        size = os.path.getsize(path)
+        claim = self._claim(key, kind, size, width)
+        if claim is None:
+            key = uuid.uuid4().hex
+            self._count("bypassed")
+            image_pipeline.submit(key, kind, path, width)
+            return StoredImage(key, kind, width, "pending", True)
+        claimed, width, status = claim
+        if not claimed:
+            self._count("dedup_hits")
+            self._count("bytes_saved", size)
+            return StoredImage(key, kind, width, status, False)
+        try:
+            image_pipeline.submit(key, kind, path, width, partial(self._processed, key))
+        except ImagePipelineBusy:
+            self._abandon(key)
+            raise
+        return StoredImage(key, kind, width, "pending", True)
+
+    def _claim(self, key: str, kind: str, size: int, width: int) -> Optional[Tuple[bool, Optional[int], str]]:
+        """``(must process, stored width, status)`` for ``key``, or None if it is being deleted.
+
+        The width is the one the key was first stored with, so a repeat upload
+        gets the URLs of the files that exist. A hit restarts the orphan grace
+        period, since a suggestion is probably about to refer to the key.
+        """
+        for _ in range(2):
+            now = datetime.utcnow()
+            with db.engine.begin() as conn:
+                hit = conn.execute(
+                    update(_blobs)
+                    .where(_blobs.c.key == key, _blobs.c.status != "deleting")
+                    .values(updated_at=now)
+                ).rowcount
+                if hit:
+                    # Only the upload that flips a failed key back to pending reruns it
+                    retry = conn.execute(
+                        update(_blobs)
+                        .where(_blobs.c.key == key, _blobs.c.status == "failed")
+                        .values(status="pending", updated_at=now)
+                    ).rowcount
+                    if retry:
+                        self._count("reprocessed")
+                    row = conn.execute(select(_blobs.c.width, _blobs.c.status).where(_blobs.c.key == key)).one()
+                    return bool(retry), row.width, row.status
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(_blobs.insert().values(
+                        key=key, kind=kind, size=size, width=width, ref_count=0, status="pending",
+                        created_at=now, updated_at=now,
+                    ))
+            except IntegrityError:
+                continue  # inserted by a concurrent upload, or being deleted
+            self._count("stored")
+            return True, width, "pending"
+        return None
+
+    def _processed(self, key: str, ok: bool) -> None:
+        # Runs on an image worker thread
+        with self._app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(
+                    update(_blobs)
+                    .where(_blobs.c.key == key, _blobs.c.status == "pending")
+                    .values(status="ready" if ok else "failed", updated_at=datetime.utcnow())
+                )
+
+    def _abandon(self, key: str) -> None:
+        # The job never ran: let the next upload of this image retry
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(_blobs)
+                .where(_blobs.c.key == key, _blobs.c.status == "pending")
+                .values(status="failed", updated_at=datetime.utcnow())
+            )
+
+    # -- references held by rows -------------------------------------------
+
+    @staticmethod
+    def key_for(image_url: Optional[str]) -> Optional[str]:
+        """Key of a pipeline original on ``upload_storage.backend``, else None."""
+        parsed = parse_image_url(image_url)
+        if parsed is None or not upload_storage.backend.owns(image_url):
+            return None
+        return parsed[0]
+
+    def acquire(self, image_url: Optional[str]) -> Optional[str]:
+        """Add a reference to the image behind ``image_url``, in the current session.
+
+        Returns the key to store in the new row's ``image_blob_key``, or None
+        when the URL isn't one of ours (nothing to hold).
+        """
+        key = self.key_for(image_url)
+        if key is None:
+            return None
+        hit = db.session.execute(
+            update(_blobs)
+            .where(_blobs.c.key == key, _blobs.c.status != "deleting")
+            .values(ref_count=_blobs.c.ref_count + 1, updated_at=datetime.utcnow())
+        ).rowcount
+        if not hit:
+            return None
+        self._count("acquired")
+        return key
+
+    def release(self, obj) -> None:
+        """Drop the reference ``obj`` holds in ``image_blob_key``, if it still holds one."""
+        key = self._take(obj)
+        if key is None:
+            return
+        db.session.execute(
+            update(_blobs)
+            .where(_blobs.c.key == key)
+            .values(ref_count=_blobs.c.ref_count - 1, updated_at=datetime.utcnow())
+        )
+        db.session().info.setdefault("released_blobs", []).append(key)
+        self._ensure_sweeper()
+
+    def transfer(self, source, target) -> None:
+        """Move ``source``'s reference to ``target``, releasing the one ``target`` held."""
+        self.release(target)
+        key = self._take(source)
+        if key is not None:
+            target.image_blob_key = key
+
+    @staticmethod
+    def _take(obj) -> Optional[str]:
+        """Clear ``obj.image_blob_key`` and return the key, unless another transaction did first."""
+        key = obj.image_blob_key
+        if not key:
+            return None
+        if obj.id is None:
+            # Not flushed yet: nobody else can see it
+            obj.image_blob_key = None
+            return key
+        table = type(obj).__table__
+        moved = db.session.execute(
+            update(table).where(table.c.id == obj.id, table.c.image_blob_key == key).values(image_blob_key=None)
+        ).rowcount
+        set_committed_value(obj, "image_blob_key", None)
+        return key if moved else None
+
+    def _after_commit(self, session) -> None:
+        keys = session.info.pop("released_blobs", None)
+        if keys:
+            self._count("released", len(keys))
+
+    @staticmethod
+    def _after_rollback(session) -> None:
+        session.info.pop("released_blobs", None)
+
+    # -- orphans -----------------------------------------------------------
+
+    def _ensure_sweeper(self) -> None:
+        # Started lazily, after gunicorn has forked
+        if self._sweeper is not None or self._app is None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep, name="blob-sweep", daemon=True)
+                self._sweeper.start()
+
+    def _sweep(self) -> None:
+        while True:
+            time.sleep(self.sweep_every)
+            with self._app.app_context():
+                try:
+                    self.collect_orphans()
+                except Exception:
+                    logging.getLogger(__name__).exception("Unreferenced image cleanup failed")
+
+    def collect_orphans(self, limit: int = 500) -> int:
+        """Delete keys that have had no references for the grace period (needs an app context)."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.grace)
+        with db.engine.connect() as conn:
+            keys = conn.execute(
+                select(_blobs.c.key)
+                .where(_blobs.c.ref_count <= 0, _blobs.c.status != "deleting", _blobs.c.updated_at < cutoff)
+                .limit(limit)
+            ).scalars().all()
+        return self.collect(keys, cutoff)
+
+    def collect(self, keys: Iterable[str], cutoff: datetime) -> int:
+        """Delete the files and rows of ``keys`` that have had no references since ``cutoff``."""
+        removed = 0
+        for key in keys:
+            with db.engine.begin() as conn:
+                # updated_at: an upload or release since the select restarts the grace period
+                claimed = conn.execute(
+                    update(_blobs)
+                    .where(
+                        _blobs.c.key == key, _blobs.c.ref_count <= 0,
+                        _blobs.c.status != "deleting", _blobs.c.updated_at < cutoff,
+                    )
+                    .values(status="deleting", updated_at=datetime.utcnow())
+                ).rowcount
+                row = conn.execute(
+                    select(_blobs.c.kind, _blobs.c.width).where(_blobs.c.key == key)
+                ).first() if claimed else None
+            if row is None:
+                continue
+            try:
+                for name in image_pipeline.names(key, row.kind, row.width):
+                    upload_storage.backend.delete(name)
+            except Exception:
+                # Back to a state the next upload of this image repairs
+                with db.engine.begin() as conn:
+                    conn.execute(update(_blobs).where(_blobs.c.key == key).values(status="failed"))
+                raise
+            with db.engine.begin() as conn:
+                conn.execute(_blobs.delete().where(_blobs.c.key == key, _blobs.c.status == "deleting"))
+            removed += 1
+        self._count("collected", removed)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._counters)
+
+
+blob_store = BlobStore()
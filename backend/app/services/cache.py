@@ -0,0 +1,210 @@
+"""Read-through cache for serialized public GET responses.
+
+Views opt in with ``@response_cache.cached(namespace, tags=...)`` placed
+directly under ``@bp.route`` so the finished response (after flask-smorest
+serialization) is what gets stored. Entries are keyed on the namespace, the
+view arguments and the sorted query string, and are tagged so that writes
+can drop exactly the keys they affect:
+
+* ``mosques``             every ``/mosques`` list page
+* ``mosque:<id>``         one mosque detail
+* ``reviews:<mosque_id>`` review pages of one mosque
+* ``suggestions:public``  the public pending-suggestions list
+* ``tile:<z>/<x>/<y>``    one binary map tile (see ``services/tiles.py``)
+
+Mosque row changes are picked up automatically through ``mosque_events``;
+suggestion and review writers call ``invalidate`` themselves.
+
+Backends: ``memory`` (per-process LRU with TTL, default), ``redis`` (shared
+across workers; any client exposing get/set/sadd/smembers/delete/expire can be
+passed to ``RedisBackend``, e.g. a local fake in tests) and ``none``.
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from flask import Response, request
+
+from .mosque_events import on_mosques_changed
+
+# Never replay these from cache
+_SKIP_HEADERS = {"content-length", "date", "set-cookie", "x-cache"}
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, bytes, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _tags = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]) -> None:
+        tags = tuple(tags)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.pop(tag, ())):
+                    self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisBackend:
+    def __init__(self, client, prefix: str = "mosquestn:cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: float, tags: Iterable[str]) -> None:
+        ttl_s = max(int(ttl), 1)
+        self.client.set(self.prefix + key, value, ex=ttl_s)
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            self.client.sadd(tag_key, key)
+            self.client.expire(tag_key, ttl_s)
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            tag_key = self.prefix + "tag:" + tag
+            members = self.client.smembers(tag_key) or ()
+            keys = [self.prefix + (m.decode() if isinstance(m, bytes) else m) for m in members]
+            self.client.delete(tag_key, *keys)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+def _encode(resp: Response) -> bytes:
+    headers = [(k, v) for k, v in resp.headers.items() if k.lower() not in _SKIP_HEADERS]
+    head = json.dumps({"status": resp.status_code, "headers": headers}).encode("utf-8")
+    return head + b"\n" + resp.get_data()
+
+
+def _decode(blob: bytes) -> Response:
+    head, _, body = blob.partition(b"\n")
+    meta = json.loads(head)
+    return Response(body, status=meta["status"], headers=meta["headers"])
+
+
+class ResponseCache:
+    def __init__(self):
+        self.backend = None
+        self.ttl = 60.0
+        self.namespace_ttls: Dict[str, float] = {}
+
+    def init_app(self, app) -> None:
+        kind = (app.config.get("RESPONSE_CACHE_BACKEND") or "memory").lower()
+        self.ttl = float(app.config.get("RESPONSE_CACHE_TTL_SECONDS", 60))
+        if kind == "redis":
+            import redis  # optional dependency, only needed for the shared backend
+
+            self.backend = RedisBackend(redis.Redis.from_url(app.config["REDIS_URL"]))
+        elif kind == "memory":
+            self.backend = MemoryBackend(int(app.config.get("RESPONSE_CACHE_MAX_ENTRIES", 2048)))
+        else:
+            self.backend = None
+        app.extensions["response_cache"] = self
+        on_mosques_changed(self._on_mosques_changed)
+
+    def set_namespace_ttl(self, namespace: str, ttl: float) -> None:
+        """Override the default TTL for one namespace (e.g. long-lived map tiles)."""
+        self.namespace_ttls[namespace] = ttl
+
+    def use_backend(self, backend) -> None:
+        """Swap the backend at runtime (e.g. a fake Redis client in tests)."""
+        self.backend = backend
+
+    @staticmethod
+    def make_key(namespace: str, view_args: Dict) -> str:
+        args = sorted((k, v) for k in request.args for v in request.args.getlist(k))
+        parts = [f"{k}={view_args[k]}" for k in sorted(view_args)]
+        parts += [f"{k}={v}" for k, v in args]
+        return namespace + "?" + "&".join(parts)
+
+    def cached(self, namespace: str, tags: Optional[Callable[..., List[str]]] = None):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                backend = self.backend
+                if backend is None or request.method != "GET":
+                    return fn(*args, **kwargs)
+                key = self.make_key(namespace, kwargs)
+                try:
+                    blob = backend.get(key)
+                except Exception:
+                    logging.getLogger(__name__).warning("Response cache read failed", exc_info=True)
+                    blob = None
+                if blob is not None:
+                    resp = _decode(blob)
+                    resp.headers["X-Cache"] = "HIT"
+                    return resp
+
+                resp = fn(*args, **kwargs)
+                if isinstance(resp, Response) and resp.status_code == 200 and not resp.direct_passthrough:
+                    entry_tags = [namespace] + (tags(**kwargs) if tags else [])
+                    try:
+                        backend.set(key, _encode(resp), self.namespace_ttls.get(namespace, self.ttl), entry_tags)
+                    except Exception:
+                        logging.getLogger(__name__).warning("Response cache write failed", exc_info=True)
+                    resp.headers["X-Cache"] = "MISS"
+                return resp
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, *tags: str) -> None:
+        if self.backend is None or not tags:
+            return
+        try:
+            self.backend.invalidate(tags)
+        except Exception:
+            logging.getLogger(__name__).warning("Response cache invalidation failed", exc_info=True)
+
+    def _on_mosques_changed(self, mosque_ids: Set[int]) -> None:
+        self.invalidate("mosques", *[f"mosque:{i}" for i in mosque_ids])
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,174 @@
+"""Precomputed hierarchical grid clusters of approved mosques.
+
+Clusters live on the slippy-tile grid: a cluster at map zoom ``z`` is one
+tile of level ``z + CLUSTER_CELL_BITS`` (with the default of 3, a 32 px
+cell of a 256 px tile). The finest level is aggregated from the mosque
+coordinates, and every coarser level is built by merging 2x2 cells of the
+level below, so all zooms cost one sort-and-reduce pass each.
+
+Each cell keeps its count, centroid sums, bounding box and, for one-mosque
+cells, that mosque's id and type code. Queries select cells by integer range
+(no per-mosque work), so the answer size depends on the viewport, not on how
+dense the area is. Map tiles reuse the same cells for their clustered zooms.
+
+The index is rebuilt lazily whenever ``approved_data_key()`` moves. That is
+one indexed aggregate per query, which keeps every worker consistent with the
+shared database (and with tiles cached in Redis).
+"""
+import logging
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from ..extensions import db
+from ..models import Mosque
+from ..utils.geo import tile_coords
+from .snapshot import approved_data_key
+
+TYPE_CODES = {"مسجد": 1, "جامع": 2, "مصلى": 3}
+
+
+class Level(NamedTuple):
+    """All occupied cells of one grid level, sorted by (cx, cy)."""
+    cx: np.ndarray
+    cy: np.ndarray
+    count: np.ndarray
+    lat_sum: np.ndarray
+    lng_sum: np.ndarray
+    min_lat: np.ndarray
+    max_lat: np.ndarray
+    min_lng: np.ndarray
+    max_lng: np.ndarray
+    ids: np.ndarray  # mosque id for one-mosque cells, else 0
+    types: np.ndarray  # type code for one-mosque cells, else 0
+
+    def select(self, mask: np.ndarray) -> "Level":
+        return Level(*(a[mask] for a in self))
+
+
+def _reduce(cx, cy, count, lat_sum, lng_sum, min_lat, max_lat, min_lng, max_lng, ids, types) -> Level:
+    """Merge entries sharing a (cx, cy) cell."""
+    order = np.lexsort((cy, cx))
+    cx, cy = cx[order], cy[order]
+    starts = np.flatnonzero(np.r_[True, (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])]) if len(cx) else np.empty(0, dtype=np.intp)
+    if not len(starts):
+        empty_i, empty_f = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return Level(empty_i, empty_i, empty_i, empty_f, empty_f, empty_f, empty_f, empty_f, empty_f, empty_i, empty_i)
+    merged_count = np.add.reduceat(count[order], starts)
+    single = merged_count == 1
+    # A one-mosque cell has exactly one one-mosque child, every other child is empty
+    return Level(
+        cx[starts],
+        cy[starts],
+        merged_count,
+        np.add.reduceat(lat_sum[order], starts),
+        np.add.reduceat(lng_sum[order], starts),
+        np.minimum.reduceat(min_lat[order], starts),
+        np.maximum.reduceat(max_lat[order], starts),
+        np.minimum.reduceat(min_lng[order], starts),
+        np.maximum.reduceat(max_lng[order], starts),
+        np.where(single, np.maximum.reduceat(ids[order], starts), 0),
+        np.where(single, np.maximum.reduceat(types[order], starts), 0),
+    )
+
+
+class MosqueClusterIndex:
+    def __init__(self, max_zoom: int = 12, cell_bits: int = 3, max_results: int = 1000):
+        self.max_zoom = max_zoom
+        self.cell_bits = cell_bits
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._key: Optional[Tuple[int, int]] = None
+        self._levels: Dict[int, Level] = {}
+
+    def init_app(self, app) -> None:
+        self.max_zoom = int(app.config.get("CLUSTER_MAX_ZOOM", self.max_zoom))
+        self.cell_bits = int(app.config.get("CLUSTER_CELL_BITS", self.cell_bits))
+        self.max_results = int(app.config.get("CLUSTER_MAX_RESULTS", self.max_results))
+        app.extensions["cluster_index"] = self
+
+    def build(self) -> Dict[int, Level]:
+        table = Mosque.__table__
+        rows = db.session.execute(
+            select(table.c.id, table.c.latitude, table.c.longitude, table.c.type).where(
+                table.c.approved.is_(True),
+                table.c.latitude.isnot(None),
+                table.c.longitude.isnot(None),
+            )
+        ).all()
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        lats = np.array([r[1] for r in rows], dtype=np.float64)
+        lngs = np.array([r[2] for r in rows], dtype=np.float64)
+        types = np.array([TYPE_CODES.get(r[3], 0) for r in rows], dtype=np.int64)
+
+        finest = self.max_zoom + self.cell_bits
+        fx, fy = tile_coords(lats, lngs, finest)
+        level = _reduce(
+            fx.astype(np.int64), fy.astype(np.int64), np.ones(len(ids), dtype=np.int64),
+            lats, lngs, lats, lats, lngs, lngs, ids, types,
+        )
+        levels = {finest: level}
+        for lv in range(finest - 1, -1, -1):
+            level = _reduce(level.cx >> 1, level.cy >> 1, *level[2:])
+            levels[lv] = level
+        logging.getLogger(__name__).info(
+            "Cluster index built: %s mosques, %s cells at level %s", len(ids), len(levels[finest].cx), finest
+        )
+        return levels
+
+    def levels(self) -> Dict[int, Level]:
+        key = approved_data_key()
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    self._levels = self.build()
+                    self._key = key
+        return self._levels
+
+    def level_for_zoom(self, zoom: int) -> int:
+        return min(max(zoom, 0), self.max_zoom) + self.cell_bits
+
+    def tile_cells(self, z: int, x: int, y: int) -> Level:
+        """Cluster cells inside one map tile at a clustered zoom (``z <= max_zoom``)."""
+        level = self.levels()[z + self.cell_bits]
+        return level.select(((level.cx >> self.cell_bits) == x) & ((level.cy >> self.cell_bits) == y))
+
+    def query_bbox(
+        self, min_lat: float, max_lat: float, min_lng: float, max_lng: float, zoom: int
+    ) -> Tuple[int, Level]:
+        """Cells overlapping the box at ``zoom``, coarsened until at most ``max_results``.
+
+        Returns the zoom actually used and the cells.
+        """
+        levels = self.levels()
+        zoom = min(max(zoom, 0), self.max_zoom)
+        while True:
+            lv = zoom + self.cell_bits
+            fx, fy = tile_coords([max_lat, min_lat], [min_lng, max_lng], lv)
+            x0, x1 = int(fx[0]), int(fx[1])
+            y0, y1 = int(fy[0]), int(fy[1])  # north edge has the smaller y
+            level = levels[lv]
+            cells = level.select((level.cx >= x0) & (level.cx <= x1) & (level.cy >= y0) & (level.cy <= y1))
+            if len(cells.cx) <= self.max_results or zoom == 0:
+                return zoom, cells
+            zoom -= 1
+
+
+def cluster_dicts(cells: Level) -> List[dict]:
+    """JSON-ready clusters (see ``MosqueClusterSchema``)."""
+    out = []
+    for i in range(len(cells.cx)):
+        count = int(cells.count[i])
+        out.append({
+            "latitude": float(cells.lat_sum[i]) / count,
+            "longitude": float(cells.lng_sum[i]) / count,
+            "count": count,
+            "bbox": [float(cells.min_lng[i]), float(cells.min_lat[i]), float(cells.max_lng[i]), float(cells.max_lat[i])],
+            "id": int(cells.ids[i]) if count == 1 else None,
+        })
+    return out
+
+
+cluster_index = MosqueClusterIndex()
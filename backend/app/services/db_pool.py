@@ -0,0 +1,190 @@
+"""Engine/pool configuration and pool metrics.
+
+``engine_options(config)`` turns the ``DB_*`` settings into
+``SQLALCHEMY_ENGINE_OPTIONS``. It is applied in ``create_app`` before
+``db.init_app``, because Flask-SQLAlchemy creates the engines there.
+
+* Every gunicorn worker gets its own pool of ``DB_POOL_SIZE`` connections,
+  plus ``DB_MAX_OVERFLOW`` short-lived extras, so size it as
+  ``workers * (size + overflow)`` against the server's connection limit.
+* ``DB_POOL_PRE_PING`` and ``DB_POOL_RECYCLE`` stop idle connections that
+  the managed server or a load balancer has dropped from surfacing as request
+  errors.
+* ``DB_STATEMENT_TIMEOUT_MS`` is sent as a startup option. Behind PgBouncer
+  in transaction mode (``DB_PGBOUNCER``), startup options and session
+  ``SET``s are not allowed, so it is applied with ``SET LOCAL`` at the start
+  of every transaction instead, and psycopg 3's automatic prepared
+  statements are turned off.
+
+``InstrumentedQueuePool`` times how long checkouts wait for a free
+connection. ``db_pool.stats()`` reports that, along with the live pool
+counters, for every engine (bind).
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.pool import QueuePool
+
+from ..extensions import db
+
+
+class PoolStats:
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._waits = deque(maxlen=window)  # recent checkout waits in seconds
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidated = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            self._waits.append(seconds)
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            data = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "connects": self.connects,
+                "invalidated": self.invalidated,
+                "wait_ms_avg": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else None,
+                "wait_ms_max": round(self.wait_max * 1000, 3),
+            }
+        for name, q in (("wait_ms_p50", 0.50), ("wait_ms_p99", 0.99)):
+            data[name] = round(waits[min(int(q * len(waits)), len(waits) - 1)] * 1000, 3) if waits else None
+        return data
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    # Log under sqlalchemy.pool like the stock pools, not under app.*
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.QueuePool"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats  # keep counting across engine.dispose()
+        return pool
+
+    def _do_get(self):
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeout:
+            self.stats.record_wait(time.perf_counter() - t0, timed_out=True)
+            raise
+        self.stats.record_wait(time.perf_counter() - t0)
+        return conn
+
+
+def engine_options(config) -> Dict[str, Any]:
+    """``SQLALCHEMY_ENGINE_OPTIONS`` for the configured database URL."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}  # in-memory SQLite needs its single shared connection
+    options: Dict[str, Any] = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": int(config.get("DB_POOL_SIZE", 5)),
+        "max_overflow": int(config.get("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(config.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(config.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": bool(config.get("DB_POOL_PRE_PING", True)),
+        "pool_use_lifo": bool(config.get("DB_POOL_USE_LIFO", True)),
+    }
+    if url.get_backend_name() == "postgresql":
+        connect_args = {"application_name": config.get("DB_APPLICATION_NAME", "mosquestn")}
+        timeout_ms = int(config.get("DB_STATEMENT_TIMEOUT_MS", 0))
+        if timeout_ms and not config.get("DB_PGBOUNCER"):
+            connect_args["options"] = f"-c statement_timeout={timeout_ms}"
+        if config.get("DB_PGBOUNCER") and url.get_dialect().driver == "psycopg":
+            connect_args["prepare_threshold"] = None  # no server-side prepared statements
+        options["connect_args"] = connect_args
+    return options
+
+
+class DbPoolMonitor:
+    def __init__(self):
+        self.statement_timeout_ms = 0
+        self.pgbouncer = False
+
+    def init_app(self, app) -> None:
+        self.statement_timeout_ms = int(app.config.get("DB_STATEMENT_TIMEOUT_MS", 0))
+        self.pgbouncer = bool(app.config.get("DB_PGBOUNCER", False))
+        app.extensions["db_pool"] = self
+        with app.app_context():
+            for engine in db.engines.values():
+                self._instrument(engine)
+
+    def _instrument(self, engine) -> None:
+        pool = engine.pool
+        stats = getattr(pool, "stats", None)
+        if stats is not None:
+            event.listen(engine, "connect", lambda *_a: stats.count("connects"))
+            event.listen(engine, "invalidate", lambda *_a: stats.count("invalidated"))
+        if self.pgbouncer and self.statement_timeout_ms and engine.dialect.name == "postgresql":
+            timeout_ms = self.statement_timeout_ms
+
+            @event.listens_for(engine, "begin")
+            def _set_local_timeout(conn):
+                # The driver opens the transaction implicitly on this first statement
+                cursor = conn.connection.dbapi_connection.cursor()
+                try:
+                    cursor.execute(f"SET LOCAL statement_timeout = {timeout_ms}")
+                finally:
+                    cursor.close()
+
+    def stats(self) -> Dict[str, Any]:
+        out = {}
+        for bind, engine in db.engines.items():
+            pool = engine.pool
+            data: Dict[str, Any] = {"pool": type(pool).__name__}
+            if isinstance(pool, QueuePool):
+                data.update(
+                    size=pool.size(),
+                    checked_out=pool.checkedout(),
+                    checked_in=pool.checkedin(),
+                    overflow=max(pool.overflow(), 0),
+                )
+            stats = getattr(pool, "stats", None)
+            if stats is not None:
+                data.update(stats.snapshot())
+            out[bind or "default"] = data
+        return out
+
+    def release_startup_connections(self, app) -> None:
+        """Close connections opened while building the app.
+
+        With ``gunicorn --preload`` they would otherwise be inherited, and
+        shared, by every forked worker.
+        """
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+        logging.getLogger(__name__).debug("Released startup DB connections")
+
+
+db_pool = DbPoolMonitor()
@@ -0,0 +1,151 @@
+"""Process-local spatial index over approved mosques.
+
+Approved mosques are bucketed into a fixed lat/lng grid so that a radius
+query only visits the cells overlapping the search circle; the candidates in
+those cells are then scored in one vectorized haversine pass. Rows are kept as
+plain dicts keyed by column name (what ``MosqueSchema`` reads), so answering
+``/mosques/nearby`` needs neither a database round trip nor ORM objects.
+
+The index is built at startup, dropped whenever a committed transaction
+touches a mosque, and rebuilt lazily on the next query. A TTL bounds how long
+a worker can serve data changed by another gunicorn worker. One thread
+rebuilds at a time; the others keep answering from the previous snapshot
+meanwhile (only the very first build makes them wait).
+"""
+import logging
+import threading
+import time
+from math import floor
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from ..extensions import db
+from ..models import Mosque
+from ..utils.geo import bounding_box, haversine_km_many, nearest_order
+from .mosque_events import on_mosques_changed
+from .ratings import summaries_by_mosque, summarize
+
+Cell = Tuple[int, int]
+Row = Dict[str, Any]
+
+
+class _Snapshot(NamedTuple):
+    rows: List[Row]
+    lats: np.ndarray
+    lngs: np.ndarray
+    cells: Dict[Cell, np.ndarray]  # cell -> positions into rows/lats/lngs
+
+
+_EMPTY = _Snapshot([], np.empty(0), np.empty(0), {})
+
+
+class MosqueGeoIndex:
+    def __init__(self, cell_deg: float = 0.05, ttl_seconds: float = 300.0):
+        self.cell_deg = cell_deg
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._snapshot: _Snapshot = _EMPTY
+        self._built_at: Optional[float] = None
+        self._generation = 0  # bumped by invalidate
+
+    def init_app(self, app) -> None:
+        self.cell_deg = float(app.config.get("GEO_INDEX_CELL_DEG", self.cell_deg))
+        self.ttl_seconds = float(app.config.get("GEO_INDEX_TTL_SECONDS", self.ttl_seconds))
+        app.extensions["geo_index"] = self
+        on_mosques_changed(self.invalidate)
+        if app.config.get("GEO_INDEX_ENABLED") and app.config.get("GEO_INDEX_WARM_ON_START"):
+            with app.app_context():
+                try:
+                    self.rebuild()
+                except Exception:
+                    # Table may not exist yet (fresh DB before migrations)
+                    logging.getLogger(__name__).warning("Geo index warm-up skipped", exc_info=True)
+
+    def _cell(self, lat: float, lng: float) -> Cell:
+        return floor(lat / self.cell_deg), floor(lng / self.cell_deg)
+
+    def rebuild(self) -> int:
+        generation = self._generation
+        table = Mosque.__table__
+        stmt = select(table).where(
+            table.c.approved.is_(True),
+            table.c.latitude.isnot(None),
+            table.c.longitude.isnot(None),
+        )
+        rows = [dict(row) for row in db.session.execute(stmt).mappings()]
+        ratings = summaries_by_mosque()
+        no_rating = summarize(None)
+        for row in rows:
+            row["rating_summary"] = ratings.get(row["id"], no_rating)
+        lats = np.fromiter((r["latitude"] for r in rows), dtype=np.float64, count=len(rows))
+        lngs = np.fromiter((r["longitude"] for r in rows), dtype=np.float64, count=len(rows))
+
+        buckets: Dict[Cell, List[int]] = {}
+        for pos, (la, ln) in enumerate(zip(lats.tolist(), lngs.tolist())):
+            buckets.setdefault(self._cell(la, ln), []).append(pos)
+        cells = {key: np.asarray(positions, dtype=np.intp) for key, positions in buckets.items()}
+
+        with self._lock:
+            self._snapshot = _Snapshot(rows, lats, lngs, cells)
+            # Invalidated while reading: serve this, but rebuild on the next query
+            self._built_at = time.monotonic() if generation == self._generation else None
+        logging.getLogger(__name__).info("Geo index built: %s mosques in %s cells", len(rows), len(cells))
+        return len(rows)
+
+    def invalidate(self, _mosque_ids: Optional[Set[int]] = None) -> None:
+        with self._lock:
+            self._generation += 1
+            self._built_at = None
+
+    def _stale(self) -> bool:
+        built_at = self._built_at
+        return built_at is None or time.monotonic() - built_at > self.ttl_seconds
+
+    def _fresh(self) -> _Snapshot:
+        if not self._stale():
+            return self._snapshot
+        if not self._rebuild_lock.acquire(blocking=False):
+            if self._snapshot is not _EMPTY:
+                return self._snapshot  # another thread is rebuilding
+            self._rebuild_lock.acquire()  # first build: nothing to serve yet
+        try:
+            if self._stale():  # not already rebuilt by the thread we waited for
+                self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+        return self._snapshot
+
+    def query_radius(
+        self, lat: float, lng: float, radius_km: float, limit: Optional[int] = None
+    ) -> List[Tuple[Row, float]]:
+        """Approved mosques within ``radius_km`` of (lat, lng) as (row, distance_km), closest first."""
+        snap = self._fresh()
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+        y0, x0 = self._cell(min_lat, min_lng)
+        y1, x1 = self._cell(max_lat, max_lng)
+
+        if (y1 - y0 + 1) * (x1 - x0 + 1) > len(snap.cells):
+            # Huge radius: walking the occupied cells is cheaper than the grid
+            parts = [p for k, p in snap.cells.items() if y0 <= k[0] <= y1 and x0 <= k[1] <= x1]
+        else:
+            parts = [
+                snap.cells[(y, x)]
+                for y in range(y0, y1 + 1)
+                for x in range(x0, x1 + 1)
+                if (y, x) in snap.cells
+            ]
+        if not parts:
+            return []
+
+        candidates = np.concatenate(parts)
+        distances = haversine_km_many(lat, lng, snap.lats[candidates], snap.lngs[candidates])
+        mask = distances <= radius_km
+        candidates, distances = candidates[mask], distances[mask]
+        order = nearest_order(distances, limit)
+        return [(snap.rows[i], float(d)) for i, d in zip(candidates[order].tolist(), distances[order].tolist())]
+
+
+geo_index = MosqueGeoIndex()
@@ -0,0 +1,357 @@
+"""Image processing for uploaded mosque photos.
+
+``POST /uploads`` spools the file to disk (``spool``), then checks its magic
+bytes and reads its header (size and EXIF orientation, no decode) on the
+request thread. It then hands the spooled file's path to ``image_pipeline``,
+whose worker pool writes, under one key (the content hash, see
+``services/blobs.py``):
+
+* ``<key>/original-<width>w.<ext>``: the photo rotated upright, re-encoded
+  without EXIF/XMP (phone photos carry GPS) and capped at
+  ``IMAGE_MAX_DIMENSION``. ``<width>`` is its width after that. GIFs are kept
+  as uploaded, since they carry no EXIF and re-encoding would drop the
+  animation.
+* ``<key>/<w>.<format>``: one variant per ``IMAGE_WIDTHS`` entry narrower
+  than the original (thumbnail for lists, medium and large for detail), plus
+  one at the original's own width when it is narrower than the widest entry,
+  in every ``IMAGE_FORMATS`` format (WebP, and AVIF when Pillow supports it).
+  Nothing is upscaled, and every file is as wide as its name says.
+
+The upload response returns the URLs straight away, with ``status``
+``pending`` (HTTP 202) until the job has run, usually well under a second.
+``srcset(image_url)`` turns an ``original`` URL into
+``{format: "url 320w, url 960w, ..."}`` with the true variant widths, read
+from the width in the name. ``MosqueSchema.image_srcset`` uses it, so every
+mosque endpoint reports the variants. Originals named ``original.<ext>``
+(before widths were recorded) are assumed to have every configured width.
+URLs that don't follow this layout (uuid-era uploads without variants,
+external links) get None.
+
+Only paths wait in the queue, never file contents, so memory does not grow
+with ``IMAGE_QUEUE_SIZE``. The worker deletes the spooled file when done.
+
+Pillow releases the GIL while decoding, resampling and encoding, so a thread
+pool gives real parallelism without copying the image to another process.
+At most ``IMAGE_QUEUE_SIZE`` images are queued or running; beyond that,
+uploads wait up to ``IMAGE_QUEUE_TIMEOUT_SECONDS`` for a slot.
+"""
+import hashlib
+import io
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .storage import iter_chunks, upload_storage
+
+# (magic offset, magic bytes, kind)
+_SIGNATURES = (
+    (0, b"\xff\xd8\xff", "jpg"),
+    (0, b"\x89PNG\r\n\x1a\n", "png"),
+    (0, b"GIF87a", "gif"),
+    (0, b"GIF89a", "gif"),
+    (8, b"WEBP", "webp"),  # after b"RIFF" + 4-byte size
+)
+SNIFF_BYTES = 16
+
+CONTENT_TYPES = {"jpg": "image/jpeg", "png": "image/png", "gif": "image/gif", "webp": "image/webp", "avif": "image/avif"}
+_PIL_FORMATS = {"jpg": "JPEG", "png": "PNG", "webp": "WEBP", "avif": "AVIF"}
+
+# Keys are sha256 hex (services/blobs.py); 32-char uuid4 keys are older uploads
+_ORIGINAL_RE = re.compile(
+    r"^(?P<prefix>.*/)(?P<key>[0-9a-f]{64}|[0-9a-f]{32})/original(?:-(?P<width>[1-9][0-9]*)w)?\.(?P<kind>jpg|png|gif|webp)$"
+)
+# EXIF orientations that swap width and height
+_TRANSPOSED = (5, 6, 7, 8)
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+class ImagePipelineBusy(RuntimeError):
+    pass
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Image kind from the first ``SNIFF_BYTES`` of a file, or None if unsupported."""
+    if head[:4] == b"RIFF" and head[8:12] != b"WEBP":
+        return None
+    for offset, magic, kind in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return kind
+    return None
+
+
+def original_name(key: str, kind: str, width: Optional[int] = None) -> str:
+    # Without a width: the layout before widths were recorded
+    return f"{key}/original-{width}w.{kind}" if width else f"{key}/original.{kind}"
+
+
+def variant_name(key: str, width: int, fmt: str) -> str:
+    return f"{key}/{width}.{fmt}"
+
+
+def parse_image_url(image_url: Optional[str]) -> Optional[Tuple[str, str]]:
+    """``(key, kind)`` of an ``original`` URL written by the pipeline, else None."""
+    match = _ORIGINAL_RE.match(image_url or "")
+    return (match["key"], match["kind"]) if match else None
+
+
+def fit_width(width: int, height: int, box: int) -> int:
+    """Width after ``Image.thumbnail((box, box))``; same rounding as Pillow."""
+    if width <= box and height <= box:
+        return width
+    aspect = width / height
+    if aspect >= 1:
+        return box
+    return max(min(math.floor(box * aspect), math.ceil(box * aspect), key=lambda n: abs(aspect - n / box)), 1)
+
+
+class ImagePipeline:
+    def __init__(self):
+        self.widths: Tuple[int, ...] = (320, 960, 1600)
+        self.formats: Tuple[str, ...] = ("webp", "avif")
+        self.max_dimension = 2048
+        self.max_pixels = 50_000_000
+        self.quality = {"jpg": 85, "webp": 80, "avif": 55}
+        self.queue_timeout = 10.0
+        self.spool_dir: Optional[str] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(16)
+        self._lock = threading.Lock()
+        self._times = deque(maxlen=1024)
+        self._counters = {"processed": 0, "failed": 0, "rejected": 0, "busy": 0, "submitted": 0}
+
+    def init_app(self, app) -> None:
+        self.widths = tuple(sorted(int(w) for w in str(app.config.get("IMAGE_WIDTHS", "320,960,1600")).split(",") if w.strip()))
+        formats = [f.strip().lower() for f in str(app.config.get("IMAGE_FORMATS", "webp,avif")).split(",") if f.strip()]
+        unsupported = [f for f in formats if not features.check(f)]
+        if unsupported:
+            logging.getLogger(__name__).warning("Pillow lacks %s support; skipping those variants", ", ".join(unsupported))
+        self.formats = tuple(f for f in formats if f not in unsupported)
+        self.max_dimension = int(app.config.get("IMAGE_MAX_DIMENSION", self.max_dimension))
+        self.max_pixels = int(app.config.get("IMAGE_MAX_PIXELS", self.max_pixels))
+        self.quality = {
+            "jpg": int(app.config.get("IMAGE_JPEG_QUALITY", 85)),
+            "webp": int(app.config.get("IMAGE_WEBP_QUALITY", 80)),
+            "avif": int(app.config.get("IMAGE_AVIF_QUALITY", 55)),
+        }
+        self.queue_timeout = float(app.config.get("IMAGE_QUEUE_TIMEOUT_SECONDS", self.queue_timeout))
+        self.spool_dir = app.config.get("IMAGE_SPOOL_DIR") or None
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+        self._slots = threading.BoundedSemaphore(int(app.config.get("IMAGE_QUEUE_SIZE", 16)))
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(app.config.get("IMAGE_WORKERS", 2)), thread_name_prefix="image"
+        )
+        app.extensions["image_pipeline"] = self
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    # -- request side ------------------------------------------------------
+
+    def spool(self, stream: IO[bytes], max_bytes: Optional[int] = None, chunk_size: int = 1024 * 1024) -> Tuple[str, str]:
+        """Copy an upload to a temporary file, hashing it on the way: ``(path, sha256 hex)``.
+
+        Raises UploadTooLarge past ``max_bytes`` (the partial file is removed).
+        The caller owns the file until ``submit`` accepts it.
+        """
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(dir=self.spool_dir, prefix="upload-")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter_chunks(stream, chunk_size, max_bytes):
+                    digest.update(chunk)
+                    out.write(chunk)
+        except BaseException:
+            self.discard(path)
+            raise
+        return path, digest.hexdigest()
+
+    @staticmethod
+    def discard(path: str) -> None:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def inspect(self, path: str) -> Tuple[str, int]:
+        """Validate an upload by content: ``(kind, width of the stored original)``. Reads the header only."""
+        with open(path, "rb") as f:
+            kind = sniff_image_type(f.read(SNIFF_BYTES))
+        if kind is None:
+            self._count("rejected")
+            raise InvalidImage("File is not a PNG, JPEG, GIF or WebP image")
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+                orientation = img.getexif().get(0x0112) if kind != "gif" else None
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+            self._count("rejected")
+            raise InvalidImage("Image file is corrupt or unreadable")
+        if width * height > self.max_pixels:
+            self._count("rejected")
+            raise InvalidImage(f"Image is too large ({width}x{height})")
+        if kind == "gif":
+            return kind, width
+        if orientation in _TRANSPOSED:
+            width, height = height, width
+        return kind, fit_width(width, height, self.max_dimension)
+
+    def variant_widths(self, width: Optional[int]) -> Tuple[int, ...]:
+        """Widths of the variants written for an original ``width`` pixels wide (None: legacy layout)."""
+        if not width:
+            return self.widths
+        narrower = tuple(w for w in self.widths if w < width)
+        return narrower if len(narrower) == len(self.widths) else narrower + (width,)
+
+    def submit(
+        self, key: str, kind: str, path: str, width: Optional[int],
+        on_done: Optional[Callable[[bool], None]] = None,
+    ) -> None:
+        """Queue the original and its variants for ``key``; raises ImagePipelineBusy when full.
+
+        On success the job owns the spooled file at ``path`` and deletes it.
+        ``on_done(ok)`` is called on the worker thread once the job has finished.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count("busy")
+            raise ImagePipelineBusy("Image processing is busy, try again shortly")
+        self._count("submitted")
+        try:
+            self._executor.submit(self._run, key, kind, path, width, on_done)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def urls(self, key: str, kind: str, width: Optional[int]) -> Dict[str, Any]:
+        """URLs the job for ``key`` writes (the ``/uploads`` response)."""
+        url = upload_storage.backend.url(original_name(key, kind, width))
+        return {"url": url, "srcset": self.srcset(url)}
+
+    def names(self, key: str, kind: str, width: Optional[int]) -> List[str]:
+        """Every file the job for ``key`` writes."""
+        return [original_name(key, kind, width)] + [
+            variant_name(key, w, fmt) for w in self.variant_widths(width) for fmt in self.formats
+        ]
+
+    # -- worker side -------------------------------------------------------
+
+    def _run(
+        self, key: str, kind: str, path: str, width: Optional[int], on_done: Optional[Callable[[bool], None]]
+    ) -> None:
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            self.process(key, kind, path, width)
+            ok = True
+        except Exception:
+            self._count("failed")
+            logging.getLogger(__name__).exception("Image processing failed for %s", key)
+        else:
+            self._count("processed")
+            with self._lock:
+                self._times.append(time.perf_counter() - t0)
+        finally:
+            self.discard(path)
+            self._slots.release()
+            if on_done is not None:
+                try:
+                    on_done(ok)
+                except Exception:
+                    logging.getLogger(__name__).exception("Image job callback failed for %s", key)
+
+    def process(self, key: str, kind: str, path: str, width: Optional[int]) -> None:
+        """Write the original and variants for the image at ``path``; ``width`` is from ``inspect``."""
+        with Image.open(path) as src:
+            if kind == "gif":
+                with open(path, "rb") as f:
+                    upload_storage.save(original_name(key, kind, width), f, CONTENT_TYPES[kind], fallback=False)
+                img = src.convert("RGBA")
+            else:
+                # Pixels rotated upright; the EXIF/XMP blocks are not written back
+                img = ImageOps.exif_transpose(src)
+                icc = src.info.get("icc_profile")
+                if max(img.size) > self.max_dimension:
+                    img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+                self._store(original_name(key, kind, width), self._encode(img, kind, icc), kind)
+        img = self._normalize_mode(img)
+        self._variants(key, img, self.variant_widths(width))
+
+    def _variants(self, key: str, img: Image.Image, widths: Tuple[int, ...]) -> None:
+        # Widest first, each step downscaled from the previous one
+        current = img
+        for width in sorted(widths, reverse=True):
+            if current.width > width:
+                current = current.copy()
+                current.thumbnail((width, current.height), Image.LANCZOS, reducing_gap=3.0)
+            for fmt in self.formats:
+                self._store(variant_name(key, width, fmt), self._encode(current, fmt), fmt)
+
+    @staticmethod
+    def _normalize_mode(img: Image.Image) -> Image.Image:
+        if img.mode in ("RGB", "RGBA"):
+            return img
+        has_alpha = img.mode in ("LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        return img.convert("RGBA" if has_alpha else "RGB")
+
+    def _encode(self, img: Image.Image, fmt: str, icc_profile: Optional[bytes] = None) -> bytes:
+        out = io.BytesIO()
+        options: Dict[str, Any] = {}
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+        if fmt == "jpg":
+            img = img if img.mode in ("RGB", "L", "CMYK") else img.convert("RGB")
+            options.update(quality=self.quality["jpg"], optimize=True, progressive=True)
+        elif fmt == "png":
+            options.update(optimize=True)
+        elif fmt == "webp":
+            options.update(quality=self.quality["webp"], method=4)
+        elif fmt == "avif":
+            options.update(quality=self.quality["avif"], speed=6)
+        img.save(out, _PIL_FORMATS[fmt], **options)
+        return out.getvalue()
+
+    @staticmethod
+    def _store(name: str, data: bytes, fmt: str) -> None:
+        # No local fallback: the URLs handed out point at the configured backend
+        upload_storage.save(name, io.BytesIO(data), CONTENT_TYPES[fmt], fallback=False)
+
+    # -- URLs ----------------------------------------------------------------
+
+    def srcset(self, image_url: Optional[str]) -> Optional[Dict[str, str]]:
+        if not image_url or not self.formats:
+            return None
+        match = _ORIGINAL_RE.match(image_url)
+        if match is None:
+            return None
+        base = match["prefix"] + match["key"]
+        widths = self.variant_widths(int(match["width"]) if match["width"] else None)
+        return {
+            fmt: ", ".join(f"{base}/{width}.{fmt} {width}w" for width in widths)
+            for fmt in self.formats
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data: Dict[str, Any] = dict(self._counters)
+            times = sorted(self._times)
+        for name, q in (("ms_p50", 0.50), ("ms_p99", 0.99)):
+            data[name] = round(times[min(int(q * len(times)), len(times) - 1)] * 1000, 1) if times else None
+        return data
+
+
+image_pipeline = ImagePipeline()
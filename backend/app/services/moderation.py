@@ -1,7 +1,43 @@
-﻿from ..extensions import db
+﻿from sqlalchemy import func, update
+
+from ..extensions import db
 from ..models import MosqueSuggestion, Mosque, MosqueEditSuggestion
+from .blobs import blob_store
 
 APPROVAL_CONFIRMATION_THRESHOLD = 3
+# Statuses the model has already passed; only these can be approved by confirmations
+CONFIRMABLE_STATUSES = ("pending_approval", "pending")
+
+
+def increment_confirmations(model, obj_id: int) -> int:
+    """Add one to ``confirmations_count`` in a single UPDATE ... RETURNING; returns the new count.
+
+    The database does the arithmetic under the row lock, so concurrent
+    confirmers never lose an increment (a Python read-modify-write does).
+    """
+    table = model.__table__
+    return db.session.execute(
+        update(table)
+        .where(table.c.id == obj_id)
+        .values(confirmations_count=func.coalesce(table.c.confirmations_count, 0) + 1)
+        .returning(table.c.confirmations_count)
+    ).scalar_one()
+
+
+def claim_suggestion_approval(suggestion_id: int, from_statuses=None) -> bool:
+    """Move a suggestion to approved from one of ``from_statuses`` (default: any but approved).
+
+    Only one concurrent caller gets True: the conditional UPDATE waits on the
+    row lock and then re-checks the status. That caller alone runs
+    ``approve_suggestion``, so no suggestion creates two mosques.
+    """
+    table = MosqueSuggestion.__table__
+    allowed = table.c.status.in_(from_statuses) if from_statuses is not None else table.c.status != "approved"
+    return db.session.execute(
+        update(table)
+        .where(table.c.id == suggestion_id, allowed)
+        .values(status="approved")
+    ).rowcount == 1
 
 
 def approve_suggestion(s: MosqueSuggestion) -> Mosque:
@@ -66,6 +102,8 @@ def approve_suggestion(s: MosqueSuggestion) -> Mosque:
     )
     
     db.session.add(m)
+    # The suggestion's reference to the uploaded photo becomes the mosque's
+    blob_store.transfer(s, m)
     # Update Status
     s.status = "approved"
     
@@ -83,6 +121,7 @@ def approve_edit_suggestion(e: MosqueEditSuggestion) -> Mosque:
         raise ValueError(f"Mosque {e.mosque_id} not found")
 
     patch = e.patch_json or {}
+    old_image_url = mosque.image_url
 
     # Map patch fields to Mosque model fields
     mapping = {
@@ -119,6 +158,12 @@ def approve_edit_suggestion(e: MosqueEditSuggestion) -> Mosque:
             setattr(mosque, key, safe_val)
         # Ignore unknown keys
 
+    if mosque.image_url != old_image_url:
+        # The edit's reference to the new photo replaces the mosque's old one
+        blob_store.transfer(e, mosque)
+    else:
+        blob_store.release(e)
+
     e.status = "approved"
     db.session.add(e)
     db.session.add(mosque)
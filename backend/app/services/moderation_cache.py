@@ -0,0 +1,112 @@
+"""Cache of AI moderation decisions keyed by normalized text.
+
+The key is sha256 over the prompt version, the model version and the input
+after NFKC, casefolding and whitespace collapsing, so the same address or
+comment resubmitted with different spacing reuses one decision. Lookups hit
+an in-process LRU first, then the ``moderation_results`` table shared by all
+workers. Only real model/heuristic decisions are stored, never error
+fallbacks.
+
+The DB layer uses its own short transactions (``db.engine.begin()``) so it
+never interferes with the caller's session, and is skipped outside an app
+context.
+"""
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from flask import has_app_context
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from ..extensions import db
+from ..models import ModerationResult
+
+# Bump whenever a moderation prompt changes meaning
+PROMPT_VERSION = "2026-10-v1"
+
+
+def normalize_for_moderation(text: Optional[str]) -> str:
+    return " ".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+
+
+def cache_key(text: Optional[str], model_version: str) -> str:
+    raw = f"{PROMPT_VERSION}\x1f{model_version}\x1f{normalize_for_moderation(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ModerationCache:
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _remember(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, text: Optional[str], model_version: str) -> Optional[Dict[str, Any]]:
+        key = cache_key(text, model_version)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return dict(hit)
+
+        if has_app_context():
+            try:
+                with db.engine.connect() as conn:
+                    row = conn.execute(
+                        select(ModerationResult.result).where(ModerationResult.key == key)
+                    ).scalar()
+            except Exception:
+                logging.getLogger(__name__).warning("Moderation cache DB read failed", exc_info=True)
+                row = None
+            if row is not None:
+                self._remember(key, row)
+                self._count("db_hits")
+                return dict(row)
+
+        self._count("misses")
+        return None
+
+    def put(self, text: Optional[str], model_version: str, result: Dict[str, Any]) -> None:
+        stored = {k: result[k] for k in ("decision", "labels", "reason") if k in result}
+        key = cache_key(text, model_version)
+        self._remember(key, stored)
+        self._count("stores")
+        if not has_app_context():
+            return
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(ModerationResult.__table__.insert().values(
+                    key=key, model_version=model_version, result=stored, created_at=datetime.utcnow(),
+                ))
+        except IntegrityError:
+            pass  # another worker stored the same decision first
+        except Exception:
+            logging.getLogger(__name__).warning("Moderation cache DB write failed", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            counters["memory_entries"] = len(self._entries)
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        counters["hit_ratio"] = round((lookups - counters["misses"]) / lookups, 4) if lookups else None
+        return counters
+
+
+moderation_cache = ModerationCache()
@@ -0,0 +1,244 @@
+"""Background AI moderation for community submissions.
+
+POST handlers store suggestions, edits and reviews as ``pending_ai_review``
+and hand their ids to ``moderation_queue.submit``. A small pool of worker
+threads batches queued ids, moderates all their texts with one model call
+(``ai_moderation.moderate_batch``) and writes each decision back with a
+conditional UPDATE, so a row decided twice (e.g. by two gunicorn workers
+sweeping leftovers after a restart) is only ever moved once.
+
+The queue holds at most ``AI_MODERATION_QUEUE_SIZE`` jobs. When it is full,
+``submit`` sheds the job instead of blocking the request: the row simply
+stays ``pending_ai_review``. A sweep every ``AI_MODERATION_SWEEP_AFTER_SECONDS``
+re-queues rows left pending that long, whether shed or left by a previous
+process. Jobs are tracked from submission until their batch finishes, so
+the sweep skips rows this process already has queued or in progress.
+
+Model calls pass ``moderation_gate`` (``services/ratelimit.py``). A batch
+that finds the gate full gets no decisions back and its rows stay pending
+for the sweep too.
+
+Workers start lazily on the first submission, after gunicorn has forked.
+Set ``AI_MODERATION_ASYNC=false`` to moderate inline (scripts, debugging) and
+``AI_MODERATION_MODEL=stub`` to use the offline heuristic model.
+"""
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from ..extensions import db
+from ..models import MosqueEditSuggestion, MosqueSuggestion, Review
+from .ai_moderation import moderate_batch
+from .blobs import blob_store
+from .cache import response_cache
+from .ratelimit import moderation_gate
+
+PENDING_AI_STATUS = "pending_ai_review"
+
+
+def suggestion_text(s: MosqueSuggestion) -> str:
+    return " ".join([
+        s.arabic_name or "",
+        s.arabic_name or "",
+        s.type or "",
+        s.governorate or "",
+        s.city or "",
+        s.address or "",
+    ])
+
+
+def edit_text(e: MosqueEditSuggestion) -> str:
+    patch = e.patch_json or {}
+    return " ".join([
+        patch.get("address") or "",
+        patch.get("jumuah_time") or "",
+        str(patch.get("eid_info") or ""),
+        " ".join(sorted(patch.keys())),
+    ])
+
+
+def review_text(r: Review) -> str:
+    return " ".join([
+        str(r.rating),
+        " ".join([f"{k}:{v}" for k, v in (r.criteria or {}).items()]),
+        r.comment or "",
+    ])
+
+
+KINDS: Dict[str, Tuple[type, Callable]] = {
+    "suggestion": (MosqueSuggestion, suggestion_text),
+    "edit": (MosqueEditSuggestion, edit_text),
+    "review": (Review, review_text),
+}
+
+Job = Tuple[str, int]
+
+
+class ModerationQueue:
+    def __init__(self):
+        self.async_enabled = True
+        self.model = "gemini"
+        self.workers = 2
+        self.batch_size = 8
+        self.batch_wait = 0.5
+        self.sweep_after = 60.0
+        self._app = None
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=1000)
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._queued: Set[Job] = set()  # submitted and not yet finished
+        self.shed = 0
+        self.deferred = 0
+
+    def init_app(self, app) -> None:
+        self.async_enabled = bool(app.config.get("AI_MODERATION_ASYNC", True))
+        self.model = app.config.get("AI_MODERATION_MODEL", "gemini")
+        self.workers = int(app.config.get("AI_MODERATION_WORKERS", 2))
+        self.batch_size = int(app.config.get("AI_MODERATION_BATCH_SIZE", 8))
+        self.batch_wait = float(app.config.get("AI_MODERATION_BATCH_WAIT_SECONDS", 0.5))
+        self.sweep_after = float(app.config.get("AI_MODERATION_SWEEP_AFTER_SECONDS", 60))
+        self._queue = queue.Queue(maxsize=int(app.config.get("AI_MODERATION_QUEUE_SIZE", 1000)))
+        moderation_gate.configure(int(app.config.get("AI_MODERATION_MAX_CONCURRENCY", 4)))
+        self._app = app
+        app.extensions["moderation_queue"] = self
+
+    def submit(self, kind: str, obj_id: int) -> None:
+        if kind not in KINDS:
+            raise ValueError(f"Unknown moderation kind: {kind}")
+        if not self.async_enabled:
+            self.process([(kind, obj_id)])
+            return
+        self._ensure_started()
+        try:
+            self._enqueue((kind, obj_id))
+        except queue.Full:
+            with self._lock:
+                self.shed += 1
+            logging.getLogger(__name__).warning("AI moderation queue full; %s %s left for the sweep", kind, obj_id)
+
+    def _enqueue(self, job: Job) -> bool:
+        """Queue ``job`` unless it is already queued or running; raises queue.Full."""
+        with self._lock:
+            if job in self._queued:
+                return False
+            self._queued.add(job)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._queued.discard(job)
+            raise
+        return True
+
+    def _ensure_started(self) -> None:
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(max(self.workers, 1)):
+                t = threading.Thread(target=self._run, name=f"ai-moderation-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            threading.Thread(target=self._sweep, name="ai-moderation-sweep", daemon=True).start()
+
+    def _next_batch(self) -> List[Job]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            with self._app.app_context():
+                try:
+                    self.process(batch)
+                except Exception:
+                    db.session.rollback()
+                    logging.getLogger(__name__).exception("AI moderation batch of %s failed", len(batch))
+                finally:
+                    db.session.remove()
+                    with self._lock:
+                        self._queued.difference_update(batch)
+
+    def _sweep(self) -> None:
+        while True:
+            time.sleep(self.sweep_after)
+            self._sweep_once()
+
+    def _sweep_once(self) -> None:
+        """Re-queue rows left in pending_ai_review (shed, or by a previous process)."""
+        with self._app.app_context():
+            try:
+                cutoff = datetime.utcnow() - timedelta(seconds=self.sweep_after)
+                for kind, (model, _text) in KINDS.items():
+                    ids = [row[0] for row in db.session.query(model.id).filter(
+                        model.status == PENDING_AI_STATUS, model.created_at < cutoff
+                    )]
+                    for obj_id in ids:
+                        self._enqueue((kind, obj_id))
+            except queue.Full:
+                pass  # the rest waits for the next sweep
+            except Exception:
+                logging.getLogger(__name__).exception("AI moderation sweep failed")
+            finally:
+                db.session.remove()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(), "shed": self.shed, "deferred": self.deferred,
+            "model_gate": moderation_gate.stats(),
+        }
+
+    def process(self, batch: List[Job]) -> None:
+        """Moderate one batch and persist the decisions (needs an app context)."""
+        items = []
+        for kind in KINDS:
+            ids = {obj_id for k, obj_id in batch if k == kind}
+            if not ids:
+                continue
+            model, to_text = KINDS[kind]
+            for row in model.query.filter(model.id.in_(ids), model.status == PENDING_AI_STATUS):
+                items.append((kind, row, to_text(row)))
+        if not items:
+            return
+
+        decisions = moderate_batch([text for _k, _row, text in items], model=self.model)
+        public_changed = False
+        deferred = 0
+        for (kind, row, _text), decision in zip(items, decisions):
+            if decision.get("decision") is None:
+                # Model at capacity: stays pending_ai_review for the sweep
+                deferred += 1
+                continue
+            model = KINDS[kind][0]
+            status = "pending_approval" if decision.get("decision") == "valid" else "rejected"
+            moved = (
+                db.session.query(model)
+                .filter(model.id == row.id, model.status == PENDING_AI_STATUS)
+                .update({"status": status}, synchronize_session=False)
+            )
+            if moved and kind == "suggestion" and status == "pending_approval":
+                public_changed = True
+            if moved and status == "rejected" and kind != "review":
+                blob_store.release(row)
+        db.session.commit()
+        if deferred:
+            with self._lock:
+                self.deferred += deferred
+        if public_changed:
+            response_cache.invalidate("suggestions:public")
+
+
+moderation_queue = ModerationQueue()
@@ -0,0 +1,105 @@
+"""Commit-time notifications for changes to the ``mosques`` table.
+
+Process-local structures derived from approved mosques register a callback
+here instead of each wiring their own SQLAlchemy listeners. Callbacks receive
+the set of mosque ids touched by the committed transaction.
+
+Location-keyed structures (map tiles) register with
+``on_mosque_points_changed`` instead. They receive the ``(lat, lng)`` points
+touched by the transaction, both before and after any move.
+"""
+import logging
+from typing import Callable, Iterable, List, Set, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ..models import Mosque
+
+_SESSION_KEY = "_changed_mosque_ids"
+_POINTS_KEY = "_changed_mosque_points"
+_callbacks: List[Callable[[Set[int]], None]] = []
+_point_callbacks: List[Callable[[Set[Tuple[float, float]]], None]] = []
+
+
+def on_mosques_changed(callback: Callable[[Set[int]], None]) -> Callable[[Set[int]], None]:
+    if callback not in _callbacks:
+        _callbacks.append(callback)
+    return callback
+
+
+def notify_mosques_changed(mosque_ids: Iterable[int]) -> None:
+    ids = {int(i) for i in mosque_ids if i is not None}
+    if not ids:
+        return
+    for callback in list(_callbacks):
+        try:
+            callback(ids)
+        except Exception:
+            logging.getLogger(__name__).exception("Mosque change callback %r failed", callback)
+
+
+def on_mosque_points_changed(
+    callback: Callable[[Set[Tuple[float, float]]], None]
+) -> Callable[[Set[Tuple[float, float]]], None]:
+    if callback not in _point_callbacks:
+        _point_callbacks.append(callback)
+    return callback
+
+
+def notify_mosque_points_changed(points: Iterable[Tuple[float, float]]) -> None:
+    points = {(float(lat), float(lng)) for lat, lng in points if lat is not None and lng is not None}
+    if not points:
+        return
+    for callback in list(_point_callbacks):
+        try:
+            callback(points)
+        except Exception:
+            logging.getLogger(__name__).exception("Mosque point callback %r failed", callback)
+
+
+def _points_of(obj: Mosque) -> Set[Tuple[float, float]]:
+    """Current and pre-flush coordinates of a mosque (history is still intact in after_flush)."""
+    attrs = inspect(obj).attrs
+    lat_history = attrs.latitude.history
+    lng_history = attrs.longitude.history
+    points = {(obj.latitude, obj.longitude)}
+    if lat_history.deleted or lng_history.deleted:
+        old_lat = lat_history.deleted[0] if lat_history.deleted else obj.latitude
+        old_lng = lng_history.deleted[0] if lng_history.deleted else obj.longitude
+        points.add((old_lat, old_lng))
+    return points
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_mosques(session, _flush_context):
+    changed = session.info.setdefault(_SESSION_KEY, set())
+    points = session.info.setdefault(_POINTS_KEY, set())
+    for obj in session.new:
+        if isinstance(obj, Mosque):
+            changed.add(obj.id)
+            points |= _points_of(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Mosque) and session.is_modified(obj):
+            changed.add(obj.id)
+            points |= _points_of(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Mosque):
+            changed.add(obj.id)
+            points |= _points_of(obj)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_changed_mosques(session):
+    changed = session.info.pop(_SESSION_KEY, None)
+    points = session.info.pop(_POINTS_KEY, None)
+    if changed:
+        notify_mosques_changed(changed)
+    if points:
+        notify_mosque_points_changed(points)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_mosques(session):
+    session.info.pop(_SESSION_KEY, None)
+    session.info.pop(_POINTS_KEY, None)
@@ -0,0 +1,95 @@
+"""Radius queries against the database for ``/mosques/nearby``.
+
+Used when the in-memory geo index is disabled. With PostGIS and the
+``mosques.geog`` column (migration 3f9c2a71b8e4) the radius filter and the
+distance ordering run in SQL (``ST_DWithin`` + ``<->`` KNN on the GiST index);
+otherwise a lat/lng bounding box is fetched and refined with the NumPy kernel.
+"""
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import func, literal_column, text
+
+from ..extensions import db
+from ..models import Mosque
+from ..utils.geo import bounding_box, haversine_km_many, nearest_order
+
+_geog_support: Dict[str, bool] = {}
+_geog_lock = threading.Lock()
+
+_GEOG = literal_column("mosques.geog")
+
+
+def postgis_available() -> bool:
+    """Whether ``mosques.geog`` exists on the bound database (checked once per engine)."""
+    engine = db.engine
+    key = str(engine.url)
+    if key in _geog_support:
+        return _geog_support[key]
+    with _geog_lock:
+        if key not in _geog_support:
+            supported = False
+            if engine.dialect.name == "postgresql":
+                try:
+                    supported = bool(db.session.execute(text(
+                        "SELECT 1 FROM information_schema.columns "
+                        "WHERE table_name = 'mosques' AND column_name = 'geog'"
+                    )).scalar())
+                except Exception:
+                    logging.getLogger(__name__).warning("PostGIS probe failed", exc_info=True)
+            _geog_support[key] = supported
+    return _geog_support[key]
+
+
+def nearby_postgis(lat: float, lng: float, radius_km: float, limit: Optional[int] = None, options=()) -> List[Mosque]:
+    point = func.geography(func.ST_SetSRID(func.ST_MakePoint(lng, lat), 4326))
+    distance_km = (func.ST_Distance(_GEOG, point) / 1000.0).label("distance_km")
+    q = (
+        db.session.query(Mosque, distance_km)
+        .options(*options)
+        .filter(Mosque.approved.is_(True))
+        .filter(func.ST_DWithin(_GEOG, point, radius_km * 1000.0))
+        .order_by(_GEOG.op("<->")(point))
+    )
+    if limit:
+        q = q.limit(limit)
+    result = []
+    for m, dist in q.all():
+        m.distance_km = float(dist)
+        result.append(m)
+    return result
+
+
+def nearby_bbox(lat: float, lng: float, radius_km: float, limit: Optional[int] = None, options=()) -> List[Mosque]:
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+    candidates = (
+        Mosque.query.options(*options)
+        .filter_by(approved=True)
+        .filter(Mosque.latitude.between(min_lat, max_lat))
+        .filter(Mosque.longitude.between(min_lng, max_lng))
+        .filter(Mosque.latitude.isnot(None), Mosque.longitude.isnot(None))
+        .all()
+    )
+    if not candidates:
+        return []
+
+    distances = haversine_km_many(
+        lat, lng, [m.latitude for m in candidates], [m.longitude for m in candidates]
+    )
+    inside = np.flatnonzero(distances <= radius_km)
+    order = inside[nearest_order(distances[inside], limit)]
+    result = []
+    for i in order.tolist():
+        m = candidates[i]
+        m.distance_km = float(distances[i])
+        result.append(m)
+    return result
+
+
+def nearby_from_db(lat: float, lng: float, radius_km: float, limit: Optional[int] = None, options=()) -> List[Mosque]:
+    """Nearest approved mosques with ``distance_km`` set; ``options`` are ORM loader options."""
+    if postgis_available():
+        return nearby_postgis(lat, lng, radius_km, limit, options)
+    return nearby_bbox(lat, lng, radius_km, limit, options)
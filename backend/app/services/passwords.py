@@ -0,0 +1,158 @@
+"""Password hashing for ``User`` with a configurable cost and a bounded pool.
+
+``PASSWORD_HASH_METHOD`` is a werkzeug method string. Examples:
+``scrypt:32768:8:1`` (the werkzeug default, 32 MiB per hash) and
+``pbkdf2:sha256:600000``. Existing hashes keep working whatever the setting,
+because each one records its own method. After a successful login, a hash
+made with other parameters is recomputed with the current ones in the
+background (``PASSWORD_REHASH_ON_LOGIN``). Raising or lowering the cost
+therefore needs no migration.
+
+Hashing is CPU- and (for scrypt) memory-heavy. hashlib releases the GIL
+while it runs, so hashes run on a pool of ``PASSWORD_HASH_WORKERS`` threads.
+At most ``PASSWORD_HASH_QUEUE_SIZE`` hashes wait or run at once. Further
+callers wait up to ``PASSWORD_HASH_TIMEOUT_SECONDS`` and then get
+``PasswordHasherBusy`` (a 503 from ``/auth/login``). A login flood then uses
+a bounded slice of the worker's CPU and memory instead of every request thread.
+
+Subclasses can override ``_generate``/``_check`` to plug in another scheme;
+``needs_rehash`` only compares the method prefix before the first ``$``.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+T = TypeVar("T")
+
+
+class PasswordHasherBusy(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method: str = "scrypt:32768:8:1", salt_length: int = 16):
+        self.method = method
+        self.salt_length = salt_length
+        self.rehash_on_login = True
+        self.timeout = 5.0
+        self._prefix: Optional[str] = None
+        self._app = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(8)
+        self._lock = threading.Lock()
+        self._times = deque(maxlen=1024)
+        self._counters = {"hashed": 0, "verified": 0, "rehashed": 0, "busy": 0}
+
+    def init_app(self, app) -> None:
+        self._app = app
+        self.method = app.config.get("PASSWORD_HASH_METHOD", self.method)
+        self.salt_length = int(app.config.get("PASSWORD_SALT_LENGTH", self.salt_length))
+        self.rehash_on_login = bool(app.config.get("PASSWORD_REHASH_ON_LOGIN", True))
+        self.timeout = float(app.config.get("PASSWORD_HASH_TIMEOUT_SECONDS", self.timeout))
+        self._prefix = None
+        self._slots = threading.BoundedSemaphore(int(app.config.get("PASSWORD_HASH_QUEUE_SIZE", 8)))
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(app.config.get("PASSWORD_HASH_WORKERS", 2)), thread_name_prefix="password"
+        )
+        app.extensions["password_hasher"] = self
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    # -- scheme --------------------------------------------------------------
+
+    def _generate(self, password: str) -> str:
+        return generate_password_hash(password, method=self.method, salt_length=self.salt_length)
+
+    def _check(self, pwhash: str, password: str) -> bool:
+        return check_password_hash(pwhash, password)
+
+    @property
+    def prefix(self) -> str:
+        """Method part of a current hash, e.g. ``scrypt:32768:8:1`` for ``scrypt``."""
+        if self._prefix is None:
+            self._prefix = self._generate("").split("$", 1)[0]
+        return self._prefix
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        return pwhash.split("$", 1)[0] != self.prefix
+
+    # -- bounded execution ---------------------------------------------------
+
+    def _run(self, fn: Callable[..., T], *args) -> T:
+        if self._executor is None:
+            return fn(*args)  # outside the app (scripts)
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count("busy")
+            raise PasswordHasherBusy("Too many logins in progress, try again shortly")
+        try:
+            t0 = time.perf_counter()
+            result = self._executor.submit(fn, *args).result()
+            with self._lock:
+                self._times.append(time.perf_counter() - t0)
+            return result
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        self._count("hashed")
+        return self._run(self._generate, password)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        self._count("verified")
+        return self._run(self._check, pwhash, password)
+
+    def rehash_later(self, user_id: int, password: str, pwhash: str) -> None:
+        """After a successful login: store a hash with the current parameters, off the request thread."""
+        if not self.rehash_on_login or self._executor is None or not self.needs_rehash(pwhash):
+            return
+        # Best effort: skipped when the pool is saturated, retried on the next login
+        if not self._slots.acquire(blocking=False):
+            return
+        try:
+            self._executor.submit(self._rehash, user_id, password, pwhash)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _rehash(self, user_id: int, password: str, old_hash: str) -> None:
+        from sqlalchemy import update
+
+        from ..extensions import db
+        from ..models import User
+
+        try:
+            new_hash = self._generate(password)
+            with self._app.app_context():
+                with db.engine.begin() as conn:
+                    # Only if the password wasn't changed meanwhile
+                    conn.execute(
+                        update(User.__table__)
+                        .where(User.__table__.c.id == user_id, User.__table__.c.password_hash == old_hash)
+                        .values(password_hash=new_hash)
+                    )
+            self._count("rehashed")
+        except Exception:
+            logging.getLogger(__name__).exception("Password rehash failed for user %s", user_id)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data: Dict[str, Any] = dict(self._counters)
+            times = sorted(self._times)
+        data["method"] = self.method
+        for name, q in (("ms_p50", 0.50), ("ms_p99", 0.99)):
+            data[name] = round(times[min(int(q * len(times)), len(times) - 1)] * 1000, 1) if times else None
+        return data
+
+
+password_hasher = PasswordHasher()
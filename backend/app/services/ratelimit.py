@@ -0,0 +1,267 @@
+"""Per-client rate limits for write endpoints, and a concurrency gate.
+
+``rate_limiter`` runs before every non-GET request to a blueprint listed in
+``RATE_LIMITS``, for example ``suggestions=5/60`` for 5 requests per 60
+seconds. Each client gets a token bucket per blueprint. Its capacity is the
+count (the burst), and it refills at count/seconds. A request takes one
+token; with none left the answer is 429 with ``Retry-After``. The client is
+the JWT identity (when a valid token is sent) plus the IP address. All
+mobile guests share one user id, so for them the IP is what tells clients
+apart. With ``RATE_LIMIT_TRUSTED_PROXIES`` > 0 the IP is taken from
+``X-Forwarded-For``, as appended by that many proxies. Guests behind one
+NAT (a campus, a mosque's Wi-Fi, carrier-grade NAT) therefore share a
+bucket. Views register requests that need no budget with ``exempt``; the
+credential-less guest login is one.
+
+Backends (``RATE_LIMIT_BACKEND``):
+
+* ``memory``: buckets per process, so each gunicorn worker enforces the
+  budget on its own (up to workers × budget overall).
+* ``redis``: one bucket per client across workers. The update is a Lua
+  script on the server clock, so it is atomic and immune to worker clock
+  skew. ``FakeRedis`` runs the same script contract in-process, for tests
+  (``rate_limiter.use_backend(SharedBackend(FakeRedis()))``).
+* ``none``: no limits.
+
+If the backend fails, requests are let through (fail open).
+
+``ConcurrencyGate`` caps concurrent calls to something slow, such as the
+moderation model. It never waits: ``try_enter`` fails at once when the gate
+is full, so the caller can shed that work instead of queueing it.
+"""
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Tuple
+
+from flask import request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_smorest import abort
+
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# KEYS[1] = bucket; ARGV = capacity, refill per second, cost.
+# Returns {allowed (0/1), seconds until enough tokens, tokens left}.
+_TAKE_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait), tostring(tokens)}
+"""
+
+
+def parse_budgets(spec: str) -> Dict[str, Tuple[float, float]]:
+    """``"suggestions=5/60,reviews=10/60"`` -> ``{blueprint: (capacity, refill per second)}``."""
+    budgets = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, budget = part.partition("=")
+        count, _, seconds = budget.partition("/")
+        budgets[name.strip()] = (float(count), float(count) / float(seconds or 1))
+    return budgets
+
+
+def _take(tokens: float, ts: float, now: float, capacity: float, rate: float, cost: float) -> Tuple[bool, float, float]:
+    """One token-bucket step: (allowed, seconds to wait, tokens left)."""
+    tokens = min(capacity, tokens + max(0.0, now - ts) * rate)
+    if tokens >= cost:
+        return True, 0.0, tokens - cost
+    return False, (cost - tokens) / rate, tokens
+
+
+class MemoryBackend:
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (capacity, now))
+            allowed, wait, tokens = _take(tokens, ts, now, capacity, rate, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Least recently seen first: those buckets have refilled the longest
+            while len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+        return allowed, wait, tokens
+
+
+class SharedBackend:
+    def __init__(self, client, prefix: str = "mosquestn:ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(_TAKE_LUA)
+
+    def take(self, key: str, capacity: float, rate: float, cost: float = 1.0) -> Tuple[bool, float, float]:
+        allowed, wait, tokens = self._script(keys=[self.prefix + key], args=[capacity, rate, cost])
+        return bool(int(allowed)), float(wait), float(tokens)
+
+
+class FakeRedis:
+    """In-process stand-in for the redis client ``SharedBackend`` needs (tests, local runs)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, Tuple[float, float]] = {}
+
+    def register_script(self, _lua: str):
+        def run(keys, args):
+            capacity, rate, cost = (float(a) for a in args)
+            now = time.time()
+            with self._lock:
+                tokens, ts = self._hashes.get(keys[0], (capacity, now))
+                allowed, wait, tokens = _take(tokens, ts, now, capacity, rate, cost)
+                self._hashes[keys[0]] = (tokens, now)
+            return [int(allowed), str(wait), str(tokens)]
+
+        return run
+
+
+class RateLimiter:
+    def __init__(self):
+        self.backend = None
+        self.budgets: Dict[str, Tuple[float, float]] = {}
+        self.trusted_proxies = 0
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._exempt: Dict[str, Callable[[], bool]] = {}
+        self.backend_errors = 0
+
+    def init_app(self, app) -> None:
+        kind = (app.config.get("RATE_LIMIT_BACKEND") or "memory").lower()
+        self.budgets = parse_budgets(app.config.get("RATE_LIMITS", ""))
+        self.trusted_proxies = int(app.config.get("RATE_LIMIT_TRUSTED_PROXIES", 0))
+        if kind == "redis":
+            import redis  # optional dependency, only needed for the shared backend
+
+            self.backend = SharedBackend(redis.Redis.from_url(app.config["REDIS_URL"]))
+        elif kind == "memory":
+            self.backend = MemoryBackend()
+        else:
+            self.backend = None
+        app.extensions["rate_limiter"] = self
+        app.before_request(self._check_request)
+
+    def exempt(self, endpoint: str, when: Callable[[], bool]) -> None:
+        """Let requests to ``endpoint`` through without a token while ``when()`` is true."""
+        self._exempt[endpoint] = when
+
+    def use_backend(self, backend) -> None:
+        """Swap the backend at runtime (e.g. ``SharedBackend(FakeRedis())`` in tests)."""
+        self.backend = backend
+
+    def _client_ip(self) -> str:
+        if self.trusted_proxies:
+            forwarded = [a.strip() for a in request.headers.get("X-Forwarded-For", "").split(",") if a.strip()]
+            if len(forwarded) >= self.trusted_proxies:
+                return forwarded[-self.trusted_proxies]
+        return request.remote_addr or "-"
+
+    def client_key(self) -> str:
+        try:
+            verify_jwt_in_request(optional=True)
+            identity = get_jwt_identity()
+        except Exception:
+            identity = None  # bad tokens are rejected by the view itself
+        return f"{identity or '-'}@{self._client_ip()}"
+
+    def _count(self, blueprint: str, name: str) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(blueprint, {"allowed": 0, "limited": 0, "exempt": 0})
+            counters[name] += 1
+
+    def _check_request(self) -> None:
+        if request.method in _SAFE_METHODS or self.backend is None:
+            return
+        budget = self.budgets.get(request.blueprint)
+        if budget is None:
+            return
+        when = self._exempt.get(request.endpoint)
+        if when is not None and when():
+            self._count(request.blueprint, "exempt")
+            return
+        capacity, rate = budget
+        try:
+            allowed, wait, _tokens = self.backend.take(f"{request.blueprint}:{self.client_key()}", capacity, rate)
+        except Exception:
+            with self._lock:
+                self.backend_errors += 1
+            logging.getLogger(__name__).warning("Rate limit check failed, allowing request", exc_info=True)
+            return
+        if allowed:
+            self._count(request.blueprint, "allowed")
+            return
+        self._count(request.blueprint, "limited")
+        abort(
+            429,
+            message="Too many requests, slow down",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data: Dict[str, Any] = {k: dict(v) for k, v in self._counters.items()}
+            data["backend_errors"] = self.backend_errors
+        data["backend"] = type(self.backend).__name__ if self.backend is not None else None
+        return data
+
+
+class ConcurrencyGate:
+    def __init__(self, name: str, limit: int = 4):
+        self.name = name
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {"entered": 0, "shed": 0}
+
+    def configure(self, limit: int) -> None:
+        self.limit = max(limit, 1)
+        self._slots = threading.BoundedSemaphore(self.limit)
+
+    def try_enter(self) -> bool:
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._counters["shed"] += 1
+            return False
+        with self._lock:
+            self._in_flight += 1
+            self._counters["entered"] += 1
+        return True
+
+    def leave(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            data: Dict[str, Any] = dict(self._counters)
+            data["in_flight"] = self._in_flight
+        data["limit"] = self.limit
+        return data
+
+
+rate_limiter = RateLimiter()
+moderation_gate = ConcurrencyGate("ai_moderation")
@@ -0,0 +1,146 @@
+"""Incrementally maintained per-mosque review aggregates.
+
+Moderation routes change review status through ``set_review_status`` /
+``forget_review`` so ``mosque_rating_stats`` always reflects the approved
+reviews. Reading a mosque's rating is one primary-key row, never a scan of
+``reviews``.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..extensions import db
+from ..models import Mosque, MosqueRatingStats, Review
+from ..utils.reviews import CRITERIA_KEYS
+
+COUNTED_STATUS = "approved"  # same status the public reviews listing exposes
+
+_stats = MosqueRatingStats.__table__
+# Dialects with INSERT ... ON CONFLICT DO NOTHING
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _locked_stats(mosque_id: int) -> Optional[MosqueRatingStats]:
+    return (
+        db.session.query(MosqueRatingStats)
+        .filter_by(mosque_id=mosque_id)
+        .with_for_update()
+        .first()
+    )
+
+
+def _stats_for_update(mosque_id: int) -> MosqueRatingStats:
+    stats = _locked_stats(mosque_id)
+    if stats is not None:
+        return stats
+    # FOR UPDATE locks nothing while the row is missing, so two first reviews
+    # can both get here. Create it without failing on the other's insert, then
+    # lock whichever row won.
+    values = dict(
+        mosque_id=mosque_id, review_count=0, rating_sum=0,
+        rating_histogram={}, criteria_sums={}, criteria_counts={}, updated_at=datetime.utcnow(),
+    )
+    insert = _INSERTS.get(db.engine.dialect.name)
+    if insert is not None:
+        db.session.execute(insert(_stats).values(**values).on_conflict_do_nothing(index_elements=["mosque_id"]))
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(_stats.insert().values(**values))
+        except IntegrityError:
+            pass
+    return _locked_stats(mosque_id)
+
+
+def _apply(review: Review, sign: int) -> None:
+    stats = _stats_for_update(review.mosque_id)
+    stats.review_count = (stats.review_count or 0) + sign
+    stats.rating_sum = (stats.rating_sum or 0) + sign * int(review.rating)
+
+    # JSON columns are not mutation-tracked: always assign fresh dicts
+    histogram = dict(stats.rating_histogram or {})
+    bucket = str(int(review.rating))
+    histogram[bucket] = histogram.get(bucket, 0) + sign
+    stats.rating_histogram = histogram
+
+    sums = dict(stats.criteria_sums or {})
+    counts = dict(stats.criteria_counts or {})
+    for key, value in (review.criteria or {}).items():
+        if key not in CRITERIA_KEYS:
+            continue
+        sums[key] = sums.get(key, 0) + sign * int(value)
+        counts[key] = counts.get(key, 0) + sign
+    stats.criteria_sums = sums
+    stats.criteria_counts = counts
+
+    # Bump the mosque so caches, the geo index and /mosques/changes pick it up
+    mosque = db.session.get(Mosque, review.mosque_id)
+    if mosque is not None:
+        mosque.updated_at = datetime.utcnow()
+
+
+def set_review_status(review: Review, status: str) -> bool:
+    """Change a review's status and move it in or out of the aggregates. Caller commits.
+
+    The status moves with a conditional UPDATE on the status this request read,
+    so of two moderators changing the same review at once only one applies the
+    aggregate delta. Returns False (and reloads ``review``) for the loser.
+    """
+    old = review.status
+    table = Review.__table__
+    moved = db.session.execute(
+        update(table).where(table.c.id == review.id, table.c.status == old).values(status=status)
+    ).rowcount == 1
+    if not moved:
+        db.session.refresh(review)
+        return False
+    set_committed_value(review, "status", status)
+    was_counted = old == COUNTED_STATUS
+    is_counted = status == COUNTED_STATUS
+    if was_counted != is_counted:
+        _apply(review, 1 if is_counted else -1)
+    return True
+
+
+def forget_review(review: Review) -> None:
+    """Remove a review about to be deleted from the aggregates. Caller deletes and commits."""
+    # Lock the row and read its committed status, so a concurrent approval is either
+    # counted here or finds the row gone
+    status = db.session.execute(
+        select(Review.__table__.c.status).where(Review.__table__.c.id == review.id).with_for_update()
+    ).scalar()
+    if status == COUNTED_STATUS:
+        _apply(review, -1)
+
+
+def summarize(stats: Optional[Any]) -> Dict[str, Any]:
+    """Client-facing summary from a stats row (ORM object or mapping) or None."""
+    def get(name):
+        if stats is None:
+            return None
+        return stats.get(name) if isinstance(stats, dict) else getattr(stats, name)
+
+    count = get("review_count") or 0
+    histogram = get("rating_histogram") or {}
+    sums = get("criteria_sums") or {}
+    counts = get("criteria_counts") or {}
+    return {
+        "count": count,
+        "average": round((get("rating_sum") or 0) / count, 2) if count else None,
+        "histogram": {str(r): int(histogram.get(str(r), 0)) for r in range(1, 6)},
+        "criteria": {
+            key: round(sums.get(key, 0) / counts[key], 2)
+            for key in sorted(CRITERIA_KEYS)
+            if counts.get(key)
+        },
+    }
+
+
+def summaries_by_mosque() -> Dict[int, Dict[str, Any]]:
+    """All rating summaries in one read, for bulk row builders (geo index, snapshot)."""
+    table = MosqueRatingStats.__table__
+    return {row["mosque_id"]: summarize(dict(row)) for row in db.session.execute(table.select()).mappings()}
@@ -0,0 +1,209 @@
+"""Optional read replicas for public GET endpoints.
+
+``DATABASE_REPLICA_URLS`` (comma-separated) adds one engine per replica as
+the ``replica1``, ``replica2``, ... binds, so they get the same pool settings
+and show up per bind in the ``db_pool`` metrics. GET/HEAD requests to the
+blueprints in ``DB_REPLICA_BLUEPRINTS`` run their reads on a replica
+(``RoutingSession`` in ``extensions.py``). All other requests stay on the
+primary, and so does every write.
+
+* Lag: each replica's replay lag is polled at most every
+  ``DB_REPLICA_CHECK_SECONDS``, by whichever request finds it due. Replicas
+  behind by more than ``DB_REPLICA_MAX_LAG_SECONDS``, or whose check failed,
+  are skipped until the next check. With no usable replica, reads fall back
+  to the primary. Non-Postgres replicas (local SQLite copies in tests) are
+  only checked for reachability and report zero lag.
+* Read-your-writes: a successful write request gets a ``db_primary_until``
+  cookie, so for ``DB_READ_YOUR_WRITES_SECONDS`` that client's GETs read the
+  primary in every worker. A commit that wrote anything also pins this
+  whole process to the primary for the same window. Indexes and cache entries
+  dropped by that commit are then rebuilt from fresh data.
+
+Shared (redis) response cache entries can still be refilled from a lagging
+replica by another worker; that staleness is bounded by the max lag plus
+the cache TTL.
+"""
+import logging
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from flask import request
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from ..extensions import db
+
+_LAG_SQL = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery() THEN 0"
+    " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+    " END"
+)
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def replica_binds(config) -> Dict[str, str]:
+    """``SQLALCHEMY_BINDS`` entries for the configured replica URLs."""
+    urls = [u.strip() for u in (config.get("DATABASE_REPLICA_URLS") or "").split(",") if u.strip()]
+    return {f"replica{i}": url for i, url in enumerate(urls, start=1)}
+
+
+class Replica:
+    def __init__(self, bind_key: str):
+        self.bind_key = bind_key
+        self.lag_seconds: Optional[float] = None
+        self.healthy = False
+        self.checked_at = 0.0  # monotonic; 0 = never checked
+        self.reads = 0
+        self.check_failures = 0
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas: List[Replica] = []
+        self.blueprints = set()
+        self.max_lag_seconds = 5.0
+        self.check_seconds = 5.0
+        self.read_your_writes_seconds = 10.0
+        self.cookie_name = "db_primary_until"
+        self._primary_until = 0.0  # monotonic; process pinned to the primary until then
+        self._check_lock = threading.Lock()
+        self._counter_lock = threading.Lock()
+        self._counters = {"primary_fallbacks": 0, "pinned_reads": 0}
+
+    def init_app(self, app) -> None:
+        self.replicas = [Replica(key) for key in replica_binds(app.config)]
+        self.blueprints = {b.strip() for b in app.config.get("DB_REPLICA_BLUEPRINTS", "").split(",") if b.strip()}
+        self.max_lag_seconds = float(app.config.get("DB_REPLICA_MAX_LAG_SECONDS", self.max_lag_seconds))
+        self.check_seconds = float(app.config.get("DB_REPLICA_CHECK_SECONDS", self.check_seconds))
+        self.read_your_writes_seconds = float(
+            app.config.get("DB_READ_YOUR_WRITES_SECONDS", self.read_your_writes_seconds)
+        )
+        app.extensions["replica_router"] = self
+        if not self.replicas:
+            return
+        app.before_request(self._route_request)
+        app.after_request(self._mark_writer)
+        for name, fn in (
+            ("after_flush", self._after_flush),
+            ("after_commit", self._after_commit),
+            ("after_rollback", self._after_rollback),
+        ):
+            if not event.contains(Session, name, fn):
+                event.listen(Session, name, fn)
+        logging.getLogger(__name__).info(
+            "Routing GETs of %s to %s read replica(s)", ", ".join(sorted(self.blueprints)), len(self.replicas)
+        )
+
+    def _count(self, name: str) -> None:
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    # -- lag checks ---------------------------------------------------------
+
+    def _check(self, replica: Replica) -> None:
+        engine = db.engines[replica.bind_key]
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name == "postgresql":
+                    lag = float(conn.execute(_LAG_SQL).scalar() or 0.0)
+                else:
+                    conn.execute(text("SELECT 1"))
+                    lag = 0.0
+        except Exception:
+            logging.getLogger(__name__).warning("Replica %s lag check failed", replica.bind_key, exc_info=True)
+            replica.healthy = False
+            replica.lag_seconds = None
+            replica.check_failures += 1
+        else:
+            replica.lag_seconds = lag
+            replica.healthy = lag <= self.max_lag_seconds
+        replica.checked_at = time.monotonic()
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        due = [r for r in self.replicas if now - r.checked_at >= self.check_seconds]
+        # One request runs the checks; the others route on the previous results
+        if due and self._check_lock.acquire(blocking=False):
+            try:
+                for replica in due:
+                    self._check(replica)
+            finally:
+                self._check_lock.release()
+
+    def pick(self) -> Optional[Replica]:
+        self._refresh()
+        usable = [r for r in self.replicas if r.healthy]
+        return random.choice(usable) if usable else None
+
+    # -- request routing ----------------------------------------------------
+
+    def _pinned(self) -> bool:
+        if time.monotonic() < self._primary_until:
+            return True
+        try:
+            return float(request.cookies.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _route_request(self) -> None:
+        if request.method not in ("GET", "HEAD") or request.blueprint not in self.blueprints:
+            return
+        if self._pinned():
+            self._count("pinned_reads")
+            return
+        replica = self.pick()
+        if replica is None:
+            self._count("primary_fallbacks")
+            return
+        with self._counter_lock:
+            replica.reads += 1
+        db.session().info["read_engine"] = db.engines[replica.bind_key]
+
+    def _mark_writer(self, response):
+        if request.method not in _SAFE_METHODS and response.status_code < 400:
+            window = self.read_your_writes_seconds
+            response.set_cookie(
+                self.cookie_name,
+                f"{time.time() + window:.3f}",
+                max_age=math.ceil(window),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    @staticmethod
+    def _after_flush(session, _flush_context) -> None:
+        session.info["wrote"] = True
+
+    def _after_commit(self, session) -> None:
+        if session.info.pop("wrote", False):
+            self._primary_until = time.monotonic() + self.read_your_writes_seconds
+
+    @staticmethod
+    def _after_rollback(session) -> None:
+        session.info.pop("wrote", None)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._counter_lock:
+            data: Dict[str, Any] = dict(self._counters)
+        data["pinned"] = now < self._primary_until
+        data["replicas"] = {
+            r.bind_key: {
+                "healthy": r.healthy,
+                "lag_seconds": round(r.lag_seconds, 3) if r.lag_seconds is not None else None,
+                "checked_seconds_ago": round(now - r.checked_at, 1) if r.checked_at else None,
+                "reads": r.reads,
+                "check_failures": r.check_failures,
+            }
+            for r in self.replicas
+        }
+        return data
+
+
+replica_router = ReplicaRouter()
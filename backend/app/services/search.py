@@ -0,0 +1,147 @@
+"""Ranked name/location search for ``GET /mosques?search=...``.
+
+Both backends match on ``Mosque.search_text`` (see ``utils.text``), so
+diacritics, alef variants and taa marbuta fold the same way everywhere.
+
+* Postgres with ``pg_trgm``: ``%`` similarity / ``ILIKE`` on the GIN trigram
+  index, ranked by ``similarity()``.
+* Anything else (SQLite, Postgres without the extension): an in-process
+  trigram inverted index over approved mosques with the same scoring.
+"""
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, or_, select, text
+
+from ..extensions import db
+from ..models import Mosque
+from ..utils.text import escape_like, normalize_search_text
+from .mosque_events import on_mosques_changed
+
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm's default for the % operator
+MAX_RESULTS = 1000
+
+_trgm_support: Dict[str, bool] = {}
+_trgm_lock = threading.Lock()
+
+
+def trigrams(value: str) -> Set[str]:
+    """pg_trgm-style trigrams: each word padded with two leading and one trailing space."""
+    grams: Set[str] = set()
+    for word in value.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def pg_trgm_available() -> bool:
+    engine = db.engine
+    key = str(engine.url)
+    if key in _trgm_support:
+        return _trgm_support[key]
+    with _trgm_lock:
+        if key not in _trgm_support:
+            supported = False
+            if engine.dialect.name == "postgresql":
+                try:
+                    supported = bool(db.session.execute(
+                        text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                    ).scalar())
+                except Exception:
+                    logging.getLogger(__name__).warning("pg_trgm probe failed", exc_info=True)
+            _trgm_support[key] = supported
+    return _trgm_support[key]
+
+
+class MosqueSearchIndex:
+    """Trigram inverted index over approved mosques, rebuilt lazily after changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Set[int]] = {}
+        self._texts: Dict[int, str] = {}
+        self._grams: Dict[int, Set[str]] = {}
+        self._stale = True
+
+    def init_app(self, app) -> None:
+        app.extensions["search_index"] = self
+        on_mosques_changed(self.invalidate)
+
+    def invalidate(self, _mosque_ids: Optional[Set[int]] = None) -> None:
+        self._stale = True
+
+    def rebuild(self) -> None:
+        stmt = select(Mosque.id, Mosque.search_text).where(Mosque.approved.is_(True))
+        postings: Dict[str, Set[int]] = {}
+        texts: Dict[int, str] = {}
+        grams_by_id: Dict[int, Set[str]] = {}
+        for mosque_id, search_text in db.session.execute(stmt):
+            value = search_text or ""
+            grams = trigrams(value)
+            texts[mosque_id] = value
+            grams_by_id[mosque_id] = grams
+            for g in grams:
+                postings.setdefault(g, set()).add(mosque_id)
+        with self._lock:
+            self._postings, self._texts, self._grams = postings, texts, grams_by_id
+            self._stale = False
+
+    def search(self, term: str) -> List[Tuple[int, float]]:
+        """(mosque_id, score) best first; substring hits always qualify."""
+        if self._stale:
+            self.rebuild()
+        query = normalize_search_text(term)
+        if not query:
+            return []
+        query_grams = trigrams(query)
+        postings, texts, grams_by_id = self._postings, self._texts, self._grams
+
+        shared: Dict[int, int] = {}
+        for g in query_grams:
+            for mosque_id in postings.get(g, ()):
+                shared[mosque_id] = shared.get(mosque_id, 0) + 1
+
+        scored = []
+        for mosque_id, n in shared.items():
+            union = len(query_grams) + len(grams_by_id[mosque_id]) - n
+            score = n / union if union else 0.0
+            if score >= SIMILARITY_THRESHOLD or query in texts[mosque_id]:
+                scored.append((mosque_id, score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:MAX_RESULTS]
+
+
+search_index = MosqueSearchIndex()
+
+
+def search_mosques(query, term: str, offset: int, limit: int) -> List[Mosque]:
+    """Apply a ranked search to an already-filtered ``Mosque`` query and return one page."""
+    normalized = normalize_search_text(term)
+    if not normalized:
+        return []
+
+    if pg_trgm_available():
+        score = func.similarity(Mosque.search_text, normalized)
+        return (
+            query.filter(or_(
+                Mosque.search_text.op("%")(normalized),
+                Mosque.search_text.ilike(f"%{escape_like(normalized)}%", escape="\\"),
+            ))
+            .order_by(score.desc(), Mosque.id)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+
+    ranked = search_index.search(normalized)
+    if not ranked:
+        return []
+    rank = {mosque_id: pos for pos, (mosque_id, _score) in enumerate(ranked)}
+    # Narrow the ranked ids by the caller's other filters, then load just one page
+    allowed = [row[0] for row in query.with_entities(Mosque.id).filter(Mosque.id.in_(list(rank))).all()]
+    page_ids = sorted(allowed, key=rank.__getitem__)[offset:offset + limit]
+    if not page_ids:
+        return []
+    items = query.filter(Mosque.id.in_(page_ids)).all()  # keeps the caller's loader options
+    return sorted(items, key=lambda m: rank[m.id])
@@ -0,0 +1,257 @@
+"""Compiled serializers for bulk list responses.
+
+``MosqueSchema(many=True).dump`` walks every marshmallow field of every ORM
+object. For 500-row pages that, plus loading the objects into the identity
+map, dominates the request. ``CompiledSerializer`` reads a schema's fields
+once and resolves them into plain converter functions that dump row mappings
+(``Result.mappings()`` or dicts).
+
+The output matches ``schema.dump`` exactly, including omitting fields whose
+attribute is absent from the row (e.g. ``eid_info`` for mosques,
+``distance_km`` outside ``/nearby``). ``json_response`` encodes with the
+app's JSON provider, so the bytes are the same as flask-smorest's
+``jsonify``. Views return the resulting ``Response`` and flask-smorest passes
+it through untouched.
+"""
+import datetime as dt
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from flask import Response, current_app
+from marshmallow import Schema, fields
+from sqlalchemy import select
+from sqlalchemy.orm import load_only, noload, selectinload
+
+from ..extensions import db
+from ..models import Mosque, MosqueRatingStats
+from ..schemas.mosque import MosqueSchema
+from ..schemas.review import ReviewSchema
+from ..schemas.suggestion import MosqueSuggestionSchema
+from .ratings import summarize
+
+# Converters for the common scalar fields. Values already of the target type
+# are passed through without a call.
+def _int(v):
+    return None if v is None else (v if v.__class__ is int else int(v))
+
+
+def _float(v):
+    return None if v is None else (v if v.__class__ is float else float(v))
+
+
+def _str(v):
+    return None if v is None else (v if v.__class__ is str else str(v))
+
+
+def _datetime(v):
+    return None if v is None else dt.datetime.isoformat(v)
+
+
+_SCALARS = {"int": _int, "float": _float, "str": _str, "datetime": _datetime}
+
+
+def _bool(field: fields.Boolean) -> Callable[[Any], Any]:
+    truthy, falsy = field.truthy, field.falsy
+
+    def convert(v):
+        if v is None:
+            return None
+        try:
+            if v in truthy:
+                return True
+            if v in falsy:
+                return False
+        except TypeError:
+            pass
+        return bool(v)
+
+    return convert
+
+
+def _kind(field: fields.Field) -> Optional[str]:
+    if isinstance(field, fields.Number) and field.as_string:
+        return None
+    if type(field) is fields.Integer:
+        return "int"
+    if type(field) is fields.Float:
+        return "float"
+    if type(field) is fields.String:
+        return "str"
+    if type(field) is fields.DateTime and field.format in (None, "iso", "iso8601"):
+        return "datetime"
+    return None
+
+
+def _converter(field: fields.Field) -> Callable[[Any], Any]:
+    """Plain-Python equivalent of ``field._serialize``, used for nested and dict values."""
+    if isinstance(field, fields.Boolean):
+        return _bool(field)
+    kind = _kind(field)
+    if kind is not None:
+        return _SCALARS[kind]
+    if type(field) is fields.Dict:
+        return _dict_converter(field)
+    if isinstance(field, fields.Nested) and not field.many:
+        nested = CompiledSerializer(field.schema)
+        return lambda v: None if v is None else nested.dump(v)
+    return lambda v: field._serialize(v, None, None)
+
+
+def _dict_converter(field: fields.Dict) -> Callable[[Any], Any]:
+    if field.key_field is None and field.value_field is None:
+        return lambda d: None if d is None else dict(d)
+    key = _converter(field.key_field) if field.key_field is not None else (lambda k: k)
+    if field.value_field is None:
+        return lambda d: None if d is None else {key(k): v for k, v in d.items()}
+    value = _converter(field.value_field)
+    return lambda d: None if d is None else {key(k): value(v) for k, v in d.items()}
+
+
+class CompiledSerializer:
+    """``schema.dump`` for row mappings.
+
+    For each distinct set of row keys the matching fields are resolved once
+    into a plan of ``(output key, row key, converter)``, so dumping a row is
+    one loop over plain functions with no marshmallow dispatch.
+    """
+
+    def __init__(self, schema: Schema):
+        self.schema = schema
+        # (output key, source attribute, field)
+        self._fields: List[Tuple[str, str, fields.Field]] = [
+            (f.data_key or name, f.attribute or name, f) for name, f in schema.dump_fields.items()
+        ]
+        self._plans: Dict[Tuple[Tuple[str, ...], Optional[Tuple[str, ...]]], List[Tuple[str, str, Callable]]] = {}
+
+    def _plan(self, keys: Iterable[str], only: Optional[Sequence[str]] = None) -> List[Tuple[str, str, Callable]]:
+        cache_key = (tuple(keys), tuple(only) if only is not None else None)
+        plan = self._plans.get(cache_key)
+        if plan is not None:
+            return plan
+
+        present = set(cache_key[0])
+        wanted = set(only) if only is not None else None
+        plan = []
+        for key, src, field in self._fields:
+            if src not in present:
+                continue  # marshmallow omits fields whose attribute is missing
+            if wanted is not None and key not in wanted:
+                continue  # another field needs this attribute, but it wasn't requested
+            plan.append((key, src, _converter(field)))
+        self._plans[cache_key] = plan
+        return plan
+
+    def field_names(self) -> List[str]:
+        return [key for key, _src, _field in self._fields]
+
+    def sources(self, names: Iterable[str]) -> List[str]:
+        """Row attributes needed to dump the given output fields."""
+        wanted = set(names)
+        return [src for key, src, _field in self._fields if key in wanted]
+
+    def dump(self, row: Mapping[str, Any], only: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        return {key: convert(row[src]) for key, src, convert in self._plan(row.keys(), only)}
+
+    def dump_many(self, rows: Sequence[Mapping[str, Any]], only: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Dump rows; ``only`` limits the output to those field names (sparse fieldsets)."""
+        if not rows:
+            return []
+        plan = self._plan(rows[0].keys(), only)
+        return [{key: convert(row[src]) for key, src, convert in plan} for row in rows]
+
+
+# Named field sets accepted by ``?fields=`` on the mosque read endpoints
+MOSQUE_FIELD_PRESETS: Dict[str, Tuple[str, ...]] = {
+    "map": ("id", "arabic_name", "latitude", "longitude", "type"),
+}
+
+
+def json_response(data: Any) -> Response:
+    """Encode like flask-smorest's ``jsonify`` (same provider settings, same bytes)."""
+    return current_app.json.response(data)
+
+
+def parse_mosque_fields(spec: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Turn ``?fields=`` (comma-separated names and/or presets) into output field names.
+
+    Returns None for "all fields". ``id`` is always included. Raises
+    ValueError on unknown names.
+    """
+    if not spec or not spec.strip():
+        return None
+    known = mosque_serializer.field_names()
+    wanted = {"id"}
+    for name in (part.strip() for part in spec.split(",")):
+        if not name:
+            continue
+        if name in MOSQUE_FIELD_PRESETS:
+            wanted.update(MOSQUE_FIELD_PRESETS[name])
+        elif name in known:
+            wanted.add(name)
+        else:
+            raise ValueError(f"Unknown field: {name}")
+    return tuple(name for name in known if name in wanted)
+
+
+def _mosque_columns(names: Optional[Sequence[str]]) -> List[str]:
+    table = Mosque.__table__
+    if names is None:
+        return list(table.columns.keys())
+    return [src for src in mosque_serializer.sources(names) if src in table.columns]
+
+
+def mosque_load_options(names: Sequence[str], always: Sequence[str] = ()) -> list:
+    """ORM loader options that SELECT only what the field set (plus ``always`` columns) needs."""
+    columns = _mosque_columns(names) + [c for c in always if c not in _mosque_columns(names)]
+    options = [load_only(*[getattr(Mosque, c) for c in columns])]
+    options.append(selectinload(Mosque.rating_stats) if "rating" in names else noload(Mosque.rating_stats))
+    return options
+
+
+def mosque_rows(query, names: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """Run an ORM ``Mosque`` query (filters, order, limit applied) as plain column rows.
+
+    No ORM objects are built and only the columns behind ``names`` are
+    selected (all when None). Rating summaries come from one primary-key
+    lookup for the whole page instead of the joined relationship.
+    """
+    table = Mosque.__table__
+    columns = _mosque_columns(names)
+    if "id" not in columns:
+        columns.insert(0, "id")  # cursors and the rating lookup need it
+    rows = [dict(r) for r in db.session.execute(
+        query.with_entities(*[table.c[c] for c in columns]).statement
+    ).mappings()]
+    if rows and (names is None or "rating" in names):
+        stats_table = MosqueRatingStats.__table__
+        stats = {
+            s["mosque_id"]: dict(s)
+            for s in db.session.execute(
+                select(stats_table).where(stats_table.c.mosque_id.in_([r["id"] for r in rows]))
+            ).mappings()
+        }
+        for r in rows:
+            r["rating_summary"] = summarize(stats.get(r["id"]))
+    return rows
+
+
+def project_mosques(items: Iterable[Any], names: Sequence[str]) -> List[Dict[str, Any]]:
+    """Rows holding only the attributes behind ``names``, from ORM objects or mappings."""
+    sources = mosque_serializer.sources(names)
+    rows = []
+    for item in items:
+        if isinstance(item, Mapping):
+            rows.append({src: item[src] for src in sources if src in item})
+        else:
+            rows.append({src: getattr(item, src) for src in sources if hasattr(item, src)})
+    return rows
+
+
+def table_rows(query) -> List[Mapping[str, Any]]:
+    """Run an ORM query as plain column rows of its entity's table."""
+    entity = query.column_descriptions[0]["entity"]
+    return db.session.execute(query.with_entities(*entity.__table__.columns).statement).mappings().all()
+
+
+mosque_serializer = CompiledSerializer(MosqueSchema())
+suggestion_serializer = CompiledSerializer(MosqueSuggestionSchema())
+review_serializer = CompiledSerializer(ReviewSchema())
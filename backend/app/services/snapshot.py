@@ -0,0 +1,93 @@
+"""Precomputed full-directory payload for ``/mosques/snapshot``.
+
+The approved mosque list is serialized once, compressed once per encoding and
+reused until the data version moves. The version is the newest
+``updated_at`` (epoch milliseconds) together with the row count. It is checked
+with a single aggregate query, so every gunicorn worker notices writes made
+by the others without any shared state.
+"""
+import gzip
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from ..extensions import db
+from ..models import Mosque
+from .ratings import summaries_by_mosque, summarize
+from .serialization import mosque_serializer
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Rows committed slightly out of order can carry an older updated_at than the
+# version a client already holds; re-sending this window makes that harmless.
+CHANGES_OVERLAP = timedelta(seconds=5)
+
+
+def to_version(ts: Optional[datetime]) -> int:
+    if ts is None:
+        return 0
+    return int(ts.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def from_version(version: int) -> datetime:
+    return datetime.fromtimestamp(version / 1000.0, tz=timezone.utc).replace(tzinfo=None)
+
+
+class Snapshot(NamedTuple):
+    key: Tuple[int, int]
+    version: int
+    etag: str
+    bodies: Dict[str, bytes]  # content-coding ("identity", "gzip", "br") -> bytes
+
+
+def approved_data_key() -> Tuple[int, int]:
+    """(newest approved ``updated_at`` as a version, approved count): moves on any visible change."""
+    newest, count = db.session.execute(
+        select(func.max(Mosque.updated_at), func.count(Mosque.id)).where(Mosque.approved.is_(True))
+    ).one()
+    return to_version(newest), int(count or 0)
+
+
+class SnapshotStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current: Optional[Snapshot] = None
+
+    def _build(self, key: Tuple[int, int]) -> Snapshot:
+        table = Mosque.__table__
+        rows = db.session.execute(
+            select(table).where(table.c.approved.is_(True)).order_by(table.c.id)
+        ).mappings().all()
+        ratings = summaries_by_mosque()
+        no_rating = summarize(None)
+        items = [{**r, "rating_summary": ratings.get(r["id"], no_rating)} for r in rows]
+        payload = {
+            "version": key[0],
+            "count": len(items),
+            "mosques": mosque_serializer.dump_many(items),
+        }
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        bodies = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            bodies["br"] = brotli.compress(body, quality=11)
+        return Snapshot(key, key[0], hashlib.sha256(body).hexdigest(), bodies)
+
+    def current(self) -> Snapshot:
+        key = approved_data_key()
+        snap = self._current
+        if snap is not None and snap.key == key:
+            return snap
+        with self._lock:
+            if self._current is None or self._current.key != key:
+                self._current = self._build(key)
+            return self._current
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,64 @@
+"""Per-phase timings of ``create_app``.
+
+The factory wraps each phase in ``profile.phase(name)``. The result is kept in
+``app.extensions["startup_profile"]``, logged once, and reported under
+``startup`` by ``/moderation/metrics``, so slow cold starts on App Service can
+be traced to a phase. ``first_request_ms`` is the time from the start of
+``create_app`` to the end of the first request this worker served.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class StartupProfile:
+    def __init__(self):
+        self.pid = os.getpid()
+        self._started = time.perf_counter()
+        self._phases: Dict[str, float] = {}
+        self._total: Optional[float] = None
+        self._first_request: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._phases[name] = self._phases.get(name, 0.0) + (time.perf_counter() - t0)
+
+    def finish(self, app) -> None:
+        self._total = time.perf_counter() - self._started
+        app.extensions["startup_profile"] = self
+        app.teardown_request(self._on_teardown)
+        logging.getLogger(__name__).info(
+            "App created in %.1f ms (%s)",
+            self._total * 1000,
+            ", ".join(f"{name} {ms} ms" for name, ms in self.as_dict()["phases_ms"].items()),
+        )
+
+    def _on_teardown(self, _exc=None) -> None:
+        if self._first_request is None:
+            with self._lock:
+                if self._first_request is None:
+                    self._first_request = time.perf_counter() - self._started
+
+    def as_dict(self) -> Dict[str, Any]:
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return round(seconds * 1000, 2) if seconds is not None else None
+
+        return {
+            "pid": self.pid,
+            "phases_ms": {name: ms(s) for name, s in self._phases.items()},
+            "total_ms": ms(self._total),
+            "first_request_ms": ms(self._first_request),
+        }
+
+
+def startup_stats(app) -> Optional[Dict[str, Any]]:
+    profile = app.extensions.get("startup_profile")
+    return profile.as_dict() if profile is not None else None
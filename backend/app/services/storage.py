@@ -0,0 +1,411 @@
+"""Storage backends for uploaded files.
+
+``upload_storage`` picks the backend once, in ``init_app``. It uses
+``AzureBlobStorage`` when ``AZURE_STORAGE_CONNECTION_STRING`` is set and
+``LocalStorage`` (``UPLOAD_FOLDER``) otherwise. Local storage is also the
+fallback when an Azure upload fails, and it is what tests use.
+
+* The Azure ``BlobServiceClient`` is built once per process and keeps its
+  HTTP connection pool. The container is checked and created once, at startup
+  when ``STORAGE_WARM_ON_START`` is on, else on the first upload.
+* Uploads are streamed in ``UPLOAD_CHUNK_BYTES`` pieces. Azure uploads that
+  need more than one chunk stage blocks, at most ``UPLOAD_AZURE_CONCURRENCY``
+  in flight, and commit the block list. Memory per upload is therefore
+  bounded by chunk size times concurrency, whatever the file size.
+* ``UPLOAD_MAX_BYTES`` is enforced while streaming (``UploadTooLarge``).
+* Every save is timed. The route reports it in ``Server-Timing``, and
+  ``stats()`` keeps per-backend counts and latency percentiles.
+
+Local files are served by ``LocalStorage.send``. Names never get new content
+(keys are content hashes or uuids), so responses are ``public, immutable``
+for ``UPLOAD_CACHE_MAX_AGE``. ``UPLOAD_SERVE_MODE`` decides who sends the
+bytes: Flask itself (``flask``, with ETag/Last-Modified and range support),
+or the front server through ``X-Sendfile`` or nginx ``X-Accel-Redirect``,
+so no worker thread is tied up streaming images.
+"""
+import logging
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Any, Dict, Iterator, NamedTuple, Optional
+from urllib.parse import quote, urlsplit
+
+from flask import current_app, request, url_for
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+from werkzeug.utils import send_from_directory
+
+SERVE_MODES = ("flask", "x-sendfile", "x-accel")
+
+# Not in every Python's mimetypes table yet
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("image/webp", ".webp")
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class StoredFile(NamedTuple):
+    name: str
+    size: int
+    backend: str
+
+
+def iter_chunks(stream: IO[bytes], chunk_size: int, max_bytes: Optional[int] = None) -> Iterator[bytes]:
+    total = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        total += len(chunk)
+        if max_bytes is not None and total > max_bytes:
+            raise UploadTooLarge(f"File exceeds {max_bytes} bytes")
+        yield chunk
+
+
+class StorageBackend(ABC):
+    """Where uploads live; a backend missing a method fails when it is built."""
+
+    name = "base"
+
+    @abstractmethod
+    def save(self, name: str, stream: IO[bytes], content_type: Optional[str], max_bytes: Optional[int] = None) -> StoredFile:
+        ...
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        ...
+
+    @abstractmethod
+    def url(self, name: str) -> str:
+        ...
+
+    @abstractmethod
+    def owns(self, url: str) -> bool:
+        """Whether ``url`` points at a file of this backend."""
+
+
+class LocalStorage(StorageBackend):
+    """Files under ``root``, served by ``/uploads/<name>``."""
+
+    name = "local"
+    url_path = "/uploads/"  # upload_bp's prefix
+
+    def __init__(
+        self, root: str, chunk_size: int = 1024 * 1024, serve_mode: str = "flask",
+        accel_prefix: str = "/protected-uploads/", max_age: int = 365 * 24 * 3600,
+    ):
+        # Absolute, so X-Sendfile paths don't depend on the front server's cwd
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+        self.serve_mode = serve_mode
+        self.accel_prefix = "/" + accel_prefix.strip("/") + "/"
+        self.max_age = max_age
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def save(self, name: str, stream: IO[bytes], content_type: Optional[str], max_bytes: Optional[int] = None) -> StoredFile:
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write next to the target and rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                for chunk in iter_chunks(stream, self.chunk_size, max_bytes):
+                    out.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        return StoredFile(name, size, self.name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.isfile(self.path(name))
+
+    def delete(self, name: str) -> None:
+        try:
+            os.unlink(self.path(name))
+        except FileNotFoundError:
+            pass
+
+    def url(self, name: str) -> str:
+        return url_for("upload.serve_file", filename=name, _external=True)
+
+    def owns(self, url: str) -> bool:
+        # Only the path: the host is whatever the client used (localhost, LAN IP, ...)
+        return urlsplit(url).path.startswith(self.url_path)
+
+    def send(self, name: str):
+        """Response for ``GET /uploads/<name>``."""
+        if self.serve_mode == "x-accel":
+            # nginx checks existence and handles conditional and range requests
+            if safe_join(self.root, name) is None:
+                raise NotFound()
+            response = current_app.response_class(
+                mimetype=mimetypes.guess_type(name)[0] or "application/octet-stream"
+            )
+            response.headers["X-Accel-Redirect"] = self.accel_prefix + quote(name)
+        else:
+            # ETag, Last-Modified, 304s and Range; with X-Sendfile the body is left to the server
+            response = send_from_directory(
+                self.root, name, request.environ,
+                max_age=self.max_age,
+                use_x_sendfile=self.serve_mode == "x-sendfile",
+                response_class=current_app.response_class,
+            )
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.cache_control.immutable = True
+        return response
+
+
+class AzureBlobStorage(StorageBackend):
+    name = "azure"
+
+    def __init__(
+        self, connection_string: str, container: str, chunk_size: int = 4 * 1024 * 1024,
+        concurrency: int = 2, retries: int = 3,
+    ):
+        self.connection_string = connection_string
+        self.container = container
+        self.chunk_size = chunk_size
+        self.concurrency = max(concurrency, 1)
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._container_client = None
+        self._container_ready = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def container_client(self):
+        if self._container_client is None:
+            with self._lock:
+                if self._container_client is None:
+                    # Imported on first use (see "Startup" in the developer guide)
+                    from azure.storage.blob import BlobServiceClient
+                    # Short backoff (the SDK default starts at 15 s) so a failing
+                    # upload reaches the local fallback in seconds, not minutes
+                    service = BlobServiceClient.from_connection_string(
+                        self.connection_string, retry_total=self.retries, initial_backoff=1, increment_base=2,
+                    )
+                    self._container_client = service.get_container_client(self.container)
+        return self._container_client
+
+    def ensure_container(self, **request_options) -> None:
+        if self._container_ready:
+            return
+        from azure.core.exceptions import ResourceExistsError
+
+        client = self.container_client
+        if not client.exists(**request_options):
+            try:
+                client.create_container(public_access="blob", **request_options)
+            except ResourceExistsError:
+                pass  # another worker created it first
+        self._container_ready = True
+
+    def _stage(self, blob, block_id: str, data: bytes) -> None:
+        blob.stage_block(block_id, data, length=len(data))
+
+    def save(self, name: str, stream: IO[bytes], content_type: Optional[str], max_bytes: Optional[int] = None) -> StoredFile:
+        from azure.storage.blob import BlobBlock, ContentSettings
+
+        self.ensure_container()
+        blob = self.container_client.get_blob_client(name)
+        settings = ContentSettings(content_type=content_type)
+        chunks = iter_chunks(stream, self.chunk_size, max_bytes)
+        first = next(chunks, b"")
+        second = next(chunks, None)
+        if second is None:
+            # Fits in one chunk: a single Put Blob instead of stage + commit
+            blob.upload_blob(first, blob_type="BlockBlob", overwrite=True, content_settings=settings)
+            return StoredFile(name, len(first), self.name)
+
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.concurrency, thread_name_prefix="blob-upload"
+                    )
+        block_ids = []
+        pending: deque = deque()
+        size = 0
+
+        def chain():
+            yield first
+            yield second
+            yield from chunks
+
+        for data in chain():
+            # Same-length ids, as the service requires; the SDK base64-encodes them
+            block_id = f"{len(block_ids):08d}"
+            block_ids.append(block_id)
+            size += len(data)
+            if len(pending) >= self.concurrency:
+                pending.popleft().result()  # bounds buffered chunks per upload
+            pending.append(self._executor.submit(self._stage, blob, block_id, data))
+        while pending:
+            pending.popleft().result()
+        blob.commit_block_list([BlobBlock(block_id=b) for b in block_ids], content_settings=settings)
+        return StoredFile(name, size, self.name)
+
+    def exists(self, name: str) -> bool:
+        return self.container_client.get_blob_client(name).exists()
+
+    def delete(self, name: str) -> None:
+        from azure.core.exceptions import ResourceNotFoundError
+
+        try:
+            self.container_client.delete_blob(name)
+        except ResourceNotFoundError:
+            pass
+
+    def url(self, name: str) -> str:
+        return self.container_client.get_blob_client(name).url
+
+    def owns(self, url: str) -> bool:
+        return url.startswith(self.container_client.url.rstrip("/") + "/")
+
+
+class UploadStats:
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._backends: Dict[str, Dict[str, Any]] = {}
+        self._window = window
+        self.fallbacks = 0
+        self.rejected = 0
+
+    def record(self, backend: str, seconds: float, size: int = 0, failed: bool = False) -> None:
+        with self._lock:
+            data = self._backends.setdefault(
+                backend, {"uploads": 0, "failures": 0, "bytes": 0, "times": deque(maxlen=self._window)}
+            )
+            if failed:
+                data["failures"] += 1
+                return
+            data["uploads"] += 1
+            data["bytes"] += size
+            data["times"].append(seconds)
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        with self._lock:
+            out["fallbacks"] = self.fallbacks
+            out["rejected"] = self.rejected
+            backends = {k: (dict(v), sorted(v["times"])) for k, v in self._backends.items()}
+        for backend, (data, times) in backends.items():
+            data.pop("times")
+            for name, q in (("ms_p50", 0.50), ("ms_p99", 0.99)):
+                data[name] = round(times[min(int(q * len(times)), len(times) - 1)] * 1000, 2) if times else None
+            out[backend] = data
+        return out
+
+
+class UploadStorage:
+    def __init__(self):
+        self.local: Optional[LocalStorage] = None
+        self.remote: Optional[StorageBackend] = None
+        self.max_bytes: Optional[int] = None
+        self.stats = UploadStats()
+
+    def init_app(self, app) -> None:
+        chunk_size = int(app.config.get("UPLOAD_CHUNK_BYTES", 4 * 1024 * 1024))
+        self.max_bytes = int(app.config.get("UPLOAD_MAX_BYTES", 0)) or None
+        serve_mode = str(app.config.get("UPLOAD_SERVE_MODE", "flask")).lower()
+        if serve_mode not in SERVE_MODES:
+            logging.getLogger(__name__).warning("Unknown UPLOAD_SERVE_MODE %r, using flask", serve_mode)
+            serve_mode = "flask"
+        self.local = LocalStorage(
+            app.config.get("UPLOAD_FOLDER") or os.path.join(os.getcwd(), "uploads"),
+            chunk_size,
+            serve_mode=serve_mode,
+            accel_prefix=app.config.get("UPLOAD_ACCEL_PREFIX", "/protected-uploads/"),
+            max_age=int(app.config.get("UPLOAD_CACHE_MAX_AGE", 365 * 24 * 3600)),
+        )
+        self.remote = None
+        connection_string = app.config.get("AZURE_STORAGE_CONNECTION_STRING")
+        if connection_string:
+            self.remote = AzureBlobStorage(
+                connection_string,
+                app.config.get("AZURE_CONTAINER_NAME", "mosque-images"),
+                chunk_size=chunk_size,
+                concurrency=int(app.config.get("UPLOAD_AZURE_CONCURRENCY", 2)),
+                retries=int(app.config.get("UPLOAD_AZURE_RETRIES", 3)),
+            )
+            if app.config.get("STORAGE_WARM_ON_START"):
+                try:
+                    # No retries with backoff here: an unreachable account must not stall the boot
+                    self.remote.ensure_container(retry_total=0, connection_timeout=5)
+                except Exception:
+                    # Retried on the first upload
+                    logging.getLogger(__name__).warning("Blob container check skipped", exc_info=True)
+        app.extensions["upload_storage"] = self
+
+    @property
+    def backend(self) -> StorageBackend:
+        return self.remote or self.local
+
+    def url(self, stored: StoredFile) -> str:
+        """Public URL of a saved file (for local files, needs a request context)."""
+        if self.remote is not None and stored.backend == self.remote.name:
+            return self.remote.url(stored.name)
+        return self.local.url(stored.name)
+
+    def save(self, name: str, stream: IO[bytes], content_type: Optional[str], fallback: bool = True) -> StoredFile:
+        """Store ``stream`` under ``name``.
+
+        If the remote backend fails, the file goes to local disk instead,
+        unless ``fallback`` is False.
+        """
+        if self.remote is not None:
+            t0 = time.perf_counter()
+            try:
+                stored = self.remote.save(name, stream, content_type, self.max_bytes)
+            except UploadTooLarge:
+                self.stats.count("rejected")
+                raise
+            except Exception:
+                self.stats.record(self.remote.name, time.perf_counter() - t0, failed=True)
+                if not fallback:
+                    raise
+                self.stats.count("fallbacks")
+                logging.getLogger(__name__).exception("%s upload failed, storing locally", self.remote.name)
+                stream.seek(0)
+            else:
+                self.stats.record(stored.backend, time.perf_counter() - t0, stored.size)
+                return stored
+
+        t0 = time.perf_counter()
+        try:
+            stored = self.local.save(name, stream, content_type, self.max_bytes)
+        except UploadTooLarge:
+            self.stats.count("rejected")
+            raise
+        except Exception:
+            self.stats.record(self.local.name, time.perf_counter() - t0, failed=True)
+            raise
+        self.stats.record(stored.backend, time.perf_counter() - t0, stored.size)
+        return stored
+
+
+upload_storage = UploadStorage()
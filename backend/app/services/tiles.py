@@ -0,0 +1,120 @@
+"""Packed binary slippy-map tiles of approved mosque pins.
+
+``/mosques/tiles/<z>/<x>/<y>`` returns one tile in this little-endian layout:
+
+* header, ``<2sBBII``: magic ``b"MT"``, format version (1), zoom, number of
+  points, number of clusters
+* points, ``<IiiB`` each (13 bytes): id, latitude * 1e7, longitude * 1e7,
+  type code (``TYPE_CODES``; 0 = other/unknown)
+* clusters, ``<iiI`` each (12 bytes): centroid latitude * 1e7, centroid
+  longitude * 1e7, member count
+
+Up to ``CLUSTER_MAX_ZOOM`` a tile is the cells of ``services/clusters.py``
+that fall inside it (a 2**CLUSTER_CELL_BITS grid per axis). One-mosque cells
+are points and fuller cells become clusters. Above that zoom, every mosque in
+the tile is read from the ``mosques`` table as a point.
+
+Tiles are stored in the response cache
+under ``tile:<z>/<x>/<y>``. When a mosque commit moves, adds or removes a pin,
+``mosque_events`` reports the old and new coordinates, and the tiles that
+contain them at every zoom are dropped.
+"""
+from typing import Iterable, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from ..extensions import db
+from ..models import Mosque
+from ..utils.geo import tile_bounds, tile_coords, tiles_containing
+from .cache import response_cache
+from .clusters import TYPE_CODES, cluster_index
+from .mosque_events import on_mosque_points_changed
+
+TILE_MIMETYPE = "application/vnd.mosquestn.tile"
+TILE_FORMAT_VERSION = 1
+
+HEADER_DTYPE = np.dtype([("magic", "S2"), ("version", "u1"), ("zoom", "u1"), ("points", "<u4"), ("clusters", "<u4")])
+POINT_DTYPE = np.dtype([("id", "<u4"), ("lat", "<i4"), ("lng", "<i4"), ("type", "u1")])
+CLUSTER_DTYPE = np.dtype([("lat", "<i4"), ("lng", "<i4"), ("count", "<u4")])
+
+
+def tile_tag(z: int, x: int, y: int) -> str:
+    return f"tile:{z}/{x}/{y}"
+
+
+def _e7(values: np.ndarray) -> np.ndarray:
+    return np.rint(values * 1e7).astype("<i4")
+
+
+def encode_tile(z: int, points: np.ndarray, clusters: np.ndarray) -> bytes:
+    header = np.array([(b"MT", TILE_FORMAT_VERSION, z, len(points), len(clusters))], dtype=HEADER_DTYPE)
+    return header.tobytes() + points.tobytes() + clusters.tobytes()
+
+
+class MosqueTiles:
+    def __init__(self):
+        self.max_zoom = 20
+
+    def init_app(self, app) -> None:
+        self.max_zoom = int(app.config.get("TILE_MAX_ZOOM", 20))
+        response_cache.set_namespace_ttl("tiles", float(app.config.get("TILE_CACHE_TTL_SECONDS", 600)))
+        app.extensions["mosque_tiles"] = self
+        on_mosque_points_changed(self._on_points_changed)
+
+    def valid(self, z: int, x: int, y: int) -> bool:
+        return 0 <= z <= self.max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+    def _load(self, z: int, x: int, y: int):
+        min_lat, max_lat, min_lng, max_lng = tile_bounds(z, x, y)
+        table = Mosque.__table__
+        rows = db.session.execute(
+            select(table.c.id, table.c.latitude, table.c.longitude, table.c.type)
+            .where(table.c.approved.is_(True))
+            .where(table.c.latitude.between(min_lat, max_lat))
+            .where(table.c.longitude.between(min_lng, max_lng))
+            .order_by(table.c.id)
+        ).all()
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        lats = np.array([r[1] for r in rows], dtype=np.float64)
+        lngs = np.array([r[2] for r in rows], dtype=np.float64)
+        types = np.array([TYPE_CODES.get(r[3], 0) for r in rows], dtype=np.uint8)
+        # The SQL box is inclusive on every edge; keep pins whose tile is exactly this one
+        fx, fy = tile_coords(lats, lngs, z)
+        inside = (np.floor(fx) == x) & (np.floor(fy) == y)
+        return ids[inside], lats[inside], lngs[inside], types[inside]
+
+    def render(self, z: int, x: int, y: int) -> bytes:
+        if z > cluster_index.max_zoom:
+            return encode_tile(z, self._points(*self._load(z, x, y)), np.empty(0, dtype=CLUSTER_DTYPE))
+
+        cells = cluster_index.tile_cells(z, x, y)
+        single = cells.count == 1
+        # A one-mosque cell's sums are that mosque's coordinates
+        points = self._points(cells.ids[single], cells.lat_sum[single], cells.lng_sum[single], cells.types[single])
+
+        grouped = ~single
+        counts = cells.count[grouped]
+        clusters = np.empty(len(counts), dtype=CLUSTER_DTYPE)
+        clusters["lat"] = _e7(cells.lat_sum[grouped] / counts)
+        clusters["lng"] = _e7(cells.lng_sum[grouped] / counts)
+        clusters["count"] = counts
+        return encode_tile(z, points, clusters)
+
+    @staticmethod
+    def _points(ids, lats, lngs, types) -> np.ndarray:
+        points = np.empty(len(ids), dtype=POINT_DTYPE)
+        points["id"] = ids
+        points["lat"] = _e7(lats)
+        points["lng"] = _e7(lngs)
+        points["type"] = types
+        return points
+
+    def _on_points_changed(self, points: Iterable[Tuple[float, float]]) -> None:
+        tags = set()
+        for lat, lng in points:
+            tags.update(tile_tag(*t) for t in tiles_containing(lat, lng, self.max_zoom))
+        response_cache.invalidate(*tags)
+
+
+mosque_tiles = MosqueTiles()
@@ -0,0 +1,76 @@
+import math
+from math import asin, cos, radians, sin, sqrt
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.0
+MAX_MERCATOR_LAT = 85.05112878  # slippy-map tiles cover this latitude band
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def haversine_km_many(lat: float, lng: float, lats, lngs) -> np.ndarray:
+    """Distances in km from one point to every (lats[i], lngs[i]) in a single pass."""
+    lat_r = np.radians(lat)
+    lats_r = np.radians(np.asarray(lats, dtype=np.float64))
+    dlat = lats_r - lat_r
+    dlng = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat_r) * np.cos(lats_r) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def nearest_order(distances: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """Positions of the ``k`` smallest distances (all if None), closest first.
+
+    Uses a partial sort so the k-nearest case costs O(n + k log k) instead of
+    sorting every candidate.
+    """
+    n = distances.shape[0]
+    if k is None or k >= n:
+        return np.argsort(distances, kind="stable")
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    head = np.argpartition(distances, k - 1)[:k]
+    return head[np.argsort(distances[head], kind="stable")]
+
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> tuple[float, float, float, float]:
+    """Return (min_lat, max_lat, min_lng, max_lng) enclosing the search circle."""
+    dlat = radius_km / KM_PER_DEG_LAT
+    dlng = radius_km / (KM_PER_DEG_LAT * max(cos(radians(lat)), 0.0001))
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def tile_bounds(z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) of a slippy-map tile."""
+    n = 2 ** z
+
+    def lat(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), lat(y), x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+
+
+def tile_coords(lats, lngs, z: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Fractional tile x/y of each point at zoom ``z`` (floor gives the tile)."""
+    n = 2 ** z
+    lat_r = np.radians(np.clip(np.asarray(lats, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    fx = (np.asarray(lngs, dtype=np.float64) + 180.0) / 360.0 * n
+    fy = (1.0 - np.arcsinh(np.tan(lat_r)) / math.pi) / 2.0 * n
+    # The antimeridian / pole edges belong to the last tile
+    return np.clip(fx, 0, np.nextafter(n, 0)), np.clip(fy, 0, np.nextafter(n, 0))
+
+
+def tiles_containing(lat: float, lng: float, max_zoom: int) -> List[Tuple[int, int, int]]:
+    tiles = []
+    for z in range(max_zoom + 1):
+        fx, fy = tile_coords([lat], [lng], z)
+        tiles.append((z, int(fx[0]), int(fy[0])))
+    return tiles
@@ -0,0 +1,30 @@
+import re
+import unicodedata
+
+# Letters that NFKD leaves alone but users type interchangeably
+_ARABIC_FOLD = str.maketrans({
+    "ة": "ه",  # taa marbuta -> haa
+    "ى": "ي",  # alef maksura -> yaa
+    "ٱ": "ا",  # alef wasla -> alef
+    "ـ": None,      # tatweel
+})
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def normalize_search_text(value: str | None) -> str:
+    """Fold Arabic/French text for matching.
+
+    NFKD splits hamza/madda off alef variants and accents off Latin letters,
+    and every combining mark (including Arabic harakat) is then dropped.
+    """
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(value))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    folded = stripped.translate(_ARABIC_FOLD).casefold()
+    return " ".join(_NON_WORD_RE.sub(" ", folded).split())
+
+
+def escape_like(value: str, escape: str = "\\") -> str:
+    """Escape LIKE wildcards so ``value`` matches literally (pair with ``escape=``)."""
+    return value.replace(escape, escape * 2).replace("%", escape + "%").replace("_", escape + "_")
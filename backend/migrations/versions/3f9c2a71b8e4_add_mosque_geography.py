@@ -0,0 +1,58 @@
+"""add PostGIS geography column to mosques
+
+Revision ID: 3f9c2a71b8e4
+Revises: 7a3ff6776c3c
+Create Date: 2026-10-17 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a71b8e4'
+down_revision = '7a3ff6776c3c'
+branch_labels = None
+depends_on = None
+
+
+def _postgis_ready(conn) -> bool:
+    installed = conn.execute(sa.text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).scalar()
+    if installed:
+        return True
+    available = conn.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")).scalar()
+    if not available:
+        return False
+    # Managed Postgres may refuse CREATE EXTENSION; keep the outer transaction usable
+    try:
+        with conn.begin_nested():
+            conn.execute(sa.text("CREATE EXTENSION IF NOT EXISTS postgis"))
+        return True
+    except Exception:
+        return False
+
+
+def upgrade():
+    # Optional: SQLite and vanilla Postgres keep the lat/lng bounding-box path
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql' or not _postgis_ready(conn):
+        return
+
+    # Generated from latitude/longitude, so existing rows are backfilled by the
+    # ALTER itself and the ORM never has to write it.
+    op.execute(
+        "ALTER TABLE mosques ADD COLUMN IF NOT EXISTS geog geography(Point, 4326) "
+        "GENERATED ALWAYS AS ("
+        "CASE WHEN latitude IS NULL OR longitude IS NULL THEN NULL "
+        "ELSE ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography END"
+        ") STORED"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_mosques_geog ON mosques USING GIST (geog)")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_mosques_geog")
+    op.execute("ALTER TABLE mosques DROP COLUMN IF EXISTS geog")
@@ -0,0 +1,30 @@
+"""add composite index for keyset review pagination
+
+Revision ID: 8c1d4e6f2a90
+Revises: 3f9c2a71b8e4
+Create Date: 2026-10-17 10:03:11.402517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1d4e6f2a90'
+down_revision = '3f9c2a71b8e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_reviews_mosque_status_created_id',
+            ['mosque_id', 'status', 'created_at', 'id'],
+            unique=False,
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_index('ix_reviews_mosque_status_created_id')
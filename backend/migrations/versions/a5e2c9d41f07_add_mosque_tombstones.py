@@ -0,0 +1,33 @@
+"""add mosque_tombstones for delta sync of hard deletes
+
+Revision ID: a5e2c9d41f07
+Revises: f3a7c1d9b240
+Create Date: 2026-10-17 21:05:32.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a5e2c9d41f07'
+down_revision = 'f3a7c1d9b240'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('mosque_tombstones',
+        sa.Column('mosque_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('mosque_id')
+    )
+    with op.batch_alter_table('mosque_tombstones', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_mosque_tombstones_deleted_at'), ['deleted_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mosque_tombstones', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_mosque_tombstones_deleted_at'))
+
+    op.drop_table('mosque_tombstones')
@@ -0,0 +1,95 @@
+"""add normalized search_text to mosques with trigram indexes
+
+Revision ID: b47e9d03c5a1
+Revises: 8c1d4e6f2a90
+Create Date: 2026-10-17 11:20:54.730981
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b47e9d03c5a1'
+down_revision = '8c1d4e6f2a90'
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.utils.text.normalize_search_text as of this revision, so the
+# backfill stays reproducible if the app's normalization changes later.
+_ARABIC_FOLD = str.maketrans({
+    "ة": "ه",  # taa marbuta -> haa
+    "ى": "ي",  # alef maksura -> yaa
+    "ٱ": "ا",  # alef wasla -> alef
+    "ـ": None,      # tatweel
+})
+_NON_WORD_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+
+def _normalize_search_text(value):
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", str(value))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    folded = stripped.translate(_ARABIC_FOLD).casefold()
+    return " ".join(_NON_WORD_RE.sub(" ", folded).split())
+
+
+def _pg_trgm_ready(conn) -> bool:
+    installed = conn.execute(sa.text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+    if installed:
+        return True
+    try:
+        with conn.begin_nested():
+            conn.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        return True
+    except Exception:
+        return False
+
+
+def upgrade():
+    with op.batch_alter_table('mosques', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_text', sa.String(length=600), nullable=True))
+
+    # Backfill with the normalization the model applied on write at this revision
+    conn = op.get_bind()
+    mosques = sa.table(
+        'mosques',
+        sa.column('id', sa.Integer),
+        sa.column('arabic_name', sa.String),
+        sa.column('city', sa.String),
+        sa.column('delegation', sa.String),
+        sa.column('governorate', sa.String),
+        sa.column('search_text', sa.String),
+    )
+    rows = conn.execute(sa.select(
+        mosques.c.id, mosques.c.arabic_name, mosques.c.city, mosques.c.delegation, mosques.c.governorate
+    )).fetchall()
+    updates = [
+        {"_id": r.id, "search_text": _normalize_search_text(" ".join(p for p in r[1:] if p))[:600]}
+        for r in rows
+    ]
+    if updates:
+        conn.execute(
+            mosques.update().where(mosques.c.id == sa.bindparam('_id')).values(search_text=sa.bindparam('search_text')),
+            updates,
+        )
+
+    # GIN trigram indexes make '%term%' matches and similarity() index-assisted
+    if conn.dialect.name == 'postgresql' and _pg_trgm_ready(conn):
+        op.execute("CREATE INDEX IF NOT EXISTS ix_mosques_search_text_trgm ON mosques USING gin (search_text gin_trgm_ops)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_mosques_governorate_trgm ON mosques USING gin (governorate gin_trgm_ops)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_mosques_city_trgm ON mosques USING gin (city gin_trgm_ops)")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_mosques_city_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_mosques_governorate_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_mosques_search_text_trgm")
+    with op.batch_alter_table('mosques', schema=None) as batch_op:
+        batch_op.drop_column('search_text')
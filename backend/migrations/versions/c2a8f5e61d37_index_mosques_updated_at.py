@@ -0,0 +1,26 @@
+"""index mosques.updated_at for snapshot versioning and delta sync
+
+Revision ID: c2a8f5e61d37
+Revises: b47e9d03c5a1
+Create Date: 2026-10-17 12:41:08.553190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2a8f5e61d37'
+down_revision = 'b47e9d03c5a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('mosques', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_mosques_updated_at'), ['updated_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('mosques', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_mosques_updated_at'))
@@ -0,0 +1,26 @@
+"""add width to stored_blobs
+
+Revision ID: c8b3e5f2a914
+Revises: a5e2c9d41f07
+Create Date: 2026-10-17 21:48:03.652817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8b3e5f2a914'
+down_revision = 'a5e2c9d41f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('stored_blobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('width', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('stored_blobs', schema=None) as batch_op:
+        batch_op.drop_column('width')
@@ -0,0 +1,85 @@
+"""add image_blob_key to mosques, suggestions and edits
+
+Revision ID: d4f1a7b9e263
+Revises: c8b3e5f2a914
+Create Date: 2026-10-17 23:05:41.218904
+
+"""
+import re
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f1a7b9e263'
+down_revision = 'c8b3e5f2a914'
+branch_labels = None
+depends_on = None
+
+TABLES = ('mosques', 'mosque_suggestions', 'mosque_edit_suggestions')
+
+# Frozen copy of services/images.py's original URL pattern at this revision
+_ORIGINAL_RE = re.compile(
+    r"^(?P<prefix>.*/)(?P<key>[0-9a-f]{64}|[0-9a-f]{32})/original(?:-(?P<width>[1-9][0-9]*)w)?\.(?P<kind>jpg|png|gif|webp)$"
+)
+
+
+def _key(image_url):
+    match = _ORIGINAL_RE.match(image_url or "")
+    return match["key"] if match else None
+
+
+def _open(table):
+    # Approved suggestions and edits handed their photo to the mosque
+    return sa.not_(sa.func.coalesce(table.c.status, '').in_(('approved', 'rejected')))
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('image_blob_key', sa.String(length=64), nullable=True))
+
+    # References used to be taken per upload and were never recorded on rows.
+    # Give each live row the reference it would hold now and recount.
+    conn = op.get_bind()
+    known = set(conn.execute(sa.text("SELECT key FROM stored_blobs")).scalars())
+    counts = dict.fromkeys(known, 0)
+    mosques = sa.table('mosques', sa.column('id'), sa.column('image_url'), sa.column('image_blob_key'))
+    suggestions = sa.table(
+        'mosque_suggestions', sa.column('id'), sa.column('image_url'), sa.column('status'), sa.column('image_blob_key'),
+    )
+    edits = sa.table(
+        'mosque_edit_suggestions', sa.column('id'), sa.column('patch_json', sa.JSON), sa.column('status'),
+        sa.column('image_blob_key'),
+    )
+    rows = [
+        (mosques, conn.execute(sa.select(mosques.c.id, mosques.c.image_url)).all()),
+        (suggestions, conn.execute(
+            sa.select(suggestions.c.id, suggestions.c.image_url).where(_open(suggestions))
+        ).all()),
+        (edits, [
+            (row.id, (row.patch_json or {}).get('image_url'))
+            for row in conn.execute(
+                sa.select(edits.c.id, edits.c.patch_json).where(_open(edits))
+            )
+        ]),
+    ]
+    for table, pairs in rows:
+        for row_id, image_url in pairs:
+            key = _key(image_url)
+            if key in known:
+                conn.execute(table.update().where(table.c.id == row_id).values(image_blob_key=key))
+                counts[key] += 1
+    blobs = sa.table('stored_blobs', sa.column('key'), sa.column('ref_count'), sa.column('updated_at'))
+    now = datetime.utcnow()
+    for key, count in counts.items():
+        # Keys left at zero are deleted by the orphan sweep after the grace period
+        conn.execute(blobs.update().where(blobs.c.key == key).values(ref_count=count, updated_at=now))
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('image_blob_key')
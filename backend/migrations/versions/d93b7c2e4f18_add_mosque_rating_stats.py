@@ -0,0 +1,67 @@
+"""add mosque_rating_stats aggregate table
+
+Revision ID: d93b7c2e4f18
+Revises: c2a8f5e61d37
+Create Date: 2026-10-17 13:58:32.907412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b7c2e4f18'
+down_revision = 'c2a8f5e61d37'
+branch_labels = None
+depends_on = None
+
+# Keep in sync with app.utils.reviews.CRITERIA_KEYS at the time of writing
+CRITERIA_KEYS = {
+    "cleanliness", "accessibility", "women_section", "wudu_area",
+    "parking", "audio_quality", "air_conditioning",
+}
+
+
+def upgrade():
+    stats = op.create_table('mosque_rating_stats',
+        sa.Column('mosque_id', sa.Integer(), nullable=False),
+        sa.Column('review_count', sa.Integer(), nullable=False),
+        sa.Column('rating_sum', sa.Integer(), nullable=False),
+        sa.Column('rating_histogram', sa.JSON(), nullable=True),
+        sa.Column('criteria_sums', sa.JSON(), nullable=True),
+        sa.Column('criteria_counts', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['mosque_id'], ['mosques.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('mosque_id')
+    )
+
+    # One-time backfill from the approved reviews already in place
+    conn = op.get_bind()
+    reviews = sa.table(
+        'reviews',
+        sa.column('mosque_id', sa.Integer),
+        sa.column('rating', sa.Integer),
+        sa.column('criteria', sa.JSON),
+        sa.column('status', sa.String),
+    )
+    totals = {}
+    for mosque_id, rating, criteria in conn.execute(
+        sa.select(reviews.c.mosque_id, reviews.c.rating, reviews.c.criteria).where(reviews.c.status == 'approved')
+    ):
+        t = totals.setdefault(mosque_id, {
+            "review_count": 0, "rating_sum": 0,
+            "rating_histogram": {}, "criteria_sums": {}, "criteria_counts": {},
+        })
+        t["review_count"] += 1
+        t["rating_sum"] += int(rating)
+        t["rating_histogram"][str(int(rating))] = t["rating_histogram"].get(str(int(rating)), 0) + 1
+        for key, value in (criteria or {}).items():
+            if key in CRITERIA_KEYS:
+                t["criteria_sums"][key] = t["criteria_sums"].get(key, 0) + int(value)
+                t["criteria_counts"][key] = t["criteria_counts"].get(key, 0) + 1
+    if totals:
+        op.bulk_insert(stats, [dict(mosque_id=mid, **t) for mid, t in totals.items()])
+
+
+def downgrade():
+    op.drop_table('mosque_rating_stats')
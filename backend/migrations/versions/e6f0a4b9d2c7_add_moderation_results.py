@@ -0,0 +1,30 @@
+"""add moderation_results cache table
+
+Revision ID: e6f0a4b9d2c7
+Revises: d93b7c2e4f18
+Create Date: 2026-10-17 15:07:45.281936
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f0a4b9d2c7'
+down_revision = 'd93b7c2e4f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('moderation_results',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('model_version', sa.String(length=120), nullable=False),
+        sa.Column('result', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('moderation_results')
@@ -0,0 +1,33 @@
+"""add stored_blobs table for content-addressed uploads
+
+Revision ID: f3a7c1d9b240
+Revises: e6f0a4b9d2c7
+Create Date: 2026-10-17 18:42:10.537204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a7c1d9b240'
+down_revision = 'e6f0a4b9d2c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_blobs',
+        sa.Column('key', sa.String(length=64), nullable=False),
+        sa.Column('kind', sa.String(length=8), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('ref_count', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('stored_blobs')
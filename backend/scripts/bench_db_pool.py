@@ -0,0 +1,148 @@
+"""Request latency percentiles under concurrency for different pool settings.
+
+Each configuration runs in a child process, because the ``DB_*`` settings are
+read at import time. Concurrent client threads hammer an uncached DB-backed
+endpoint. The script then prints request p50/p99 together with the pool's
+own checkout-wait metrics (``services/db_pool.py``).
+
+By default this seeds a throwaway SQLite file. Point --database-url at a
+scratch Postgres (ideally the managed instance's tier, through PgBouncer if
+you use one) to measure the production engine. Never run it against a
+database you care about: it drops and recreates tables.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import statistics
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def seed(rows: int) -> None:
+    from app import create_app
+    from app.extensions import db
+    from app.models import Mosque
+
+    app = create_app("production")
+    rnd = random.Random(42)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            Mosque(
+                arabic_name=f"جامع {i}",
+                type="مسجد",
+                governorate="Tunis",
+                city=f"city-{i % 50}",
+                latitude=36.8 + rnd.uniform(-0.5, 0.5),
+                longitude=10.18 + rnd.uniform(-0.5, 0.5),
+                approved=True,
+            )
+            for i in range(rows)
+        ])
+        db.session.commit()
+
+
+def run_load(args) -> dict:
+    from app import create_app
+    from app.services.db_pool import db_pool
+
+    app = create_app("production")
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def client_loop(seed_value: int):
+        rnd = random.Random(seed_value)
+        client = app.test_client()
+        local = []
+        for _ in range(args.requests):
+            offset = rnd.randrange(0, max(args.rows - 50, 1))
+            t0 = time.perf_counter()
+            resp = client.get(f"/mosques?limit=50&offset={offset}")
+            local.append((time.perf_counter() - t0) * 1000.0)
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        pool = db_pool.stats().get("default", {})
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 0.99),
+        "wait_p99": pool.get("wait_ms_p99"),
+        "timeouts": pool.get("timeouts"),
+        "connects": pool.get("connects"),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per client thread")
+    parser.add_argument("--pool-sizes", type=str, default="1,4,16", help="DB_POOL_SIZE values to compare")
+    parser.add_argument("--max-overflow", type=int, default=0)
+    parser.add_argument("--database-url", type=str, default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ.setdefault("GEO_INDEX_WARM_ON_START", "false")
+    os.environ["RESPONSE_CACHE_BACKEND"] = "none"  # every request must reach the database
+    if args.child:
+        print(json.dumps(run_load(args)))
+        return
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    logging.info("Seeding %s mosques", args.rows)
+    seed(args.rows)
+
+    print(f"{'pool':>5} {'overflow':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'wait p99 ms':>12} {'timeouts':>9}")
+    for size in [int(s) for s in args.pool_sizes.split(",")]:
+        env = dict(os.environ, DB_POOL_SIZE=str(size), DB_MAX_OVERFLOW=str(args.max_overflow))
+        cmd = [
+            sys.executable, __file__, "--child",
+            "--rows", str(args.rows),
+            "--concurrency", str(args.concurrency),
+            "--requests", str(args.requests),
+        ]
+        out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(
+            f"{size:>5} {args.max_overflow:>9} {r['rps']:>8.0f} {r['p50']:>8.2f} {r['p99']:>8.2f} "
+            f"{r['wait_p99'] if r['wait_p99'] is not None else '-':>12} {r['timeouts']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
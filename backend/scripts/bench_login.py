@@ -0,0 +1,150 @@
+"""Login throughput of one worker process per password hashing setting.
+
+Each configuration runs in a child process, because the ``PASSWORD_*``
+settings are read at import time. The child creates a user whose hash uses
+the configured method, then ``--threads`` client threads (the request
+threads of one gunicorn worker) post valid logins for ``--seconds``. It
+reports logins/s, latency p50/p99, 503s from the bounded hashing pool
+(``services/passwords.py``), and how long a concurrent cheap request
+(``/meta/facilities``) took meanwhile. That last number shows whether a login
+flood starves the rest of the worker.
+
+The run also checks rehash on login: the user starts with a
+``pbkdf2:sha256:1000000`` hash (werkzeug's pbkdf2 default). It must end up
+with the configured method's hash after the first login.
+
+Uses a throwaway SQLite file.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+CONFIGS = {
+    "scrypt-default": {"PASSWORD_HASH_METHOD": "scrypt:32768:8:1"},
+    "scrypt-16k": {"PASSWORD_HASH_METHOD": "scrypt:16384:8:1"},
+    "pbkdf2-600k": {"PASSWORD_HASH_METHOD": "pbkdf2:sha256:600000"},
+    "scrypt-unbounded": {"PASSWORD_HASH_METHOD": "scrypt:32768:8:1", "PASSWORD_HASH_WORKERS": "64", "PASSWORD_HASH_QUEUE_SIZE": "64"},
+}
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else float("nan")
+
+
+def child(threads: int, seconds: float) -> None:
+    from werkzeug.security import generate_password_hash
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User
+    from app.services.passwords import password_hasher
+
+    app = create_app("production")
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            username="bench", role="moderator",
+            password_hash=generate_password_hash("bench-password", method="pbkdf2"),
+        ))
+        db.session.commit()
+
+    client = app.test_client()
+    body = {"username": "bench", "password": "bench-password"}
+    assert client.post("/auth/login", json=body).status_code == 200
+    deadline = time.time() + 5
+    while password_hasher.stats()["rehashed"] < 1 and time.time() < deadline:
+        time.sleep(0.01)
+    with app.app_context():
+        stored = db.session.query(User.password_hash).filter_by(username="bench").scalar()
+    rehashed = not password_hasher.needs_rehash(stored)
+
+    latencies, busy, side = [], [0], []
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def login_worker():
+        c = app.test_client()
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            status = c.post("/auth/login", json=body).status_code
+            dt = time.perf_counter() - t0
+            with lock:
+                if status == 200:
+                    latencies.append(dt)
+                elif status == 503:
+                    busy[0] += 1
+                else:
+                    raise SystemExit(f"login returned {status}")
+
+    def side_worker():
+        c = app.test_client()
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            c.get("/meta/facilities")
+            side.append(time.perf_counter() - t0)
+            time.sleep(0.05)
+
+    workers = [threading.Thread(target=login_worker) for _ in range(threads)]
+    workers.append(threading.Thread(target=side_worker))
+    t0 = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({
+        "rehashed": rehashed,
+        "logins_per_s": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "busy": busy[0],
+        "side_p99_ms": percentile(side, 0.99) * 1000,
+    }), flush=True)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent login requests")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--configs", type=str, default=",".join(CONFIGS))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.threads, args.seconds)
+        return
+
+    print(f"{'config':>18} {'logins/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'503s':>6} {'other p99 ms':>13}  rehash")
+    for name in args.configs.split(","):
+        env = dict(
+            os.environ,
+            DATABASE_URL="sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"),
+            RESPONSE_CACHE_BACKEND="memory",
+            **CONFIGS[name],
+        )
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", "--threads", str(args.threads), "--seconds", str(args.seconds)],
+            env=env, capture_output=True, text=True,
+        )
+        if out.returncode:
+            raise SystemExit(f"{name}: child failed\n{out.stderr[-2000:]}")
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{name:>18} {r['logins_per_s']:>9.1f} {r['p50_ms']:>8.0f} {r['p99_ms']:>8.0f} {r['busy']:>6}"
+            f" {r['side_p99_ms']:>13.1f}  {'ok' if r['rehashed'] else 'MISSING'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare deep-page latency of offset vs keyset (cursor) pagination on /mosques.
+
+By default this seeds a throwaway SQLite file so it can run anywhere; point
+--database-url at a scratch Postgres to measure the production engine.
+Never run it against a database you care about: it drops and recreates tables.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import statistics
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def seed(db, Mosque, rows: int) -> None:
+    rnd = random.Random(42)
+    db.drop_all()
+    db.create_all()
+    batch = []
+    for i in range(rows):
+        batch.append(Mosque(
+            arabic_name=f"جامع {i}",
+            type="مسجد",
+            governorate="Tunis",
+            city=f"city-{i % 50}",
+            latitude=36.8 + rnd.uniform(-0.5, 0.5),
+            longitude=10.18 + rnd.uniform(-0.5, 0.5),
+            approved=True,
+        ))
+        if len(batch) == 5000:
+            db.session.add_all(batch)
+            db.session.commit()
+            batch = []
+    db.session.add_all(batch)
+    db.session.commit()
+
+
+def timed_get(client, url: str):
+    t0 = time.perf_counter()
+    resp = client.get(url)
+    return (time.perf_counter() - t0) * 1000.0, resp
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--depths", type=str, default="0,100,250,499", help="Page numbers to sample")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.setdefault("GEO_INDEX_WARM_ON_START", "false")
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import Mosque
+
+    app = create_app("production")
+    with app.app_context():
+        logging.info("Seeding %s mosques into %s", args.rows, db.engine.url.render_as_string(hide_password=True))
+        seed(db, Mosque, args.rows)
+
+    client = app.test_client()
+    size = args.page_size
+    depths = [int(d) for d in args.depths.split(",")]
+
+    # Walk the cursor chain once and remember the token that starts each page
+    cursors = {0: None}
+    cursor = None
+    for page in range(1, max(depths) + 1):
+        url = f"/mosques?limit={size}" + (f"&cursor={cursor}" if cursor else "")
+        cursor = client.get(url).headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        cursors[page] = cursor
+
+    print(f"{'page':>6} {'offset ms (median)':>20} {'cursor ms (median)':>20}")
+    for page in depths:
+        if page not in cursors:
+            continue
+        offset_ms = []
+        cursor_ms = []
+        for _ in range(args.repeat):
+            ms, _ = timed_get(client, f"/mosques?limit={size}&offset={page * size}")
+            offset_ms.append(ms)
+            tok = cursors[page]
+            ms, _ = timed_get(client, f"/mosques?limit={size}" + (f"&cursor={tok}" if tok else ""))
+            cursor_ms.append(ms)
+        print(f"{page:>6} {statistics.median(offset_ms):>20.2f} {statistics.median(cursor_ms):>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Rows/sec of marshmallow vs the compiled serializer for 500-row pages.
+
+"schema" is the old path: load ORM objects, ``Schema(many=True).dump`` them
+and ``jsonify`` the result. "compiled" is the path the list endpoints use
+now: fetch column rows, dump with ``services/serialization.py`` and encode
+with the same JSON provider. Both bodies are compared byte for byte before
+timing.
+
+By default this seeds a throwaway SQLite file; point --database-url at a
+scratch Postgres to measure the production engine. Never run it against a
+database you care about: it drops and recreates tables.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import statistics
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def seed(db, models, rows: int) -> None:
+    Mosque, MosqueSuggestion, Review, MosqueRatingStats = models
+    rnd = random.Random(42)
+    db.drop_all()
+    db.create_all()
+    for i in range(rows):
+        db.session.add(Mosque(
+            arabic_name=f"جامع {i}",
+            type="مسجد",
+            governorate="Tunis",
+            city=f"city-{i % 50}",
+            address=f"نهج {i}",
+            latitude=36.8 + rnd.uniform(-0.5, 0.5),
+            longitude=10.18 + rnd.uniform(-0.5, 0.5),
+            facilities_json={"wudu": True, "parking": bool(i % 2), "women_area": True},
+            iqama_times_json={"fajr": "05:00", "dhuhr": "12:30", "asr": "15:45"},
+            jumuah_time="12:30",
+            approved=True,
+        ))
+        db.session.add(MosqueSuggestion(
+            arabic_name=f"مقترح {i}",
+            governorate="Sfax",
+            latitude=34.7,
+            longitude=10.7,
+            facilities_json={"wudu": True},
+            iqama_times_json={},
+            status="pending_approval",
+        ))
+        db.session.add(Review(
+            mosque_id=1,
+            rating=rnd.randint(1, 5),
+            criteria={"cleanliness": rnd.randint(0, 5), "calm": rnd.randint(0, 5)},
+            comment=f"تعليق {i}",
+            status="approved",
+        ))
+    db.session.add(MosqueRatingStats(
+        mosque_id=1, review_count=rows, rating_sum=3 * rows,
+        rating_histogram={"3": rows}, criteria_sums={}, criteria_counts={},
+    ))
+    db.session.commit()
+
+
+def rate(fn, rows: int, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return rows / statistics.median(samples)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500, help="Rows per page (and seeded per table)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--database-url", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.setdefault("GEO_INDEX_WARM_ON_START", "false")
+
+    from flask import jsonify
+    from app import create_app
+    from app.extensions import db
+    from app.models import Mosque, MosqueRatingStats, MosqueSuggestion, Review
+    from app.schemas.mosque import MosqueSchema
+    from app.schemas.review import ReviewSchema
+    from app.schemas.suggestion import MosqueSuggestionSchema
+    from app.services.serialization import (
+        json_response, mosque_rows, mosque_serializer, review_serializer, suggestion_serializer, table_rows,
+    )
+
+    app = create_app("production")
+    size = args.rows
+    cases = [
+        ("mosques", lambda: Mosque.query.order_by(Mosque.id).limit(size), MosqueSchema, mosque_serializer, mosque_rows),
+        ("suggestions", lambda: MosqueSuggestion.query.order_by(MosqueSuggestion.id).limit(size),
+         MosqueSuggestionSchema, suggestion_serializer, table_rows),
+        ("reviews", lambda: Review.query.order_by(Review.id).limit(size), ReviewSchema, review_serializer, table_rows),
+    ]
+
+    with app.test_request_context():
+        logging.info("Seeding %s rows per table into %s", size, db.engine.url.render_as_string(hide_password=True))
+        seed(db, (Mosque, MosqueSuggestion, Review, MosqueRatingStats), size)
+
+        print(f"{'model':>12} {'schema rows/s':>15} {'compiled rows/s':>16} {'speedup':>8}")
+        for name, query, schema_cls, serializer, fetch in cases:
+            schema = schema_cls(many=True)
+
+            def old():
+                body = jsonify(schema.dump(query().all())).get_data()
+                db.session.expunge_all()
+                return body
+
+            def new():
+                return json_response(serializer.dump_many(fetch(query()))).get_data()
+
+            if old() != new():
+                raise SystemExit(f"{name}: compiled output differs from {schema_cls.__name__}")
+            before = rate(old, size, args.repeat)
+            after = rate(new, size, args.repeat)
+            print(f"{name:>12} {before:>15,.0f} {after:>16,.0f} {after / before:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
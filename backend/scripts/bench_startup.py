@@ -0,0 +1,140 @@
+"""Time-to-first-request of a fresh worker process, per startup mode.
+
+Every run spawns a new interpreter (like a gunicorn worker or an App Service
+cold start), builds the app with ``wsgi``-style settings and serves one
+request through the test client. The parent measures the wall time from spawn
+until the child reports the response, and the child also sends back the
+``create_app`` phase profile (``services/startup.py``).
+
+Modes:
+
+* ``eager``: the previous behaviour, with create_all() on boot and the
+  google.genai / azure.storage.blob SDKs imported with the app
+* ``default``: the current defaults (no create_all, SDKs imported lazily)
+* ``fast``: default plus ``GEO_INDEX_WARM_ON_START=false``, so the first
+  /mosques/nearby builds the index instead of the boot
+
+By default this seeds a throwaway SQLite file. --database-url points it at a
+scratch Postgres; the script only creates tables there, it never drops them.
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+MODES = {
+    "eager": {"AUTO_CREATE_TABLES": "true", "GEO_INDEX_WARM_ON_START": "true", "BENCH_EAGER_SDKS": "1"},
+    "default": {"AUTO_CREATE_TABLES": "false", "GEO_INDEX_WARM_ON_START": "true"},
+    "fast": {"AUTO_CREATE_TABLES": "false", "GEO_INDEX_WARM_ON_START": "false"},
+}
+
+
+def seed(rows: int) -> None:
+    from app import create_app
+    from app.extensions import db
+    from app.models import Mosque
+
+    app = create_app("production")
+    rnd = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        if db.session.query(Mosque).count() >= rows:
+            return
+        db.session.add_all([
+            Mosque(
+                arabic_name=f"جامع {i}",
+                type="مسجد",
+                governorate="Tunis",
+                city=f"city-{i % 50}",
+                latitude=36.8 + rnd.uniform(-0.5, 0.5),
+                longitude=10.18 + rnd.uniform(-0.5, 0.5),
+                approved=True,
+            )
+            for i in range(rows)
+        ])
+        db.session.commit()
+
+
+def child(path: str) -> None:
+    if os.environ.get("BENCH_EAGER_SDKS"):
+        # What importing the routes used to pull in
+        for module in ("google.genai", "azure.storage.blob"):
+            try:
+                __import__(module)
+            except ImportError:
+                pass
+    from app import create_app
+    from app.services.startup import startup_stats
+
+    app = create_app("production")
+    resp = app.test_client().get(path)
+    print(json.dumps({"status": resp.status_code, "profile": startup_stats(app)}), flush=True)
+
+
+def run_once(mode: str, path: str) -> dict:
+    env = dict(os.environ, **MODES[mode])
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, __file__, "--child", "--path", path],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    line = proc.stdout.readline()  # stop the clock at the report, not at interpreter exit
+    elapsed = (time.perf_counter() - t0) * 1000.0
+    proc.communicate()
+    if proc.returncode or not line:
+        raise SystemExit(f"{mode}: child failed with exit code {proc.returncode}")
+    r = json.loads(line)
+    if r["status"] != 200:
+        raise SystemExit(f"{mode}: {path} returned {r['status']}")
+    r["wall_ms"] = elapsed
+    return r
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=7, help="Fresh processes per mode")
+    parser.add_argument("--modes", type=str, default="eager,default,fast")
+    parser.add_argument("--path", type=str, default="/meta/facilities", help="First request")
+    parser.add_argument("--database-url", type=str, default=None)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.path)
+        return
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.setdefault("RESPONSE_CACHE_BACKEND", "memory")
+    logging.info("Seeding %s mosques", args.rows)
+    seed(args.rows)
+
+    print(f"{'mode':>8} {'first req ms':>13} {'create_app ms':>14}  slowest phases")
+    for mode in args.modes.split(","):
+        runs = [run_once(mode, args.path) for _ in range(args.runs)]
+        wall = statistics.median(r["wall_ms"] for r in runs)
+        total = statistics.median(r["profile"]["total_ms"] for r in runs)
+        phases = {}
+        for r in runs:
+            for name, ms in r["profile"]["phases_ms"].items():
+                phases.setdefault(name, []).append(ms)
+        slowest = sorted(((statistics.median(v), k) for k, v in phases.items()), reverse=True)[:3]
+        print(f"{mode:>8} {wall:>13.0f} {total:>14.0f}  " + ", ".join(f"{k} {ms:.0f}" for ms, k in slowest))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Concurrency check for suggestion and edit confirmations.
+
+Creates a fresh suggestion and a fresh edit, then has ``--confirmers``
+distinct users confirm each one at the same time, from ``--threads`` client
+threads (all released by one barrier). Some users also send duplicate
+confirmations. The check then asserts:
+
+* ``confirmations_count`` equals the number of distinct confirmers, with
+  nothing lost to concurrent increments and duplicates not counted;
+* the number of confirmation rows matches;
+* the threshold approval ran exactly once, creating exactly one mosque;
+* a suggestion still in ``pending_ai_review`` takes confirmations past the
+  threshold but is not approved, since the model hasn't passed it yet.
+
+The backend has no pytest suite, so this script is the regression check
+for the confirmation counters: run it after touching confirmations or
+approvals. Exits non-zero on any mismatch.
+
+By default this uses a throwaway SQLite file, where writers serialize on
+the database lock. Use --database-url with a scratch Postgres to exercise
+real row-level concurrency. The script only adds rows, it never drops
+anything.
+"""
+import os
+import sys
+import uuid
+import logging
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--confirmers", type=int, default=40)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duplicates", type=int, default=5, help="Confirmers that also send a second confirmation")
+    parser.add_argument("--database-url", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "confirm.db")
+    os.environ["RATE_LIMIT_BACKEND"] = "none"
+    os.environ.setdefault("GEO_INDEX_WARM_ON_START", "false")
+    os.environ.setdefault("RESPONSE_CACHE_BACKEND", "memory")
+
+    from flask_jwt_extended import create_access_token
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import EditConfirmation, Mosque, MosqueEditSuggestion, MosqueSuggestion, SuggestionConfirmation
+    from app.services.moderation import APPROVAL_CONFIRMATION_THRESHOLD
+
+    app = create_app("production")
+    marker = f"check-{uuid.uuid4().hex[:8]}"
+    with app.app_context():
+        db.create_all()
+        target = Mosque(arabic_name=f"{marker}-target", type="مسجد", governorate="Tunis",
+                        latitude=36.8, longitude=10.18, approved=True)
+        s = MosqueSuggestion(arabic_name=marker, type="مسجد", governorate="Tunis",
+                             latitude=36.8, longitude=10.18, status="pending_approval")
+        db.session.add_all([target, s])
+        db.session.flush()
+        e = MosqueEditSuggestion(mosque_id=target.id, patch_json={"address": marker}, status="pending_approval")
+        unreviewed = MosqueSuggestion(arabic_name=f"{marker}-unreviewed", type="مسجد", governorate="Tunis",
+                                      latitude=36.8, longitude=10.18, status="pending_ai_review")
+        db.session.add_all([e, unreviewed])
+        db.session.commit()
+        suggestion_id, edit_id, unreviewed_id = s.id, e.id, unreviewed.id
+        base = 10_000_000 + (uuid.uuid4().int % 1_000_000) * 1000  # user ids not used by earlier runs
+        tokens = [create_access_token(identity=str(base + i)) for i in range(args.confirmers)]
+
+    jobs = list(tokens) + tokens[:args.duplicates]
+    barrier = threading.Barrier(min(args.threads, len(jobs)))
+    client = app.test_client()
+
+    def confirm(path, token):
+        try:
+            barrier.wait(timeout=5)
+        except threading.BrokenBarrierError:
+            pass
+        return client.post(path, headers={"Authorization": f"Bearer {token}"}).status_code
+
+    failed = False
+    for label, path in (
+        ("suggestion", f"/suggestions/{suggestion_id}/confirmations"),
+        ("edit", f"/suggestions/edits/{edit_id}/confirmations"),
+    ):
+        barrier.reset()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            codes = list(pool.map(lambda t: confirm(path, t), jobs))
+        created = codes.count(201)
+        duplicates = codes.count(400)
+        other = len(codes) - created - duplicates
+        with app.app_context():
+            if label == "suggestion":
+                count = db.session.get(MosqueSuggestion, suggestion_id).confirmations_count
+                rows = SuggestionConfirmation.query.filter_by(suggestion_id=suggestion_id).count()
+            else:
+                count = db.session.get(MosqueEditSuggestion, edit_id).confirmations_count
+                rows = EditConfirmation.query.filter_by(edit_id=edit_id).count()
+        ok = count == rows == created == args.confirmers and duplicates == args.duplicates and not other
+        failed |= not ok
+        logging.info(
+            "%s: %s confirmers, 201=%s 400=%s other=%s, count=%s rows=%s -> %s",
+            label, args.confirmers, created, duplicates, other, count, rows, "ok" if ok else "MISMATCH",
+        )
+
+    with app.app_context():
+        mosques = Mosque.query.filter_by(arabic_name=marker).count()
+        status = db.session.get(MosqueSuggestion, suggestion_id).status
+    ok = mosques == 1 and status == "approved"
+    failed |= not ok
+    logging.info("approval: status=%s, mosques created=%s -> %s", status, mosques, "ok" if ok else "MISMATCH")
+
+    path = f"/suggestions/{unreviewed_id}/confirmations"
+    codes = [
+        client.post(path, headers={"Authorization": f"Bearer {token}"}).status_code
+        for token in tokens[:APPROVAL_CONFIRMATION_THRESHOLD]
+    ]
+    with app.app_context():
+        row = db.session.get(MosqueSuggestion, unreviewed_id)
+        mosques = Mosque.query.filter_by(arabic_name=f"{marker}-unreviewed").count()
+        ok = (
+            codes == [201] * APPROVAL_CONFIRMATION_THRESHOLD and row.status == "pending_ai_review"
+            and row.confirmations_count == APPROVAL_CONFIRMATION_THRESHOLD and mosques == 0
+        )
+        failed |= not ok
+        logging.info(
+            "unreviewed: codes=%s status=%s count=%s, mosques created=%s -> %s",
+            codes, row.status, row.confirmations_count, mosques, "ok" if ok else "MISMATCH",
+        )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
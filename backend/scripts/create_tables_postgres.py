@@ -6,6 +6,9 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
+from flask_migrate import stamp
+from sqlalchemy import inspect
+
 from app import create_app
 from app.extensions import db
 import app.models  # ensure all models are imported so metadata is populated
@@ -15,8 +18,17 @@ def main():
     logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
     app = create_app("production")
     with app.app_context():
+        fresh = not inspect(db.engine).get_table_names()
         db.create_all()
         logging.info("Created all tables on the configured database.")
+        if fresh:
+            # The tables match the latest migration: record that, so
+            # `flask db upgrade` (deploy.sh) doesn't replay every migration
+            # (alembic logs "Running stamp_revision -> <head>")
+            stamp(directory=os.path.join(BASE_DIR, "migrations"), revision="head")
+        else:
+            # Existing database: its pending migrations still have to run
+            logging.warning("Database already had tables; not stamped. Run `flask db upgrade`.")
 
 
 if __name__ == "__main__":
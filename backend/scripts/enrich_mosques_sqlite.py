@@ -1,7 +1,6 @@
 import os
 import sys
 import time
-import math
 import logging
 import argparse
 from typing import Optional, Tuple, Dict
@@ -11,23 +10,13 @@ import requests
 from dotenv import load_dotenv
 
 
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
 # Use SQLAlchemy with the Flask app (PostgreSQL)
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 from app import create_app
 from app.extensions import db
 from app.models.mosque import Mosque
+from app.utils.geo import haversine_km_many, nearest_order
 
 
 def reverse_geocode(lat: float, lon: float) -> Tuple[Optional[str], Optional[str]]:
@@ -67,16 +56,15 @@ def google_places_name(lat: float, lon: float, api_key: Optional[str]) -> Option
         best_name = best.get("name")
         # Try to refine by distance using geometry if available
         try:
-            distances = []
+            located = []
             for r in results[:5]:
                 g = r.get("geometry", {}).get("location", {})
                 plat, plon = g.get("lat"), g.get("lng")
                 if plat is not None and plon is not None:
-                    d = haversine(lat, lon, float(plat), float(plon))
-                    distances.append((d, r))
-            if distances:
-                distances.sort(key=lambda x: x[0])
-                best = distances[0][1]
+                    located.append((float(plat), float(plon), r))
+            if located:
+                dists = haversine_km_many(lat, lon, [p[0] for p in located], [p[1] for p in located])
+                best = located[int(nearest_order(dists, 1)[0])][2]
                 best_name = best.get("name")
         except Exception:
             pass
@@ -106,8 +94,7 @@ def osm_nearest_mosque_name(lat: float, lon: float, radius: int = 250) -> Option
         elems = data.get("elements", [])
         if not elems:
             return None
-        best_name = None
-        best_dist = None
+        named = []
         for e in elems:
             tags = e.get("tags", {}) or {}
             name = tags.get("name") or tags.get("name:ar") or tags.get("name:en")
@@ -120,10 +107,11 @@ def osm_nearest_mosque_name(lat: float, lon: float, radius: int = 250) -> Option
                 elat, elon = c.get("lat"), c.get("lon")
                 if elat is None or elon is None:
                     continue
-            dist = haversine(float(lat), float(lon), float(elat), float(elon))
-            if best_dist is None or dist < best_dist:
-                best_dist = dist
-                best_name = name
+            named.append((float(elat), float(elon), name))
+        if not named:
+            return None
+        dists = haversine_km_many(float(lat), float(lon), [n[0] for n in named], [n[1] for n in named])
+        best_name = named[int(nearest_order(dists, 1)[0])][2]
         return best_name
     except Exception as e:
         logging.warning("Overpass error: %s", e)
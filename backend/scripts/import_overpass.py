@@ -1,6 +1,5 @@
 import os
 import json
-import math
 import time
 import logging
 from typing import Dict, Any, List
@@ -16,6 +15,7 @@ sys.path.append(str(Path(__file__).resolve().parents[1]))
 from app import create_app
 from app.extensions import db
 from app.models.mosque import Mosque
+from app.utils.geo import haversine_km_many
 
 OVERPASS_ENDPOINTS = [
     "https://overpass-api.de/api/interpreter",
@@ -55,17 +55,6 @@ def build_bbox_query(south: float, west: float, north: float, east: float) -> st
     )
 
 
-def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
 def fetch_overpass(query: str) -> Dict[str, Any]:
     last_err = None
     for url in OVERPASS_ENDPOINTS:
@@ -120,11 +109,12 @@ def find_existing(lat: float, lon: float, arabic_name: str | None) -> Mosque | N
         Mosque.latitude.between(lat - 0.002, lat + 0.002),
         Mosque.longitude.between(lon - 0.002, lon + 0.002),
     ).all()
-    for m in q:
-        try:
-            d = haversine(lat, lon, m.latitude or 0.0, m.longitude or 0.0)
-        except Exception:
-            d = 999999
+    if not q:
+        return None
+    dists_m = haversine_km_many(
+        lat, lon, [m.latitude or 0.0 for m in q], [m.longitude or 0.0 for m in q]
+    ) * 1000.0
+    for m, d in zip(q, dists_m.tolist()):
         if d < 150:  # within 150m
             if arabic_name and m.arabic_name and arabic_name.lower() == m.arabic_name.lower():
                 return m
@@ -114,6 +114,9 @@ export async function uploadImage(uri) {
   const { data } = await api.post('/uploads', formData, {
     headers: { 'Content-Type': 'multipart/form-data' },
   });
+  // data.status is 'pending' (HTTP 202) while the server is still writing the
+  // files: data.url 404s for a few seconds. Storing it in a suggestion is fine;
+  // screens keep showing the local uri.
   return data.url;
 }
 